@@ -1,4 +1,6 @@
+import asyncio
 from abc import ABC, abstractmethod
+from datetime import datetime
 from typing import Optional, Dict, List, Any, Union
 from services.models import ItemsFiltered, LibraryUser
 
@@ -27,6 +29,16 @@ class LibraryProviderBase(ABC):
         """
         pass
 
+    async def get_users_async(self) -> Optional[List[LibraryUser]]:
+        """
+        Retrieves all users without blocking the event loop. Runs get_users in a worker thread
+        unless the provider has a native async implementation.
+
+        Returns:
+            Optional[List[LibraryUser]]: A list of user objects, or None if an error occurs.
+        """
+        return await asyncio.to_thread(self.get_users)
+
     @abstractmethod
     def get_user_by_name(self, username: str) -> Optional[LibraryUser]:
         """
@@ -42,13 +54,14 @@ class LibraryProviderBase(ABC):
         pass
 
     @abstractmethod
-    def get_recently_watched(self, user_id: str, limit: Optional[int] = None) -> Optional[List[ItemsFiltered]]:
+    def get_recently_watched(self, user_id: str, limit: Optional[int] = None, since: Optional[datetime] = None) -> Optional[List[ItemsFiltered]]:
         """
         Retrieves recently watched items for a specific user.
 
         Args:
             user_id (str): The unique identifier for the user.
             limit (Optional[int]): The maximum number of items to retrieve.
+            since (Optional[datetime]): Only return items played after this time (UTC). If None, returns the full history up to `limit`.
 
         Returns:
             Optional[List[Dict[str, Any]]]: A list of recently watched items (raw dictionaries),
@@ -56,6 +69,19 @@ class LibraryProviderBase(ABC):
         """
         pass
 
+    def get_history_activity_marker(self, user_id: str) -> Optional[str]:
+        """
+        Retrieves a cheap marker that changes whenever the user's watch history changes.
+        A sync is skipped when the marker matches the one stored at the previous sync.
+
+        Args:
+            user_id (str): The unique identifier for the user.
+
+        Returns:
+            Optional[str]: The marker, or None if the provider has no such marker or an error occurs.
+        """
+        return None
+
     @abstractmethod
     def get_favorites(self, user_id: str, limit: Optional[int] = None) -> Optional[List[ItemsFiltered]]:
         """
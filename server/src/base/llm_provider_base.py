@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Type
+from pydantic import BaseModel
 
 class LLMProviderBase(ABC):
     """
@@ -22,6 +23,7 @@ class LLMProviderBase(ABC):
         prompt: str,
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = 0.7,
+        response_model: Optional[Type[BaseModel]] = None,
         **kwargs: Any
     ) -> Optional[Dict[str, Any]]:
         """
@@ -32,6 +34,7 @@ class LLMProviderBase(ABC):
             prompt (str): The user's prompt for suggestions.
             system_prompt (Optional[str]): System instructions for the LLM.
             temperature (Optional[float]): Controls randomness.
+            response_model (Optional[Type[BaseModel]]): Structured response schema. Defaults to SuggestionList.
             **kwargs: Additional provider-specific parameters (e.g., thinking_budget for Gemini).
 
         Returns:
@@ -6,6 +6,7 @@ from typing import Optional, Dict, Any
 from urllib.parse import urljoin
 
 from services.response import APIResponse # Assuming APIResponse is in .response
+from services.http_client import transport as http_transport # Shared pooled session with timeouts and retries
 
 class RequestProviderBase(ABC):
     """
@@ -54,7 +55,7 @@ class RequestProviderBase(ABC):
         self.logger.debug(f"Making {method} request to {full_url} with params={params}, data is_present={data is not None}")
 
         try:
-            response = requests.request(method, full_url, headers=self.headers, params=params, json=data)
+            response = http_transport.request(method, full_url, headers=self.headers, params=params, json=data)
             response.raise_for_status()  # Raises HTTPError for 4xx/5xx responses
 
             if response.status_code == 204: # No Content
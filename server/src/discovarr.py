@@ -4,13 +4,12 @@ import logging
 import sys
 import os
 import traceback 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from urllib.parse import urljoin
-from typing import Optional, Dict, List, Any, Union
+from typing import Optional, Dict, List, Any, Union, Iterable, Set
 import asyncio 
-import aiohttp # For async HTTP requests in the caching task
 from peewee import fn
-from services.models import ItemsFiltered, LibraryUser, Media # Import Media model
+from services.models import ItemsFiltered, LibraryUser, Media, SeededSuggestionList, DEFAULT_PROMPT_TEMPLATE, DEFAULT_PROMPT_MULTI_SEED_TEMPLATE # Import Media model
 from providers.radarr import RadarrProvider 
 from providers.sonarr import SonarrProvider
 from providers.jellyseerr import JellyseerrProvider # Import JellyseerrProvider
@@ -23,6 +22,7 @@ from services.response import APIResponse
 from services.image_cache import ImageCacheService 
 from services.llm import LLMService # Import the new LLMService
 from services.research import ResearchService # Import ResearchService
+from services.library_snapshot import LibrarySnapshotService
 from providers.jellyfin import JellyfinProvider
 from providers.plex import PlexProvider
 from providers.ollama import OllamaProvider # Changed from Ollama
@@ -35,6 +35,26 @@ class Discovarr:
     A class to interact with media servers and LLM APIs for media requests and management.
     """
 
+    # Settings group each provider service is built from, a change in the group rebuilds the service
+    _SERVICE_SETTINGS_GROUPS = {
+        "plex": "plex",
+        "jellyfin": "jellyfin",
+        "radarr": "radarr",
+        "sonarr": "sonarr",
+        "gemini": "gemini",
+        "ollama": "ollama",
+        "openai": "openai",
+        "trakt": "trakt",
+        "jellyseerr": "jellyseerr",
+        "overseerr": "overseerr",
+        "tmdb": "tmdb",
+    }
+    # Services held by LLMService, rebuilding one of these also rebuilds LLMService and ResearchService
+    _LLM_SERVICE_DEPENDENCIES = {"gemini", "ollama", "openai", "jellyfin", "plex", "trakt"}
+    # Concurrent user history fetches per provider during a watch history sync. plexapi and trakt are blocking
+    # libraries, so every fetch runs in a worker thread
+    _SYNC_PROVIDER_CONCURRENCY = {"jellyfin": 4, "plex": 2, "trakt": 2}
+
     def __init__(self, db_path: Optional[str] = "/config/discovarr.db"):
         """
         Initializes the Discovarr class and sets up logging and API configurations.
@@ -86,6 +106,8 @@ class Discovarr:
         self.ollama_model = None # Initialize Ollama setting
         self.ollama_temperature = None # 
         self.tmdb_api_key = None
+        self.tmdb_search_cache_ttl = None
+        self.tmdb_detail_cache_ttl = None
         self.openai_enabled = None
         self.openai_api_key = None
         self.openai_base_url = None
@@ -111,6 +133,9 @@ class Discovarr:
         self.overseerr_default_sonarr_quality_profile_id = None
         # self.trakt_access_token = None # Access token might be managed via OAuth flow
         self.auto_media_save = None
+        self.enrichment_concurrency = None
+        self.watch_history_batch_size = None
+        self.image_cache_max_size_mb = None
         self.system_prompt = None 
 
         self.enabled_providers: Dict[str, List[str]] = {
@@ -133,10 +158,12 @@ class Discovarr:
         self.research_service = None # Initialize ResearchService instance
 
         self.db_path = db_path
-        self.image_cache = ImageCacheService() # Initialize ImageCacheService
         # Load backup setting first as it's needed for Database initialization
         # Initialize Database with the backup setting
         self.db = Database(self.db_path)
+        self.image_cache = ImageCacheService(db=self.db) # Disk budget is applied in reload_configuration
+        self.db.delete_expired_tmdb_cache() # Drop stale TMDB responses left from previous runs
+        self.library_snapshot = LibrarySnapshotService(db_service=self.db) # Survives configuration reloads, see reload_configuration
         
         # Now that the database is initialized by self.db,
         # we can initialize the settings in the database.
@@ -151,9 +178,16 @@ class Discovarr:
         # Initialize scheduler (depends on a fully configured Discovarr instance)
         self.scheduler = DiscovarrScheduler(db=self.db, discovarr_instance=self)
         self.logger.info("Scheduler initialized")
-    def reload_configuration(self) -> None:
-        """Loads/reloads configuration from settings and (re)initializes services."""
-        self.logger.info("Loading/Reloading Discovarr configuration...")
+    def reload_configuration(self, changed_groups: Optional[Iterable[str]] = None) -> None:
+        """
+        Loads/reloads configuration from settings and (re)initializes services.
+
+        Args:
+            changed_groups (Optional[Iterable[str]]): Settings groups that changed. Only services built from
+                                                      these groups are rebuilt. If None, rebuilds all services.
+        """
+        changed_groups = set(changed_groups) if changed_groups is not None else None
+        self.logger.info(f"Loading/Reloading Discovarr configuration (changed groups: {', '.join(sorted(changed_groups)) if changed_groups is not None else 'all'})...")
 
         # Load configuration values from SettingsService_
         self.recent_limit = self.settings.get("app", "recent_limit")
@@ -161,6 +195,10 @@ class Discovarr:
         self.request_only = self.settings.get("app", "request_only")
         self.default_prompt = self.settings.get("app", "default_prompt")
         self.auto_media_save = self.settings.get("app", "auto_media_save")
+        self.enrichment_concurrency = self.settings.get("app", "enrichment_concurrency")
+        self.watch_history_batch_size = self.settings.get("app", "watch_history_batch_size")
+        self.image_cache_max_size_mb = self.settings.get("app", "image_cache_max_size_mb")
+        self.image_cache.max_size_bytes = max(0, self.image_cache_max_size_mb or 0) * 1024 * 1024
         self.plex_enabled = self.settings.get("plex", "enabled") # Load Plex enabled status
         self.plex_enable_media = self.settings.get("plex", "enable_media")
         self.plex_enable_history = self.settings.get("plex", "enable_history")
@@ -214,6 +252,8 @@ class Discovarr:
         self.overseerr_default_radarr_quality_profile_id = self.settings.get("overseerr", "default_radarr_quality_profile_id")
         self.overseerr_default_sonarr_quality_profile_id = self.settings.get("overseerr", "default_sonarr_quality_profile_id")
         self.tmdb_api_key = self.settings.get("tmdb", "api_key")
+        self.tmdb_search_cache_ttl = self.settings.get("tmdb", "search_cache_ttl")
+        self.tmdb_detail_cache_ttl = self.settings.get("tmdb", "detail_cache_ttl")
         self.system_prompt = self.settings.get("app", "system_prompt")
         
         # Reset and populate enabled_providers dictionary
@@ -261,133 +301,190 @@ class Discovarr:
         except ValueError as e:
             self.logger.error(f"Configuration validation error: {e}")
  
-        # (Re)Initialize services with the new configuration
-        self.plex = None # Reset before potential re-init
-        self.jellyfin = None # Reset before potential re-init
-        self.trakt = None # Reset before potential re-init
-        self.jellyseerr = None # Reset before potential re-init
-        self.overseerr = None # Reset before potential re-init
-
-        if self.plex_enabled and self.plex_url and self.plex_api_key:
-             self.plex = PlexProvider(
-                plex_url=self.plex_url,
-                plex_api_key=self.plex_api_key,
-                limit=self.recent_limit # Use recent_limit for default Plex limit
-            )
-             self.logger.info("Plex service initialized.")
-        elif self.plex_enabled:
-            self.logger.warning("Plex is enabled but URL or token is missing. Plex service not initialized.")
+        # (Re)Initialize services with the new configuration. Only the services built from a changed
+        # settings group are rebuilt, the others keep their clients and connections.
+        if changed_groups is None:
+            services_to_build = set(self._SERVICE_SETTINGS_GROUPS)
         else:
-            self.logger.info("Plex integration is disabled.")
-
-        if self.jellyfin_enabled and self.jellyfin_url and self.jellyfin_api_key:
-            self.jellyfin = JellyfinProvider(
-                jellyfin_url=self.jellyfin_url,
-                jellyfin_api_key=self.jellyfin_api_key,
+            services_to_build = {service for service, group in self._SERVICE_SETTINGS_GROUPS.items() if group in changed_groups}
+        self.logger.info(f"Rebuilding services: {', '.join(sorted(services_to_build)) or 'none'}")
+        new_services = self._build_services(services_to_build)
+
+        # Library snapshots survive reloads, except for a provider whose settings (e.g. URL or API key) changed
+        if changed_groups is not None:
+            for provider_name in ("jellyfin", "plex"):
+                if self._SERVICE_SETTINGS_GROUPS[provider_name] in changed_groups:
+                    self.library_snapshot.invalidate(provider_name)
+
+        # LLMService and ResearchService hold references to the providers, rebuild them when one of those changed
+        if services_to_build & self._LLM_SERVICE_DEPENDENCIES or self.llm_service is None:
+            current = lambda name: new_services[name] if name in new_services else getattr(self, name)
+            # Initialize LLMService with configured providers and settings
+            new_services["llm_service"] = LLMService(
+                logger=self.logger,
+                settings_service=self.settings,
+                db_service=self.db, # Pass the database instance
+                enabled_providers=self.enabled_providers,
+                gemini_provider=current("gemini"),
+                ollama_provider=current("ollama"),
+                openai_provider=current("openai"), # Pass the OpenAIProvider instance
+                jellyfin_provider=current("jellyfin"),
+                plex_provider=current("plex"),
+                trakt_provider=current("trakt"),
+                library_snapshot=self.library_snapshot
             )
-            self.logger.info("Jellyfin service initialized.")
-        elif self.jellyfin_enabled:
-            self.logger.warning("Jellyfin is enabled but URL or API key is missing. Jellyfin service not initialized.")
-        else:
-            self.logger.info("Jellyfin integration is disabled.")
-
-        if self.radarr_enabled and self.radarr_url and self.radarr_api_key:
-            self.radarr = RadarrProvider(
-                url=self.radarr_url,
-                api_key=self.radarr_api_key,
-            )
-            
-        if self.sonarr_enabled and self.sonarr_url and self.sonarr_api_key:
-            self.sonarr = SonarrProvider(
-                url=self.sonarr_url,
-                api_key=self.sonarr_api_key,
+            # Initialize ResearchService
+            new_services["research_service"] = ResearchService(
+                settings_service=self.settings,
+                llm_service=new_services["llm_service"],
+                db_service=self.db
             )
-        if self.gemini_enabled and self.gemini_api_key:
-            self.gemini = GeminiProvider(
-                gemini_api_key=self.gemini_api_key
-            )
-        else:
-            self.gemini = None
-            self.logger.info("Gemini API key not configured. Gemini service disabled.")
 
-        if self.ollama_enabled and self.ollama_base_url:
-            self.ollama = OllamaProvider(
-                ollama_base_url=self.ollama_base_url,
-            )
-            self.logger.info("Ollama service initialized.")
-        elif self.ollama_enabled:
-            self.logger.warning("Ollama is enabled but Base URL or Model is missing. Ollama service not initialized.")
-        else:
-            self.logger.info("Ollama integration is disabled.")
+        # Swap the new services in at once, requests already in flight keep the clients they started with
+        for name, service in new_services.items():
+            setattr(self, name, service)
+        if self.plex:
+            self.plex.limit = self.recent_limit # Follows app.recent_limit without reconnecting
+        self.logger.info("Discovarr configuration processed and services (re)initialized.")
 
-        if self.openai_enabled and self.openai_api_key and self.openai_base_url:
-            self.openai = OpenAIProvider(
-                api_key=self.openai_api_key,
-                base_url=self.openai_base_url
-            )
-        else:
-            self.openai = None
-
-        if self.trakt_enabled and self.trakt_client_id and self.trakt_client_secret:
-            self.trakt = TraktProvider(
-                client_id=self.trakt_client_id,
-                client_secret=self.trakt_client_secret,
-                redirect_uri=self.trakt_redirect_uri,
-                discovarr_app=self # Pass the Discovarr instance
-            )
-            self.logger.info("Trakt service initialized.")
-            # If Trakt is initialized but not authenticated, _authenticate might be called
-            # during TraktProvider's __init__.
-            # If you want to explicitly trigger it later (e.g., via an endpoint),
-            # you might adjust TraktProvider's __init__ to not auto-authenticate
-            # or provide a method to check auth status.
-        else:
-            self.logger.info("Trakt integration is disabled or missing Client ID/Secret.")
+    def _build_services(self, services_to_build: Set[str]) -> Dict[str, Any]:
+        """
+        Builds the requested provider services from the loaded configuration.
 
-        if self.jellyseerr_enabled and self.jellyseerr_url and self.jellyseerr_api_key:
-            self.jellyseerr = JellyseerrProvider(
-                url=self.jellyseerr_url,
-                api_key=self.jellyseerr_api_key
-            )
-            self.logger.info("Jellyseerr service initialized.")
-        elif self.jellyseerr_enabled:
-            self.logger.warning("Jellyseerr is enabled but URL or API key is missing. Jellyseerr service not initialized.")
-        else:
-            self.logger.info("Jellyseerr integration is disabled.") 
+        Args:
+            services_to_build (Set[str]): Names of the services to build (keys of _SERVICE_SETTINGS_GROUPS).
 
-        if self.overseerr_enabled and self.overseerr_url and self.overseerr_api_key:
-            self.overseerr = OverseerrProvider(
-                url=self.overseerr_url,
-                api_key=self.overseerr_api_key
+        Returns:
+            Dict[str, Any]: The new service instances (None if disabled or misconfigured), keyed by attribute name.
+        """
+        services: Dict[str, Any] = {}
+
+        if "plex" in services_to_build:
+            services["plex"] = None
+            if self.plex_enabled and self.plex_url and self.plex_api_key:
+                services["plex"] = PlexProvider(
+                    plex_url=self.plex_url,
+                    plex_api_key=self.plex_api_key,
+                    limit=self.recent_limit # Use recent_limit for default Plex limit
+                )
+                self.logger.info("Plex service initialized.")
+            elif self.plex_enabled:
+                self.logger.warning("Plex is enabled but URL or token is missing. Plex service not initialized.")
+            else:
+                self.logger.info("Plex integration is disabled.")
+
+        if "jellyfin" in services_to_build:
+            services["jellyfin"] = None
+            if self.jellyfin_enabled and self.jellyfin_url and self.jellyfin_api_key:
+                services["jellyfin"] = JellyfinProvider(
+                    jellyfin_url=self.jellyfin_url,
+                    jellyfin_api_key=self.jellyfin_api_key,
+                    db=self.db,
+                )
+                self.logger.info("Jellyfin service initialized.")
+            elif self.jellyfin_enabled:
+                self.logger.warning("Jellyfin is enabled but URL or API key is missing. Jellyfin service not initialized.")
+            else:
+                self.logger.info("Jellyfin integration is disabled.")
+
+        if "radarr" in services_to_build:
+            services["radarr"] = None
+            if self.radarr_enabled and self.radarr_url and self.radarr_api_key:
+                services["radarr"] = RadarrProvider(
+                    url=self.radarr_url,
+                    api_key=self.radarr_api_key,
+                )
+
+        if "sonarr" in services_to_build:
+            services["sonarr"] = None
+            if self.sonarr_enabled and self.sonarr_url and self.sonarr_api_key:
+                services["sonarr"] = SonarrProvider(
+                    url=self.sonarr_url,
+                    api_key=self.sonarr_api_key,
+                )
+
+        if "gemini" in services_to_build:
+            services["gemini"] = None
+            if self.gemini_enabled and self.gemini_api_key:
+                services["gemini"] = GeminiProvider(
+                    gemini_api_key=self.gemini_api_key
+                )
+            else:
+                self.logger.info("Gemini API key not configured. Gemini service disabled.")
+
+        if "ollama" in services_to_build:
+            services["ollama"] = None
+            if self.ollama_enabled and self.ollama_base_url:
+                services["ollama"] = OllamaProvider(
+                    ollama_base_url=self.ollama_base_url,
+                )
+                self.logger.info("Ollama service initialized.")
+            elif self.ollama_enabled:
+                self.logger.warning("Ollama is enabled but Base URL or Model is missing. Ollama service not initialized.")
+            else:
+                self.logger.info("Ollama integration is disabled.")
+
+        if "openai" in services_to_build:
+            services["openai"] = None
+            if self.openai_enabled and self.openai_api_key and self.openai_base_url:
+                services["openai"] = OpenAIProvider(
+                    api_key=self.openai_api_key,
+                    base_url=self.openai_base_url
+                )
+
+        if "trakt" in services_to_build:
+            services["trakt"] = None
+            if self.trakt_enabled and self.trakt_client_id and self.trakt_client_secret:
+                services["trakt"] = TraktProvider(
+                    client_id=self.trakt_client_id,
+                    client_secret=self.trakt_client_secret,
+                    redirect_uri=self.trakt_redirect_uri,
+                    discovarr_app=self # Pass the Discovarr instance
+                )
+                self.logger.info("Trakt service initialized.")
+                # If Trakt is initialized but not authenticated, _authenticate might be called
+                # during TraktProvider's __init__.
+                # If you want to explicitly trigger it later (e.g., via an endpoint),
+                # you might adjust TraktProvider's __init__ to not auto-authenticate
+                # or provide a method to check auth status.
+            else:
+                self.logger.info("Trakt integration is disabled or missing Client ID/Secret.")
+
+        if "jellyseerr" in services_to_build:
+            services["jellyseerr"] = None
+            if self.jellyseerr_enabled and self.jellyseerr_url and self.jellyseerr_api_key:
+                services["jellyseerr"] = JellyseerrProvider(
+                    url=self.jellyseerr_url,
+                    api_key=self.jellyseerr_api_key
+                )
+                self.logger.info("Jellyseerr service initialized.")
+            elif self.jellyseerr_enabled:
+                self.logger.warning("Jellyseerr is enabled but URL or API key is missing. Jellyseerr service not initialized.")
+            else:
+                self.logger.info("Jellyseerr integration is disabled.") 
+
+        if "overseerr" in services_to_build:
+            services["overseerr"] = None
+            if self.overseerr_enabled and self.overseerr_url and self.overseerr_api_key:
+                services["overseerr"] = OverseerrProvider(
+                    url=self.overseerr_url,
+                    api_key=self.overseerr_api_key
+                )
+                self.logger.info("Overseerr service initialized.")
+            elif self.overseerr_enabled:
+                self.logger.warning("Overseerr is enabled but URL or API key is missing. Overseerr service not initialized.")
+            else:
+                self.logger.info("Overseerr integration is disabled.")
+
+        if "tmdb" in services_to_build:
+            services["tmdb"] = TMDB(
+                tmdb_api_key=self.tmdb_api_key,
+                db=self.db,
+                search_cache_ttl=self.tmdb_search_cache_ttl,
+                detail_cache_ttl=self.tmdb_detail_cache_ttl
             )
-            self.logger.info("Overseerr service initialized.")
-        elif self.overseerr_enabled:
-            self.logger.warning("Overseerr is enabled but URL or API key is missing. Overseerr service not initialized.")
-        else:
-            self.logger.info("Overseerr integration is disabled.")
-            
-        self.tmdb = TMDB(tmdb_api_key=self.tmdb_api_key)
-
-        # Initialize LLMService with configured providers and settings
-        self.llm_service = LLMService(
-            logger=self.logger,
-            settings_service=self.settings,
-            db_service=self.db, # Pass the database instance
-            enabled_providers=self.enabled_providers,
-            gemini_provider=self.gemini,
-            ollama_provider=self.ollama,
-            openai_provider=self.openai, # Pass the OpenAIProvider instance
-            jellyfin_provider=self.jellyfin,
-            plex_provider=self.plex,
-            trakt_provider=self.trakt
-        )
-        # Initialize ResearchService
-        self.research_service = ResearchService(
-            settings_service=self.settings,
-            llm_service=self.llm_service,
-            db_service=self.db
-        )
-        self.logger.info("Discovarr configuration processed and services (re)initialized.")
+
+        return services
 
     def _validate_configuration(self) -> None:
         """
@@ -494,11 +591,62 @@ class Discovarr:
                 "method": "search",
                 "media_name": media_name
             }
+        return await self._generate_and_enrich_suggestions(prompt=prompt, reference=ref, media_name=media_name, search_id=search_id)
+
+    async def get_similar_media_for_titles(self, media_names: List[str], search_id: Optional[int] = None) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Gets similar media suggestions for several seed titles with a single LLM call.
+        Each suggestion is attributed to the seed it relates to via source_title.
+
+        Args:
+            media_names (List[str]): The seed titles.
+            search_id (Optional[int]): The saved search ID the suggestions belong to.
+
+        Returns:
+            Union[List[Dict[str, Any]], Dict[str, Any]]: 
+                A list of suggestion dictionaries on success, 
+                or an error dictionary {'success': False, 'message': ..., 'status_code': ...} on failure.
+        """
+        if not self.llm_service:
+            self.logger.error("LLMService is not initialized.")
+            return {'success': False, 'message': "LLMService not initialized.", 'status_code': 500}
+
+        seeds = ", ".join(f'"{name}"' for name in media_names)
+        prompt = self.llm_service.get_prompt(limit=self.suggestion_limit, media_name=seeds, template_string=DEFAULT_PROMPT_MULTI_SEED_TEMPLATE)
+        ref = {
+            "method": "search",
+            "search_id": search_id,
+            "media_names": media_names
+        }
+        return await self._generate_and_enrich_suggestions(
+            prompt=prompt,
+            reference=ref,
+            media_name=None,
+            search_id=search_id,
+            response_model=SeededSuggestionList,
+            seed_titles=media_names
+        )
+
+    async def _generate_and_enrich_suggestions(self, prompt: str, reference: Dict[str, Any], media_name: Optional[str], search_id: Optional[int], response_model: Optional[Any] = None, seed_titles: Optional[List[str]] = None) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Sends a rendered prompt to the LLM and enriches the returned suggestions.
+
+        Args:
+            prompt (str): The rendered prompt.
+            reference (Dict[str, Any]): Reference stored with the token usage stats.
+            media_name (Optional[str]): The seed title used as source_title for every suggestion.
+            search_id (Optional[int]): The saved search ID the suggestions belong to.
+            response_model (Optional[Any]): Structured response schema override for the LLM.
+            seed_titles (Optional[List[str]]): For multi-seed prompts, the titles a suggestion's source_title must match.
+
+        Returns:
+            Union[List[Dict[str, Any]], Dict[str, Any]]: Suggestions on success or an error dictionary.
+        """
         provider_result = await self.llm_service.generate_suggestions(
             prompt=prompt,
             system_prompt=self.system_prompt,
-            reference=json.dumps(ref)
-            # kwargs for specific providers can be passed here if LLMService is adapted
+            reference=json.dumps(reference),
+            response_model=response_model
             # For now, temperature and thinking_budget are handled within LLMService via settings
         )
 
@@ -524,24 +672,69 @@ class Discovarr:
         suggestions_from_llm = llm_api_response_content.get("suggestions", [])
         processed_suggestions_for_client: List[Dict[str, Any]] = []
 
+        # Attribute each suggestion to its seed. Multi-seed responses carry source_title per suggestion.
+        seeds_by_key = {title.strip().lower(): title for title in (seed_titles or [])}
+        source_titles = []
         for media in suggestions_from_llm:
+            llm_source_title = media.get("source_title")
+            if seed_titles and llm_source_title:
+                source_titles.append(seeds_by_key.get(llm_source_title.strip().lower(), llm_source_title))
+            else:
+                source_titles.append(media_name)
+
+        # Enrich all suggestions concurrently (bounded), keeping the LLM's ordering in the result
+        semaphore = asyncio.Semaphore(max(1, self.enrichment_concurrency or 1))
+        enrichment_results = await asyncio.gather(
+            *(self._enrich_suggestion(media, source_title, search_id, semaphore) for media, source_title in zip(suggestions_from_llm, source_titles)),
+            return_exceptions=True
+        )
+        for media, result in zip(suggestions_from_llm, enrichment_results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Failed to enrich suggestion {media.get('title')}: {result}", exc_info=result)
+            elif result:
+                processed_suggestions_for_client.append(result)
+        
+        # This block should be outside the loop, after all suggestions are processed.
+        if search_id:
+            now = datetime.now()
+            self.logger.debug(f"Updating Search ID: {search_id}, Last Run Date: {now}")
+            self.db.update_search_run_date(search_id=search_id, last_run_date=now)
+
+        return processed_suggestions_for_client
+        # Error case is handled by returning the provider_result dictionary earlier
+
+    async def _enrich_suggestion(self, media: Dict[str, Any], media_name: Optional[str], search_id: Optional[int], semaphore: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        """
+        Enriches a single LLM suggestion with TMDB data, caches its poster and persists it.
+        Runs under the given semaphore so only a bounded number of suggestions are enriched at once.
+
+        Args:
+            media (Dict[str, Any]): A suggestion from the LLM response.
+            media_name (Optional[str]): The media the suggestions were generated for.
+            search_id (Optional[int]): The saved search ID, if running a saved search.
+            semaphore (asyncio.Semaphore): Limits concurrent enrichment.
+
+        Returns:
+            Optional[Dict[str, Any]]: The media data for the client, or None if the suggestion was skipped.
+        """
+        async with semaphore:
             title = media.get("title")
             media_type = media.get("mediaType") # Assuming this matches your Suggestion model
             
             if not title or not media_type:
                 self.logger.warning(f"Skipping suggestion due to missing title or mediaType: {media}")
-                continue
+                return None
             
             # Lookup TMDB ID
-            tmdb_lookup = self.tmdb.lookup_media(title, media_type)
+            tmdb_lookup = await self.tmdb.lookup_media_async(title, media_type)
             if tmdb_lookup:
                 tmdb_id = tmdb_lookup.get("id")
                 # Get media details from TMDB
-                tmdb_media_detail = self.tmdb.get_media_detail(tmdb_id=tmdb_id, media_type=media_type)
+                tmdb_media_detail = await self.tmdb.get_media_detail_async(tmdb_id=tmdb_id, media_type=media_type)
 
                 # Get poster art from TMDB if tmdb_media_detail is not None
                 poster_url = None
-                poster_url_source =  f"https://image.tmdb.org/t/p/w500{tmdb_media_detail.get('poster_path')}" 
+                poster_url_source = f"https://image.tmdb.org/t/p/w500{tmdb_media_detail.get('poster_path')}" if tmdb_media_detail and tmdb_media_detail.get('poster_path') else None
                 # Ensure we have a URL and an ID for caching. Only save to cache if necessary.
                 if poster_url_source and tmdb_id and (self.auto_media_save or search_id): 
                     poster_url = await self._cache_image_if_needed(poster_url_source, "media", tmdb_id)
@@ -565,8 +758,9 @@ class Discovarr:
 
                 release_date_val = tmdb_media_detail.get("release_date") if media_type == "movie" and tmdb_media_detail else (tmdb_media_detail.get("last_air_date") if tmdb_media_detail else None)
 
-                # Search for existing media in database
-                existing_media = self.db.search_media(title) # This returns a list
+                # Search for existing media in database, the TMDB ID is the canonical identity
+                existing_by_tmdb_id = self.db.get_media_by_tmdb_id(tmdb_id, media_type) if tmdb_id else None
+                existing_media = [existing_by_tmdb_id] if existing_by_tmdb_id else self.db.search_media(title) # This returns a list
                 if not existing_media:
                     # Create new media entry if it doesn't exist
                     media_data = {
@@ -586,7 +780,7 @@ class Discovarr:
                         "release_date": release_date_val,
                         "networks": ", ".join(network_names) if network_names and isinstance(network_names, list) else None,
                         "genres": ", ".join(genre_names) if genre_names else None,
-                        "original_language": tmdb_media_detail.get("original_language"),
+                        "original_language": tmdb_media_detail.get("original_language") if tmdb_media_detail else None,
                         "search_id": search_id,
                     }
                     # Save results if running an ad-hoc search with the Auto Media Save option selected or when running a saved search.
@@ -615,7 +809,7 @@ class Discovarr:
                         "release_date": release_date_val,
                         "networks": ", ".join(network_names) if network_names and isinstance(network_names, list) else None,
                         "genres": ", ".join(genre_names) if genre_names else None,
-                        "original_language": tmdb_media_detail.get("original_language"),
+                        "original_language": tmdb_media_detail.get("original_language") if tmdb_media_detail else None,
                     }
                     # Save results if running an ad-hoc search with the Auto Media Save option selected or when running a saved search.
                     if self.auto_media_save or search_id: 
@@ -626,16 +820,8 @@ class Discovarr:
                             self.logger.error(f"Failed to update media entry for {title}")
 
                 self.logger.debug(f"Media: {media_data}")
-                processed_suggestions_for_client.append(media_data)
-        
-        # This block should be outside the loop, after all suggestions are processed.
-        if search_id:
-            now = datetime.now()
-            self.logger.debug(f"Updating Search ID: {search_id}, Last Run Date: {now}")
-            self.db.update_search_run_date(search_id=search_id, last_run_date=now)
-
-        return processed_suggestions_for_client
-        # Error case is handled by returning the provider_result dictionary earlier
+                return media_data
+            return None
 
     def get_research_prompt(self, media_name: Optional[str] = None, template_string: Optional[str] = None) -> str:
         """
@@ -772,11 +958,32 @@ class Discovarr:
 
             watch_history = self.db.get_watch_history(limit=self.recent_limit, processed=False)
 
+            # Group history entries by title so a title watched by several users is only sent once
+            history_ids_by_title: Dict[str, List[int]] = {}
             for history in watch_history:
-                media_name = history.get("title")
-                similar_media_result = await self.get_similar_media(media_name=media_name, search_id=search_id)
-                if similar_media_result:
-                    self.db.update_watch_history_processed(history.get("id"), processed=True)
+                media_name = (history.get("media") or {}).get("title")
+                if media_name:
+                    history_ids_by_title.setdefault(media_name, []).append(history.get("id"))
+
+            # Send batch_size titles per LLM call and mark each batch processed in one statement
+            titles = list(history_ids_by_title.keys())
+            batch_size = max(1, self.watch_history_batch_size or 1)
+            if batch_size > 1 and (self.default_prompt or "").strip() != DEFAULT_PROMPT_TEMPLATE.strip():
+                # Batches use the built-in multi-seed template, which would silently replace a customized prompt
+                self.logger.info("app.default_prompt is customized. Processing watch history one title per prompt to use it.")
+                batch_size = 1
+            for i in range(0, len(titles), batch_size):
+                batch_titles = titles[i:i + batch_size]
+                self.logger.info(f"Processing watch history batch: {batch_titles}")
+                if batch_size == 1:
+                    similar_media_result = await self.get_similar_media(media_name=batch_titles[0], search_id=search_id)
+                else:
+                    similar_media_result = await self.get_similar_media_for_titles(media_names=batch_titles, search_id=search_id)
+                if isinstance(similar_media_result, list):
+                    batch_history_ids = [history_id for title in batch_titles for history_id in history_ids_by_title[title]]
+                    self.db.bulk_update_watch_history_processed(batch_history_ids, processed=True)
+                else:
+                    self.logger.error(f"Failed to get suggestions for batch {batch_titles}: {similar_media_result.get('message')}")
 
             if len(watch_history) == 0:
                 self.logger.info("No new watch history items to process.")
@@ -801,8 +1008,8 @@ class Discovarr:
 
     async def _cache_image_if_needed(self, image_url: str, provider_name: str, item_id: Union[str, int]) -> Optional[str]:
         """
-        Asynchronously caches an image if a valid external URL is provided.
-        Returns the path to the cached image or the original URL if caching is skipped/failed.
+        Queues an image for caching if a valid external URL is provided.
+        Returns the cache filename right away, or the original URL if caching is skipped/failed.
         """
         original_url = image_url # Keep original URL as fallback
         if not image_url or not item_id:
@@ -815,19 +1022,76 @@ class Discovarr:
             return
 
         try:
-            # Create a new session for each task for simplicity in fire-and-forget.
-            # For very high volume, a shared session might be considered.
-            async with aiohttp.ClientSession() as session:
-                cached_path = await self.image_cache.save_image_from_url(session, image_url, provider_name, str(item_id))
-                return cached_path if cached_path else original_url
+            # The download finishes in the background; the filename is valid once it lands in the cache.
+            cached_path = self.image_cache.queue_image(image_url, provider_name, str(item_id))
+            return cached_path if cached_path else original_url
         except Exception as e:
-            self.logger.error(f"Exception in image caching task for {provider_name} item {item_id} (URL: {image_url}): {e}", exc_info=True)
+            self.logger.error(f"Exception queueing image cache for {provider_name} item {item_id} (URL: {image_url}): {e}", exc_info=True)
         return original_url # Fallback to original URL on error
 
-    async def _sync_watch_history_to_db(self, user_name: str, user_id: str, recently_watched_items: Optional[List[ItemsFiltered]], source: str) -> Optional[List[ItemsFiltered]]:
+    async def _build_watch_history_media(self, item: ItemsFiltered, source: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """
+        Builds the Media row for a watched item that is not in the database yet,
+        using TMDB details and caching the poster.
+        """
+        async with semaphore:
+            self.logger.info(f"Media '{item.name}', type: ({item.type}) not found in DB. Creating new entry from {source} watch history.")
+            tmdb_details = await self.tmdb.get_media_detail_async(tmdb_id=item.id, media_type=item.type) if self.tmdb else None
+            
+            poster_url_source_val = item.poster_url # Use poster from provider if available
+            cached_poster_path = None
+
+            if not poster_url_source_val and tmdb_details and tmdb_details.get("poster_path"):
+                poster_url_source_val = f"https://image.tmdb.org/t/p/w500{tmdb_details.get('poster_path')}"
+            
+            if poster_url_source_val:
+                 cached_poster_path = await self._cache_image_if_needed(poster_url_source_val, source, item.id)
+        
+        network_names = []
+        genre_names = []
+        release_date_val = None
+        original_language_val = None
+        description_val = None
+        media_status_val = None
+
+        if tmdb_details:
+            description_val = tmdb_details.get("overview")
+            media_status_val = tmdb_details.get("status")
+            original_language_val = tmdb_details.get("original_language")
+            release_date_val = tmdb_details.get("release_date") if item.type == "movie" else tmdb_details.get("last_air_date")
+            if item.type == "tv" and tmdb_details.get("networks"):
+                network_names = [net.get("name") for net in tmdb_details.get("networks", []) if net.get("name")]
+            if tmdb_details.get("genres"):
+                genre_names = [g.get("name") for g in tmdb_details.get("genres", [])]
+
+        return {
+            "title": item.name,
+            "tmdb_id": item.id,
+            "media_type": item.type,
+            "entity_type": "library", 
+            "source_provider": source,
+            "source_title": None, 
+            "description": description_val,
+            "poster_url": cached_poster_path,
+            "poster_url_source": poster_url_source_val,
+            "release_date": release_date_val or None,
+            "networks": ", ".join(network_names) if network_names else None,
+            "genres": ", ".join(genre_names) if genre_names else None,
+            "original_language": original_language_val,
+            "media_status": media_status_val,
+            "watched": True,
+            "favorite": item.is_favorite,
+            "watch_count": 1,
+            "ignore": False 
+        }
+
+    async def _sync_watch_history_to_db(self, user_name: str, user_id: str, recently_watched_items: Optional[List[ItemsFiltered]], source: str, write_lock: Optional[asyncio.Lock] = None) -> Optional[List[ItemsFiltered]]:
         """
         Helper method to filter and add/update watch history items in the database.
         `recently_watched_items` is expected to be a list of ItemsFiltered.
+        Existing media is matched in bulk, missing media is built concurrently, and the
+        whole batch is written in a single transaction in a worker thread. Only that write
+        holds write_lock, so TMDB lookups and poster queueing of other users are not serialized.
         Returns the list of unique, filtered items (ItemsFiltered) that were processed.
         """
         if recently_watched_items is None or not recently_watched_items:
@@ -842,208 +1106,205 @@ class Discovarr:
             self.logger.error(f"Received items for {source} are not all ItemsFiltered. Aborting DB sync for this batch.")
             return []
 
-        if unique_items: # unique_items is List[ItemsFiltered]
-            for item in unique_items: # item is ItemsFiltered
-                if not isinstance(item, ItemsFiltered): # Defensive check
-                    self.logger.warning(f"Skipping item due to unexpected type in unique_items for {source}: {type(item)}")
-                    continue
-                if not item.id or not item.type or not item.name:
-                    self.logger.warning(f"Skipping item from {source} due to missing id, type, or name: {item}")
-                    continue
-                
-                # Find or create Media record
-                media_instance = Media.get_or_none((fn.Lower(Media.title) == item.name.lower()) & (Media.media_type == item.type))
-                newly_created_media = False
-
-                if not media_instance:
-                    self.logger.info(f"Media '{item.name}', type: ({item.type}) not found in DB. Creating new entry from {source} watch history.")
-                    tmdb_details = self.tmdb.get_media_detail(tmdb_id=item.id, media_type=item.type) if self.tmdb else None
-                    
-                    poster_url_source_val = item.poster_url # Use poster from provider if available
-                    cached_poster_path = None
-
-                    if not poster_url_source_val and tmdb_details and tmdb_details.get("poster_path"):
-                        poster_url_source_val = f"https://image.tmdb.org/t/p/w500{tmdb_details.get('poster_path')}"
-                    
-                    if poster_url_source_val:
-                         cached_poster_path = await self._cache_image_if_needed(poster_url_source_val, source, item.id)
-                    
-                    network_names = []
-                    genre_names = []
-                    release_date_val = None
-                    original_language_val = None
-                    description_val = None
-                    media_status_val = None
-
-                    if tmdb_details:
-                        description_val = tmdb_details.get("overview")
-                        media_status_val = tmdb_details.get("status")
-                        original_language_val = tmdb_details.get("original_language")
-                        release_date_val = tmdb_details.get("release_date") if item.type == "movie" else tmdb_details.get("last_air_date")
-                        if item.type == "tv" and tmdb_details.get("networks"):
-                            network_names = [net.get("name") for net in tmdb_details.get("networks", []) if net.get("name")]
-                        if tmdb_details.get("genres"):
-                            genre_names = [g.get("name") for g in tmdb_details.get("genres", [])]
-
-                    media_data_for_creation = {
-                        "title": item.name,
-                        "tmdb_id": item.id,
-                        "media_type": item.type,
-                        "entity_type": "library", 
-                        "source_provider": source,
-                        "source_title": None, 
-                        "description": description_val,
-                        "poster_url": cached_poster_path,
-                        "poster_url_source": poster_url_source_val,
-                        "release_date": release_date_val,
-                        "networks": ", ".join(network_names) if network_names else None,
-                        "genres": ", ".join(genre_names) if genre_names else None,
-                        "original_language": original_language_val,
-                        "media_status": media_status_val,
-                        "watched": True,
-                        "favorite": item.is_favorite,
-                        "watch_count": 1,
-                        "ignore": False 
-                    }
-                    media_pk = self.db.create_media(media_data_for_creation)
-                    if media_pk:
-                        media_instance = Media.get_by_id(media_pk)
-                        newly_created_media = True
+        valid_items = []
+        for item in unique_items: # item is ItemsFiltered
+            if not item.id or not item.type or not item.name:
+                self.logger.warning(f"Skipping item from {source} due to missing id, type, or name: {item}")
+                continue
+            valid_items.append(item)
+        if not valid_items:
+            return []
+
+        entries = [
+            {"title": item.name, "media_type": item.type, "tmdb_id": item.id, "source_provider": source, "last_played_date": item.last_played_date}
+            for item in valid_items
+        ]
+        matches = await asyncio.to_thread(self.db.find_watch_history_media, entries)
+        if matches is None:
+            self.logger.error(f"Could not match watch history media for {user_name} from {source}. Skipping DB sync for this batch.")
+            return []
+
+        # Build one Media row per missing title, fetching TMDB details and posters concurrently
+        missing_items: Dict[tuple, ItemsFiltered] = {}
+        missing_tmdb_ids = set()
+        for item, media in zip(valid_items, matches):
+            # Media is unique by TMDB ID and media type, create one row per ID even if titles differ
+            if not media and (item.type, item.id) not in missing_tmdb_ids:
+                missing_items.setdefault((item.type, item.name.lower()), item)
+                missing_tmdb_ids.add((item.type, item.id))
+        semaphore = asyncio.Semaphore(max(1, self.enrichment_concurrency or 1))
+        new_media = await asyncio.gather(*(self._build_watch_history_media(item, source, semaphore) for item in missing_items.values()))
+
+        async with write_lock or asyncio.Lock():
+            synced_count = await asyncio.to_thread(self.db.sync_watch_history_batch, watched_by=user_name, entries=entries, new_media=list(new_media))
+        if synced_count is None:
+            self.logger.error(f"Failed to sync watch history for {user_name} from {source}.")
+            return []
+
+        self.logger.info(f"Synced and added/updated {len(unique_items)} unique recently watched title(s) for {user_name} from {source}.")
+        return unique_items
+    
+    async def refresh_library_snapshot(self, provider_name: Optional[str] = None) -> Dict[str, bool]:
+        """
+        Refreshes the library snapshot used for the {{all_media}} and {{favorites}} prompt variables.
+
+        Args:
+            provider_name (Optional[str]): Only refresh this provider. If None, refreshes all enabled library providers.
+
+        Returns:
+            Dict[str, bool]: Per provider, whether the refresh succeeded.
+        """
+        providers = {}
+        if self.jellyfin_enabled and self.jellyfin_enable_media and self.jellyfin:
+            providers[JellyfinProvider.PROVIDER_NAME] = self.jellyfin
+        if self.plex_enabled and self.plex_enable_media and self.plex:
+            providers[PlexProvider.PROVIDER_NAME] = self.plex
+
+        results: Dict[str, bool] = {}
+        for name, provider in providers.items():
+            if provider_name and name != provider_name:
+                continue
+            # Provider clients are blocking, keep the event loop free while scanning the library
+            results[name] = await asyncio.to_thread(self.library_snapshot.refresh, name, provider)
+        if not results:
+            self.logger.info("No library providers with media enabled to refresh the snapshot for.")
+        return results
+
+    async def clean_image_cache(self) -> Dict[str, int]:
+        """
+        Removes cached images no media entry uses any more, then evicts least recently used images
+        until the cache fits the image_cache_max_size_mb budget.
+
+        Returns:
+            Dict[str, int]: The number of orphaned and evicted images.
+        """
+        orphaned = await asyncio.to_thread(self.image_cache.collect_orphans)
+        evicted = await asyncio.to_thread(self.image_cache.enforce_budget)
+        self.logger.info(f"Image cache cleanup finished: {orphaned} orphaned and {evicted} evicted image(s) removed.")
+        return {"orphaned": orphaned, "evicted": evicted}
+
+    @staticmethod
+    def _parse_played_date(last_played_date: Optional[str]) -> Optional[datetime]:
+        """Parses an ISO 8601 play date into a naive UTC datetime, None if missing or invalid."""
+        if not last_played_date:
+            return None
+        try:
+            parsed = datetime.fromisoformat(last_played_date)
+        except ValueError:
+            return None
+        return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+    async def _sync_provider_watch_history(self, provider_name: str, provider: Any, write_lock: asyncio.Lock) -> List[Dict[str, Any]]:
+        """
+        Syncs watch history for every user of one library provider. Users are fetched and enriched concurrently,
+        fetches capped per provider, while only the database writes wait on the shared writer lock.
+        Each user's sync state holds the newest play already synced, only plays after it are fetched.
+        Users without a sync state get their full history. Providers with a history activity marker (Trakt)
+        skip the history request entirely while the marker is unchanged.
+
+        Args:
+            provider_name (str): The provider name (e.g., 'jellyfin', 'plex', 'trakt').
+            provider (Any): The provider instance.
+            write_lock (asyncio.Lock): Serializes the database writes across all providers.
+
+        Returns:
+            List[Dict[str, Any]]: One entry per synced user with 'name', 'id' and 'recent_titles'.
+        """
+        try:
+            users = await provider.get_users_async()
+        except Exception as e:
+            self.logger.error(f"Error fetching {provider_name} users: {e}", exc_info=True)
+            return []
+        if not users:
+            self.logger.warning(f"No {provider_name} users found to sync watch history.")
+            return []
+
+        self.logger.info(f"Starting {provider_name} watch history sync for {len(users)} user(s).")
+        semaphore = asyncio.Semaphore(self._SYNC_PROVIDER_CONCURRENCY.get(provider_name, 1))
+
+        async def sync_user(user_data: LibraryUser) -> Optional[Dict[str, Any]]:
+            user_name = user_data.name
+            user_id = user_data.id
+            if not user_name or not user_id:
+                self.logger.warning(f"Skipping {provider_name} user with missing name or id: {user_data}")
+                return None
+            user_result = {"name": user_name, "id": user_id, "recent_titles": []} # Reported even if no items are found
+            try:
+                async with semaphore: # Also caps the activity marker requests (Trakt sync/last_activities)
+                    sync_state = await asyncio.to_thread(self.db.get_sync_state, provider_name, user_id)
+                    since = sync_state.get("last_played_date") if sync_state else None
+                    activity_marker = await asyncio.to_thread(provider.get_history_activity_marker, user_id)
+                    if sync_state and activity_marker and activity_marker == sync_state.get("activity_marker"):
+                        self.logger.debug(f"{provider_name} history for user {user_name} unchanged since the last sync ({activity_marker}), skipping.")
+                        return user_result
+                    if since:
+                        self.logger.debug(f"Syncing {provider_name} watch history for user: {user_name} (ID: {user_id}) played after {since.isoformat()} UTC")
                     else:
-                        self.logger.error(f"Failed to create Media entry for '{item.name}'. Skipping WatchHistory add.")
-                        continue 
-                
-                if media_instance:
-                    add_history_success = self.db.add_watch_history(
-                        media_id=media_instance.id, 
-                        watched_by=user_name, 
-                        last_played_date_iso=item.last_played_date
+                        self.logger.debug(f"No sync state for {provider_name} user: {user_name} (ID: {user_id}), syncing all history.")
+
+                    recently_watched_items = await asyncio.to_thread(
+                        provider.get_recently_watched, user_id=user_id, limit=None,
+                        since=since.replace(tzinfo=timezone.utc) if since else None
                     )
-                    if add_history_success:
-                        self.logger.info(f"Successfully added/updated WatchHistory for '{media_instance.title}' by {user_name}.")
-                        watch_count = (media_instance.watch_count or 0) + 1
-                        self.logger.info(f"Updating media instance '{media_instance.title}' with watch count: {watch_count} and watched status (True).")
-                        if not newly_created_media: 
-                            media_instance.watch_count = watch_count
-                            media_instance.watched = True
-                            media_instance.updated_at = datetime.now()
-                            media_instance.save()
-                    else:
-                        self.logger.error(f"Skipped add/update WatchHistory for '{media_instance.title}' by {user_name}.")
-                
-            self.logger.info(f"Synced and added/updated {len(unique_items)} unique recently watched title(s) for {user_name} from {source}.")
-            return unique_items
-        return []
-    
+                if recently_watched_items is None:
+                    return user_result # Fetch failed, keep the watermark so the next run retries
+
+                if since:
+                    # Providers may include plays at the watermark itself, those were synced already
+                    recently_watched_items = [
+                        item for item in recently_watched_items
+                        if (self._parse_played_date(item.last_played_date) or datetime.max) > since
+                    ]
+                newest_played = max(
+                    (played for played in (self._parse_played_date(item.last_played_date) for item in recently_watched_items) if played),
+                    default=None
+                )
+
+                synced_items = []
+                if recently_watched_items: # List[ItemsFiltered]
+                    synced_items = await self._sync_watch_history_to_db(user_name=user_name, user_id=user_id, recently_watched_items=recently_watched_items, source=provider_name, write_lock=write_lock)
+                    user_result["recent_titles"] = [item.name for item in synced_items]
+                if synced_items or not recently_watched_items:
+                    async with write_lock:
+                        await asyncio.to_thread(self.db.update_sync_state, provider_name, user_id, user_name, newest_played if synced_items else None, activity_marker)
+            except Exception as e:
+                self.logger.error(f"Error syncing {provider_name} watch history for user {user_name}: {e}", exc_info=True)
+            return user_result
+
+        results = await asyncio.gather(*(sync_user(user_data) for user_data in users))
+        return [result for result in results if result]
+
     async def sync_watch_history(self) -> Dict[str, Dict[str, Any]]:
         """
-        Retrieves the list of available Gemini models.
+        Syncs the watch history of every enabled library provider into the database.
+        Providers and their users are fetched concurrently, so the sync takes about as long as the slowest provider.
 
         Returns:
-            Optional[List[Dict[str, Any]]]: A list of model details or None if Gemini service is not available or an error occurs.
+            Dict[str, Dict[str, Any]]: Per user name, the user's 'id' and the sorted, unique 'recent_titles' that were synced.
         """
         all_users_data: Dict[str, Dict[str, Any]] = {}
 
-        # Sync Jellyfin history
-        if self.jellyfin_enabled and self.jellyfin_enable_history:
-            jellyfin_users = self.jellyfin.get_users()
-            if not jellyfin_users:
-                self.logger.warning("No Jellyfin users found to sync watch history.")
-            else:
-                self.logger.info(f"Starting Jellyfin watch history sync for {len(jellyfin_users)} user(s).")
-                limit_for_provider = None 
-                history_count = self.db.get_media_count_for_provider("jellyfin")
-                if history_count == 0:
-                    self.logger.debug(f"Jellfin watch history count={history_count}, syncing all history.")
-                else:
-                    self.logger.debug(f"Jellyfin watch history count={history_count}, syncing last {self.recent_limit} items from watch history.")
-                    limit_for_provider =self.recent_limit
-
-                for user_data in jellyfin_users:
-                    user_name = user_data.name # user_data is LibraryUser
-                    user_id = user_data.id # Access .id
-                    if not user_name or not user_id:
-                        self.logger.warning(f"Skipping Jellyfin user with missing Name or Id: {user_data}")
-                        continue # user_data is LibraryUser
-                    self.logger.debug(f"Syncing watch history for Jellyfin user: {user_name} (ID: {user_id})")
-
-                    # Ensure user is in the results dict, even if no items are found later
-                    all_users_data.setdefault(user_name, {"id": user_id, "recent_titles": []})
-                    
-                    recently_watched_items = self.jellyfin.get_recently_watched(
-                        user_id=user_id, limit=limit_for_provider
-                    )
-                    if recently_watched_items: # recently_watched_items is now List[ItemsFiltered]
-                        synced_items = await self._sync_watch_history_to_db(user_name=user_name, user_id=user_id, recently_watched_items=recently_watched_items, source="jellyfin")
-                        filtered_item_names = [item.name for item in synced_items]
-                        all_users_data[user_name]["recent_titles"].extend(filtered_item_names)
-        else:
-            self.logger.debug("Jellyfin service not configured or history sync disabled. Skipping Jellyfin watch history sync.")
-
-        # Sync Plex history
-        if self.plex_enabled and self.plex_enable_history:
-            plex_users = self.plex.get_users() # These are managed accounts
-            if not plex_users: # If no managed users, consider syncing for the main account if desired
-                self.logger.warning("No managed Plex users found to sync watch history.")
-                # Optionally, you could add logic here to sync for the main account if plex_users is empty
+        providers = []
+        for provider_name, enabled, enable_history, provider in (
+            ("jellyfin", self.jellyfin_enabled, self.jellyfin_enable_history, self.jellyfin),
+            ("plex", self.plex_enabled, self.plex_enable_history, self.plex),
+            ("trakt", self.trakt_enabled, self.trakt_enable_history, self.trakt),
+        ):
+            if enabled and enable_history and provider:
+                providers.append((provider_name, provider))
             else:
-                self.logger.info(f"Starting Plex watch history sync for {len(plex_users)} managed user(s).")
-                for user_data in plex_users: # user_data is a dict from Plex API
-                    user_name = user_data.name # user_data is LibraryUser
-                    user_id = user_data.id # Access .id
-                    if not user_name or not user_id:
-                        self.logger.warning(f"Skipping Plex user with missing name or id: {user_data}")
-                        continue
-                    self.logger.debug(f"Syncing watch history for Plex user: {user_name} (ID: {user_id})")
-
-                    # Ensure user is in the results dict, even if no items are found later
-                    all_users_data.setdefault(user_name, {"id": user_id, "recent_titles": []})
-
-                    # TODO: Fix to check media table instead
-                    history_count = self.db.get_media_count_for_provider("plex")
-                    limit_for_provider = None 
-                    if history_count == 0:
-                        self.logger.debug(f"Plex watch history count={history_count}, syncing all history.")
-                    else:
-                        self.logger.debug(f"Plex watch history count={history_count}, syncing last {self.recent_limit} items from watch history.")
-                        limit_for_provider =self.recent_limit
-                    recently_watched_items = self.plex.get_recently_watched(user_id=user_id, limit=limit_for_provider)
-                    if recently_watched_items: # recently_watched_items is now List[ItemsFiltered]
-                        synced_items = await self._sync_watch_history_to_db(user_name=user_name, user_id=user_id, recently_watched_items=recently_watched_items, source="plex")
-                        filtered_item_names = [item.name for item in synced_items]
-                        all_users_data[user_name]["recent_titles"].extend(filtered_item_names)
-        else:
-            self.logger.debug("Plex service not configured or history sync disabled. Skipping Plex watch history sync.")
+                self.logger.debug(f"{provider_name} service not configured or history sync disabled. Skipping {provider_name} watch history sync.")
 
-        # Sync Trakt history
-        if self.trakt_enabled and self.trakt_enable_history:
-            trakt_users = self.trakt.get_users() # Trakt usually returns one user
-            if not trakt_users:
-                self.logger.warning("No Trakt users found to sync watch history.")
-            else:
-                self.logger.info(f"Starting Trakt watch history sync for {len(trakt_users)} user(s).")
-                for user_data in trakt_users: # user_data is LibraryUser
-                    user_name = user_data.name
-                    user_id = user_data.id # Trakt user slug can be used as ID
-                    self.logger.debug(f"Syncing watch history for Trakt user: {user_name} (ID: {user_id})")
-
-                    # Ensure user is in the results dict, even if no items are found later
-                    all_users_data.setdefault(user_name, {"id": user_id, "recent_titles": []})
-
-                    history_count = self.db.get_media_count_for_provider("trakt")
-                    limit_for_provider = None 
-                    if history_count == 0:
-                        self.logger.debug(f"Trakt watch history count={history_count}, syncing all history.")
-                    else:
-                        self.logger.debug(f"Trakt watch history count={history_count}, syncing last {self.recent_limit} items from watch history.")
-                        limit_for_provider =self.recent_limit
-                    recently_watched_items = self.trakt.get_recently_watched(user_id=user_id, limit=limit_for_provider)
-                    if recently_watched_items: # recently_watched_items is now List[ItemsFiltered]
-                        synced_items = await self._sync_watch_history_to_db(user_name=user_name, user_id=user_id, recently_watched_items=recently_watched_items, source="trakt")
-                        filtered_item_names = [item.name for item in synced_items]
-                        all_users_data[user_name]["recent_titles"].extend(filtered_item_names)
-        else:
-            self.logger.debug("Trakt service not configured or history sync disabled. Skipping Trakt watch history sync.")
+        write_lock = asyncio.Lock() # Single writer, the providers fetch and enrich concurrently
+        provider_results = await asyncio.gather(*(
+            self._sync_provider_watch_history(provider_name, provider, write_lock) for provider_name, provider in providers
+        ))
+
+        # Merge in provider order, a user that exists in several systems keeps the first provider's id
+        for user_results in provider_results:
+            for user_result in user_results:
+                user_data = all_users_data.setdefault(user_result["name"], {"id": user_result["id"], "recent_titles": []})
+                user_data["recent_titles"].extend(user_result["recent_titles"])
 
         # Ensure uniqueness in recent_titles if a user exists in both systems with the same name
         for user_name_key in all_users_data:
@@ -1529,22 +1790,10 @@ class Discovarr:
         """
         self.logger.info("Attempting to delete all watch history items.")
         try:
-            # Get all history items to iterate for their poster_urls
-            all_history_items = self.db.get_watch_history(limit=None)
-            if all_history_items:
-                self.logger.info(f"Found {len(all_history_items)} watch history items to process for image cache deletion.")
-                for item in all_history_items:
-                    poster_filename = item.get('poster_url')
-                    if poster_filename:
-                        self.logger.debug(f"Attempting to delete cached image '{poster_filename}' for history item ID {item.get('id')}.")
-                        if not self.image_cache.delete_cached_image(poster_filename):
-                            self.logger.warning(f"Could not delete cached image '{poster_filename}' for history item ID {item.get('id')}. Proceeding.")
-            else:
-                self.logger.info("No watch history items found to delete images for.")
-
-            # Proceed to delete all history items from the database
             deleted_count = self.db.delete_all_watch_history()
             self.logger.info(f"Successfully deleted {deleted_count} watch history item(s).")
+            # Posters belong to the media entries, which are kept. Callers run clean_image_cache
+            # in the background to remove unused images instead of deleting them one by one here.
             return {"success": True, "message": f"Deleted {deleted_count} watch history item(s)."}
         except Exception as e:
             self.logger.error(f"Error during the process of deleting all watch history items: {e}", exc_info=True)
@@ -1602,7 +1851,7 @@ class Discovarr:
             # If media_id is not set, try to look it up using title and media_type
             if not current_media_id and title and media_type and self.tmdb:
                 self.logger.info(f"Media ID not provided for '{title}'. Attempting TMDB lookup by title.")
-                tmdb_lookup_result = self.tmdb.lookup_media(query=title, media_type=media_type)
+                tmdb_lookup_result = await self.tmdb.lookup_media_async(query=title, media_type=media_type)
                 if tmdb_lookup_result and tmdb_lookup_result.get("id"):
                     current_media_id = str(tmdb_lookup_result.get("id")) # Ensure media_id is a string
                     self.logger.info(f"Found TMDB ID '{current_media_id}' for '{title}'.")
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
@@ -16,6 +16,8 @@ import uvicorn
 import asyncio
 
 from services.models import WatchHistoryCreateRequest # Import new Pydantic models
+from services.tmdb import transport as tmdb_transport
+from services.http_client import transport as http_transport
 # This is your original application, now specifically for API routes
 api_app = FastAPI(
     title="Discovarr API",
@@ -117,6 +119,10 @@ class SettingUpdateRequest(BaseModel):
     """Request model for updating a setting."""
     value: Optional[str] = None
 
+class SettingsBulkUpdateRequest(BaseModel):
+    """Request model for updating many settings at once, keyed by group then setting name."""
+    settings: Dict[str, Dict[str, Optional[str]]]
+
 class SettingResponse(BaseModel):
     """Response model for a setting."""
     name: str
@@ -251,6 +257,25 @@ async def sync_watch_history(
     """
     return await discovarr.sync_watch_history()
 
+@api_app.get("/library/snapshot")
+async def get_library_snapshot_status(
+    discovarr: Discovarr = Depends(get_discovarr),
+):
+    """
+    Endpoint to get the number of titles and favorites in each provider's library snapshot.
+    """
+    return discovarr.library_snapshot.get_status()
+
+@api_app.post("/library/snapshot/refresh")
+async def refresh_library_snapshot(
+    provider: Optional[str] = None,
+    discovarr: Discovarr = Depends(get_discovarr),
+):
+    """
+    Endpoint to refresh the library snapshot on demand, for all library providers or a single one.
+    """
+    return await discovarr.refresh_library_snapshot(provider_name=provider)
+
 # --- Trakt Endpoints ---
 @api_app.post("/trakt/authenticate")
 async def trakt_authenticate_endpoint(
@@ -700,10 +725,12 @@ async def get_watch_history_grouped_endpoint(
 
 @api_app.delete("/watch-history/all")
 async def delete_all_watch_history_endpoint(
+    background_tasks: BackgroundTasks,
     discovarr: Discovarr = Depends(get_discovarr),
 ):
     """
     Delete all watch history items from the database.
+    Unused cached images are cleaned up in the background after the response, the clean_image_cache schedule is left as is.
     """
     logger.info("Attempting to delete all watch history items.")
     try:
@@ -712,6 +739,7 @@ async def delete_all_watch_history_endpoint(
             # This case is less likely for 'delete all' unless there's a DB connection issue
             status_code = result.get("status_code", 500)
             raise HTTPException(status_code=status_code, detail=result.get("message"))
+        background_tasks.add_task(discovarr.clean_image_cache)
         return {"status": "success", "message": result.get("message")}
     except HTTPException: # Re-raise HTTPExceptions
         raise
@@ -1106,6 +1134,20 @@ async def update_setting(
         raise HTTPException(status_code=400, detail=f"Failed to update setting {group}.{name}")
     return {"status": "success", "message": f"Setting {group}.{name} updated successfully"}
 
+@api_app.put("/settings")
+async def update_settings(
+    request: SettingsBulkUpdateRequest,
+    discovarr: Discovarr = Depends(get_discovarr),
+) -> Dict[str, str]:
+    """
+    Update many settings at once. All values are validated and saved in one transaction,
+    then the configuration is reloaded once. Nothing is saved if any value is invalid.
+    """
+    success = discovarr.settings.set_many(request.settings)
+    if not success:
+        raise HTTPException(status_code=400, detail="Failed to update settings")
+    return {"status": "success", "message": "Settings updated successfully"}
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """
@@ -1120,6 +1162,13 @@ async def shutdown_event():
             # The shutdown method in your Schedule class handles scheduler.shutdown(wait=False)
             _discovarr_instance.scheduler.shutdown() 
         
+        logger.info("Closing TMDB connection pool...")
+        await tmdb_transport.close()
+        logger.info("Closing provider HTTP connection pool...")
+        http_transport.close()
+        logger.info("Stopping image cache downloads...")
+        await _discovarr_instance.image_cache.close()
+
         if hasattr(_discovarr_instance, 'db'):
             logger.info("Closing database connection...")
             _discovarr_instance.db.cleanup()
@@ -1130,6 +1179,22 @@ async def shutdown_event():
 # Mount the API application under the /api path prefix
 app.mount("/api", api_app)
 
+@app.get("/cache/image/{filename}", include_in_schema=False)
+async def cached_image(filename: str, size: Optional[str] = None):
+    """
+    Serves a cached image. `size` selects a resized WebP variant (e.g., "grid", "detail");
+    omit it or pass "original" for the downloaded file. Registered before the /cache mount so it takes precedence.
+    """
+    image_cache = get_discovarr().image_cache
+    if size and size != image_cache.ORIGINAL and size not in image_cache.VARIANTS:
+        raise HTTPException(status_code=400, detail=f"Unknown image size '{size}'. Use one of: {', '.join([*image_cache.VARIANTS, image_cache.ORIGINAL])}")
+    file_path = await asyncio.to_thread(image_cache.get_image_path, filename, size)
+    if file_path is None and await image_cache.restore_image(filename): # Evicted to stay within the disk budget
+        file_path = await asyncio.to_thread(image_cache.get_image_path, filename, size)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(file_path)
+
 # Mount the /cache directory to serve cached images
 cache_dir = Path("/cache")
 if cache_dir.is_dir(): # Dockerfile creates this, so it should exist
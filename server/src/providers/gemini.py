@@ -1,7 +1,7 @@
 import json
 import logging
 import sys  
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Type
 from pydantic import BaseModel
 import asyncio # For running sync code in async
 from google import genai
@@ -109,7 +109,7 @@ class GeminiProvider(LLMProviderBase):
             self.logger.debug(f"Gemini raw response for _generate_content: {response}")
             return {'success': False, 'content': None, 'token_counts': None, 'message': f"Gemini API general error: {e}"}
 
-    async def get_similar_media(self, model: str, prompt: str, system_prompt: Optional[str] = None, temperature: Optional[float] = 0.7, **kwargs: Any) -> Optional[Dict[str, Any]]:
+    async def get_similar_media(self, model: str, prompt: str, system_prompt: Optional[str] = None, temperature: Optional[float] = 0.7, response_model: Optional[Type[BaseModel]] = None, **kwargs: Any) -> Optional[Dict[str, Any]]:
         """
         Uses the Gemini API to find media similar to the given media name.
 
@@ -121,6 +121,7 @@ class GeminiProvider(LLMProviderBase):
             prompt (str): The user's prompt for suggestions.
             system_prompt (Optional[str]): System instructions for the LLM.
             temperature (Optional[float]): Controls randomness.
+            response_model (Optional[Type[BaseModel]]): Structured response schema. Defaults to SuggestionList.
             **kwargs: Additional provider-specific parameters.
                       Expected: 'thinking_budget' (Optional[float]).
 
@@ -141,7 +142,7 @@ class GeminiProvider(LLMProviderBase):
             prompt_data=prompt,
             system_prompt=system_prompt,
             temperature=temperature,
-            response_format_details=SuggestionList, # Specific Pydantic model for this task
+            response_format_details=response_model or SuggestionList, # Specific Pydantic model for this task
             thinking_budget=kwargs.get('thinking_budget') 
         )
 
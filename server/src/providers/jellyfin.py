@@ -2,18 +2,27 @@ import requests
 import json
 import logging
 import sys  
+from datetime import datetime, timezone
 from urllib.parse import urljoin, urlencode # Keep urlencode
-from typing import Optional, Dict, List, Any, Union
+from typing import Optional, Dict, List, Any, Union, Iterator, Iterable, TYPE_CHECKING
 from services.models import ItemsFiltered, LibraryUser
+from services.http_client import transport as http_transport # Shared pooled session with timeouts and retries
 from base.library_provider_base import LibraryProviderBase # Import the base class
 
+if TYPE_CHECKING:
+    from services.database import Database
+
 class JellyfinProvider(LibraryProviderBase):
     """
     A class to interact with the Jellyfin API for user and media data.
     """
 
     PROVIDER_NAME = "jellyfin"
-    def __init__(self, jellyfin_url: str, jellyfin_api_key: str, limit: int = 10):
+    ITEMS_PAGE_SIZE = 500 # Page size when streaming the library or a full watch history
+    SINCE_PAGE_SIZE = 50 # Page size when fetching plays newer than a sync watermark
+    ITEM_FIELDS = "ProviderIds" # Only extra field get_items_filtered reads. Name, Type, SeriesName and SeriesId are always returned, UserData comes with enableUserData
+    EXTERNAL_IDS_CHUNK_SIZE = 100 # Item IDs per /Items?Ids= request, keeps the URL short
+    def __init__(self, jellyfin_url: str, jellyfin_api_key: str, limit: int = 10, db: Optional['Database'] = None):
         """
         Initializes the Jellyfin class with API configurations.
 
@@ -22,6 +31,7 @@ class JellyfinProvider(LibraryProviderBase):
             jellyfin_api_key (str): The API key for Jellyfin.
             jellyfin_username (str): The username of the Jellyfin user.
             limit (int): Default limit for API requests.
+            db (Optional[Database]): Database used for the persistent external ID cache.
         """
         # Setup Logging
         self.logger = logging.getLogger(__name__)
@@ -29,6 +39,8 @@ class JellyfinProvider(LibraryProviderBase):
         self.jellyfin_url = jellyfin_url
         self.jellyfin_api_key = jellyfin_api_key
         self.limit = limit
+        self.db = db
+        self._external_ids: Dict[str, Optional[Dict[str, str]]] = {} # Item ID -> external IDs, kept for the life of the provider
 
         self.jellyfin_auth = f"MediaBrowser Client='other', Device='my-script', DeviceId='some-unique-id', Version='0.0.0', Token={self.jellyfin_api_key}"
 
@@ -37,6 +49,24 @@ class JellyfinProvider(LibraryProviderBase):
         """Returns the name of the library provider."""
         return self.PROVIDER_NAME
 
+    def _parse_users(self, users_data_raw: List[Dict[str, Any]]) -> List[LibraryUser]:
+        """Converts the /Users response into LibraryUser objects, skipping users without an ID."""
+        user_list: List[LibraryUser] = []
+        for user_dict in users_data_raw:
+            user_id = user_dict.get("Id")
+            if user_id: # Ensure user has an ID
+                thumb_url = None
+                if user_dict.get('PrimaryImageTag'):
+                     # Construct the image URL
+                     thumb_url = urljoin(self.jellyfin_url, f"/Users/{user_id}/Images/Primary?{urlencode({'tag': user_dict['PrimaryImageTag']})}")
+                user_list.append(LibraryUser(
+                    id=user_id, 
+                    name=user_dict.get("Name", "Unknown User"), 
+                    thumb=thumb_url,
+                    source_provider=self.PROVIDER_NAME
+                ))
+        return user_list
+
     def get_users(self) -> Optional[List[LibraryUser]]:
         """
         Get all users
@@ -50,25 +80,33 @@ class JellyfinProvider(LibraryProviderBase):
             "Content-Type": "application/json",
         }
         try:
-            response = requests.get(endpoint, headers=headers)
+            response = http_transport.get(endpoint, headers=headers)
+            response.raise_for_status()
+            return self._parse_users(response.json())
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Error fetching Jellyfin users: {e}")
+        except json.JSONDecodeError:
+            self.logger.error("Error decoding JSON response from Jellyfin when fetching users.")
+        except Exception as e:
+            self.logger.exception(f"An unexpected error occurred while fetching users: {e}")
+        return None
+
+    async def get_users_async(self) -> Optional[List[LibraryUser]]:
+        """
+        Get all users through the async interface of the shared transport.
+
+        Returns:
+            Optional[List[LibraryUser]]: List of user objects, or None if an error occurs.
+        """
+        endpoint = urljoin(self.jellyfin_url, "/Users")
+        headers = {
+            "Authorization": self.jellyfin_auth,
+            "Content-Type": "application/json",
+        }
+        try:
+            response = await http_transport.request_async("GET", endpoint, headers=headers)
             response.raise_for_status()
-            users_data_raw = response.json()
-            
-            user_list: List[LibraryUser] = []
-            for user_dict in users_data_raw:
-                user_id = user_dict.get("Id")
-                if user_id: # Ensure user has an ID
-                    thumb_url = None
-                    if user_dict.get('PrimaryImageTag'):
-                         # Construct the image URL
-                         thumb_url = urljoin(self.jellyfin_url, f"/Users/{user_id}/Images/Primary?{urlencode({'tag': user_dict['PrimaryImageTag']})}")
-                    user_list.append(LibraryUser(
-                        id=user_id, 
-                        name=user_dict.get("Name", "Unknown User"), 
-                        thumb=thumb_url,
-                        source_provider=self.PROVIDER_NAME
-                    ))
-            return user_list
+            return self._parse_users(response.json())
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Error fetching Jellyfin users: {e}")
         except json.JSONDecodeError:
@@ -107,54 +145,82 @@ class JellyfinProvider(LibraryProviderBase):
             Optional[Dict[str, str]]: A dictionary with keys 'tmdbid', 'tvdbid', 'imdbid'
                                       and their corresponding values, or None on error.
         """
-        try:
-            # Endpoint to get a single item by ID, including UserData for a specific user
-            endpoint = urljoin(self.jellyfin_url, f"/Users/{user_id}/Items/{item_id}")
+        return self.get_items_external_ids([item_id], user_id=user_id).get(item_id)
+
+    def get_items_external_ids(self, item_ids: Iterable[str], user_id: Optional[str] = None) -> Dict[str, Optional[Dict[str, str]]]:
+        """
+        Retrieves external provider IDs for many items. IDs are served from memory, then from the database cache,
+        and the rest are fetched with one /Items?Ids=...&Fields=ProviderIds request per EXTERNAL_IDS_CHUNK_SIZE items.
+
+        Args:
+            item_ids (Iterable[str]): The IDs of the items to resolve.
+            user_id (Optional[str]): The ID of the user in whose context to fetch the items.
+
+        Returns:
+            Dict[str, Optional[Dict[str, str]]]: Per item ID, a dict with 'tmdbid', 'tvdbid' and 'imdbid',
+                                                 or None if the item could not be resolved.
+        """
+        item_ids = list(dict.fromkeys(item_id for item_id in item_ids if item_id))
+        missing = [item_id for item_id in item_ids if item_id not in self._external_ids]
+        if missing and self.db:
+            self._external_ids.update(self.db.get_external_ids(self.PROVIDER_NAME, missing))
+            missing = [item_id for item_id in missing if item_id not in self._external_ids]
+
+        if missing:
+            fetched: Dict[str, Dict[str, str]] = {}
+            resolved: List[str] = [] # IDs from chunks that were fetched successfully
+            endpoint = urljoin(self.jellyfin_url, f"/Users/{user_id}/Items" if user_id else "/Items")
             headers = {
                 "Authorization": self.jellyfin_auth,
                 "Content-Type": "application/json",
             }
-            params = {
-                "Fields": "ProviderIds", # Only fetch ProviderIds
-            }
-            self.logger.debug(f"Get item info from endpoint: {endpoint} with params: {params}")
-
-            response = requests.get(endpoint, headers=headers, params=params)
-            response.raise_for_status()
-            raw_item = response.json()
-
-            if not raw_item:
-                self.logger.warning(f"No item found with ID {item_id} or API returned empty response.")
-                return None
-            
-            provider_ids = raw_item.get("ProviderIds", {})
-            if not provider_ids:
-                self.logger.warning(f"No ProviderIds found for item ID {item_id}.")
-                return None
-            
-            data = {
-                "tmdbid": provider_ids.get("Tmdb"),
-                "tvdbid": provider_ids.get("Tvdb"),
-                "imdbid": provider_ids.get("Imdb")
-            }
-            self.logger.debug(f"Retrieved external IDs for item ID {item_id}: {data}")
-            return data
-
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Jellyfin get_item_external_ids request failed for ID {item_id}: {e}")
-        except json.JSONDecodeError:
-            self.logger.error(f"Error decoding JSON response from Jellyfin in get_item_external_ids for ID {item_id}.")
-        except Exception as e:
-            self.logger.exception(f"An unexpected error occurred in get_item_external_ids for ID {item_id}: {e}")
-        return None
-
-    def get_recently_watched(self, user_id: str, limit: Optional[int] = None) -> Optional[List[ItemsFiltered]]:
+            for i in range(0, len(missing), self.EXTERNAL_IDS_CHUNK_SIZE):
+                chunk = missing[i:i + self.EXTERNAL_IDS_CHUNK_SIZE]
+                params = {
+                    "Ids": ",".join(chunk),
+                    "Fields": "ProviderIds", # Only fetch ProviderIds
+                    "EnableImages": "false",
+                    "EnableUserData": "false",
+                }
+                self.logger.debug(f"Get external IDs for {len(chunk)} item(s) from endpoint: {endpoint}")
+                try:
+                    response = http_transport.get(endpoint, headers=headers, params=params)
+                    response.raise_for_status()
+                    raw_items = response.json().get("Items", [])
+                except requests.exceptions.RequestException as e:
+                    self.logger.error(f"Jellyfin get_items_external_ids request failed for {len(chunk)} item(s): {e}")
+                    continue
+                except json.JSONDecodeError:
+                    self.logger.error("Error decoding JSON response from Jellyfin in get_items_external_ids.")
+                    continue
+                resolved.extend(chunk)
+                for raw_item in raw_items:
+                    provider_ids = raw_item.get("ProviderIds") or {}
+                    fetched[raw_item.get("Id")] = {
+                        "tmdbid": provider_ids.get("Tmdb"),
+                        "tvdbid": provider_ids.get("Tvdb"),
+                        "imdbid": provider_ids.get("Imdb")
+                    }
+            self.logger.debug(f"Fetched external IDs for {len(fetched)} of {len(missing)} item(s).")
+            # Only persist items with a TMDB ID, the rest may be identified later and are looked up again on the next run
+            persisted = {item_id: ids for item_id, ids in fetched.items() if ids.get("tmdbid")}
+            if persisted and self.db:
+                self.db.set_external_ids(self.PROVIDER_NAME, persisted)
+            # Items the server did not return are remembered as None until the provider is rebuilt, failed chunks are retried
+            self._external_ids.update({item_id: fetched.get(item_id) for item_id in resolved})
+
+        return {item_id: self._external_ids.get(item_id) for item_id in item_ids}
+
+    def get_recently_watched(self, user_id: str, limit: Optional[int] = None, since: Optional[datetime] = None) -> Optional[List[ItemsFiltered]]:
         """
-        Retrieves recently watched items from the Jellyfin API.
+        Retrieves recently watched items from the Jellyfin API, newest first and in pages with only the fields the filter reads.
+        With `since`, pages of SINCE_PAGE_SIZE are read until a play at or before `since` is reached,
+        so a sync with nothing new costs a single small request.
 
         Args:
             user_id (str): The unique identifier for the user.
             limit (int, optional): The maximum number of items to retrieve. Defaults to the class default.
+            since (Optional[datetime]): Only return items played after this time (UTC).
         Returns:
             Optional[List[ItemsFiltered]]: A list of filtered recently watched items, or None on error.
         """
@@ -164,29 +230,27 @@ class JellyfinProvider(LibraryProviderBase):
                 return None
 
             endpoint = urljoin(self.jellyfin_url, f"/Users/{user_id}/Items")
-            headers = {
-                "Authorization": self.jellyfin_auth,
-                "Content-Type": "application/json",
-            }
             params = {
                 "Recursive": "true",
-                "Fields": "BasicSyncInfo,MediaSource,Overview,Genres,Tags,ProductionLocations,ProviderIds,SeriesStudio,Studios",
+                "Fields": self.ITEM_FIELDS,
                 "IncludeItemTypes": "Movie,Episode",
                 "SortBy": "DatePlayed",
                 "SortOrder": "Descending",
                 "IsPlayed": "true",
                 "enableUserData": "true",
+                "EnableImages": "false",
             }
+            if since is not None:
+                page_size = self.SINCE_PAGE_SIZE
+            else:
+                page_size = min(limit, self.ITEMS_PAGE_SIZE) if limit else self.ITEMS_PAGE_SIZE
 
-            if limit is not None:
-                params["Limit"] = limit
+            self.logger.debug(f"Get recently watched from endpoint: {endpoint} with params: {params}, since: {since}, limit: {limit}")
+            raw_items = self._collect_played_items(self._iter_item_pages(endpoint, params, page_size), since, limit)
 
-            self.logger.debug(f"Get recently watched from endpoint: {endpoint} with params: {params}")
+            if not raw_items:
+                return []
 
-            response = requests.get(endpoint, headers=headers, params=params)
-            response.raise_for_status()
-            raw_items = response.json().get("Items", [])
-            
             # Filter and transform to ItemsFiltered
             filtered_items = self.get_items_filtered(items=raw_items, user_id=user_id) # No attribute_filter needed here
             if isinstance(filtered_items, list) and all(isinstance(i, ItemsFiltered) for i in filtered_items):
@@ -201,6 +265,54 @@ class JellyfinProvider(LibraryProviderBase):
             self.logger.exception(f"An unexpected error occurred: {e}")
         return None    
 
+    def _iter_item_pages(self, endpoint: str, params: Dict[str, Any], page_size: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields pages of raw items from an items endpoint, paging with StartIndex/Limit until a short page is returned.
+        Raises requests exceptions to the caller.
+
+        Args:
+            endpoint (str): The full items endpoint URL.
+            params (Dict[str, Any]): Query parameters, StartIndex and Limit are set per page.
+            page_size (Optional[int]): Items per page. Defaults to ITEMS_PAGE_SIZE.
+
+        Yields:
+            List[Dict[str, Any]]: One page of raw items.
+        """
+        page_size = page_size or self.ITEMS_PAGE_SIZE
+        headers = {
+            "Authorization": self.jellyfin_auth,
+            "Content-Type": "application/json",
+        }
+        start_index = 0
+        while True:
+            page_params = dict(params, StartIndex=start_index, Limit=page_size, EnableTotalRecordCount="false")
+            response = http_transport.get(endpoint, headers=headers, params=page_params)
+            response.raise_for_status()
+            page = response.json().get("Items", [])
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            start_index += len(page)
+
+    def _collect_played_items(self, pages: Iterator[List[Dict[str, Any]]], since: Optional[datetime] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Collects raw played items from pages sorted by DatePlayed (newest first), stopping at the first play at or
+        before `since` or once `limit` items are collected. Later pages are never requested.
+        """
+        if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        raw_items: List[Dict[str, Any]] = []
+        for page in pages:
+            for item in page:
+                last_played = (item.get("UserData") or {}).get("LastPlayedDate")
+                if since is not None and last_played and datetime.fromisoformat(last_played) <= since:
+                    return raw_items # Everything after this was synced already
+                raw_items.append(item)
+                if limit is not None and len(raw_items) >= limit:
+                    return raw_items
+        return raw_items
+
     def get_favorites(self, user_id: str, limit: Optional[int] = None) -> Optional[List[ItemsFiltered]]:
         """
         Retrieves favorite items from the Jellyfin API for a specific user.
@@ -226,7 +338,7 @@ class JellyfinProvider(LibraryProviderBase):
             params = {
                 "Limit": limit,
                 "Recursive": "true",
-                "Fields": "BasicSyncInfo,MediaSource,UserData", # Ensure UserData is fetched
+                "Fields": self.ITEM_FIELDS,
                 "IncludeItemTypes": "Movie,Series", # Add or remove types as needed
                 "IsFavorite": "true",
                 "SortBy": "SortName", # Or DateCreated, CommunityRating, etc.
@@ -235,7 +347,7 @@ class JellyfinProvider(LibraryProviderBase):
             }
             self.logger.debug(f"Get favorites from endpoint: {endpoint} with params: {params}")
 
-            response = requests.get(endpoint, headers=headers, params=params)
+            response = http_transport.get(endpoint, headers=headers, params=params)
             response.raise_for_status()
             raw_items = response.json().get("Items", [])
 
@@ -253,6 +365,79 @@ class JellyfinProvider(LibraryProviderBase):
             self.logger.exception(f"An unexpected error occurred in get_favorites: {e}")
         return None
 
+    def _to_items_filtered(self, item: Dict[str, Any], user_id: Optional[str] = None, external_id_cache: Optional[Dict[str, Optional[Dict[str, str]]]] = None) -> Optional[ItemsFiltered]:
+        """
+        Converts one raw Jellyfin item to ItemsFiltered. Episodes are mapped to their series.
+        Missing TMDB IDs are looked up when a user ID is given, from `external_id_cache` if it holds the item.
+
+        Returns:
+            Optional[ItemsFiltered]: The converted item, or None if its type is not handled or it has no name.
+        """
+        external_id_cache = external_id_cache if external_id_cache is not None else {}
+        user_data = item.get("UserData", {})
+
+        current_last_played_date_str = None
+        play_count = 0
+        is_favorite = False
+        if user_data:
+            current_last_played_date_str = user_data.get("LastPlayedDate")
+            play_count = user_data.get("PlayCount", 0)
+            is_favorite = user_data.get("IsFavorite", False)
+
+        item_jellyfin_type = item.get("Type", "Unknown")  # "Movie", "Episode", etc.
+        media_name: Optional[str] = None
+        media_id: Optional[str] = None
+        tmdb_id: Optional[str] = None
+        output_media_type: Optional[str] = None
+
+        if item_jellyfin_type == "Episode":
+            media_name = item.get("SeriesName")
+            media_id = item.get("SeriesId")
+            tmdb_id = None # The episode's own ProviderIds identify the episode, the series IDs are resolved below
+            output_media_type = "tv"
+        elif item_jellyfin_type == "Series":
+            media_name = item.get("Name")
+            media_id = item.get("Id")
+            tmdb_id = item.get("ProviderIds", {}).get("Tmdb", None)
+            output_media_type = "tv"
+        elif item_jellyfin_type == "Movie":
+            media_name = item.get("Name")
+            media_id = item.get("Id")
+            tmdb_id = item.get("ProviderIds", {}).get("Tmdb", None)
+            output_media_type = "movie"
+        else:
+            self.logger.debug(f"Skipping item with unhandled type '{item_jellyfin_type}': {item.get('Name', 'Unknown Item')}")
+            return None # Skip types we don't explicitly handle for consolidated history
+
+        if not media_name:
+            self.logger.debug(f"Skipping item due to missing name (media_name is None): {item}")
+            return None
+        
+        if not tmdb_id and user_id:
+            if media_id in external_id_cache:
+                external_ids = external_id_cache[media_id]
+            else:
+                self.logger.debug(f"TMDB ID=None: Fetching external IDs for media '{media_name}' (ID: {media_id})")
+                external_ids = self.get_item_external_ids(item_id=media_id, user_id=user_id)
+                external_id_cache[media_id] = external_ids # Store in cache
+
+            if external_ids:
+                tmdb_id = external_ids.get("tmdbid")
+            else:
+                self.logger.debug(f"Missing TMDB ID for media '{media_name}' (ID: {media_id}) after fetch/cache lookup.")
+
+        poster_url = f"{self.jellyfin_url}/Items/{media_id}/Images/Primary?fillHeight=1440&fillWidth=960&quality=96"
+
+        return ItemsFiltered(
+            name=media_name,
+            id=tmdb_id,
+            type=output_media_type,
+            last_played_date=current_last_played_date_str,
+            play_count=play_count,
+            is_favorite=is_favorite,
+            poster_url=poster_url
+        )
+
     def get_items_filtered(self, items: Optional[List[Dict[str, Any]]], user_id: Optional[str] = None, attribute_filter: Optional[str] = None, source_type: Optional[str] = None) -> Union[List[ItemsFiltered], List[str]]:
         """
         Filters recently watched items, ensuring uniqueness by media name (movie or series)
@@ -279,65 +464,24 @@ class JellyfinProvider(LibraryProviderBase):
         # Use a dictionary to store unique media items by name, ensuring the most recent play date.
         # Key: media_name (str)
         # Value: Dict[str, Any] (processed media item: {'name', 'id', 'type', 'last_played_date'})
-        external_id_cache: Dict[str, Optional[Dict[str, str]]] = {} # Cache for external IDs within this call
+        external_id_cache: Dict[str, Optional[Dict[str, str]]] = {} # External IDs for items without an inline TMDB ID
         processed_media_map: Dict[str, ItemsFiltered] = {}
 
         self.logger.debug(f"Total raw items: {len(items)}")
+        if user_id:
+            # Resolve every missing TMDB ID up front, in bulk, instead of one request per series or movie
+            missing_ids = [
+                item.get("SeriesId") if item.get("Type") == "Episode" else item.get("Id")
+                for item in items
+                if item.get("Type") == "Episode" or not (item.get("ProviderIds") or {}).get("Tmdb")
+            ]
+            external_id_cache = self.get_items_external_ids(missing_ids, user_id=user_id)
         for item in items:
-            user_data = item.get("UserData", {})
-
-            current_last_played_date_str = None
-            play_count = 0
-            is_favorite = False
-            if user_data:
-                current_last_played_date_str = user_data.get("LastPlayedDate")
-                play_count = user_data.get("PlayCount", 0)
-                is_favorite = user_data.get("IsFavorite", False)
-
-            item_jellyfin_type = item.get("Type", "Unknown")  # "Movie", "Episode", etc.
-            media_name: Optional[str] = None
-            media_id: Optional[str] = None
-            tmdb_id: Optional[str] = None
-            output_media_type: Optional[str] = None
-
-            if item_jellyfin_type == "Episode":
-                media_name = item.get("SeriesName")
-                media_id = item.get("SeriesId")
-                tmdb_id = item.get("ProviderIds", {}).get("Tmdb", None)
-                output_media_type = "tv"
-            elif item_jellyfin_type == "Series":
-                media_name = item.get("Name")
-                media_id = item.get("Id")
-                tmdb_id = item.get("ProviderIds", {}).get("Tmdb", None)
-                output_media_type = "tv"
-            elif item_jellyfin_type == "Movie":
-                media_name = item.get("Name")
-                media_id = item.get("Id")
-                tmdb_id = item.get("ProviderIds", {}).get("Tmdb", None)
-                output_media_type = "movie"
-            else:
-                self.logger.debug(f"Skipping item with unhandled type '{item_jellyfin_type}': {item.get('Name', 'Unknown Item')}")
-                continue # Skip types we don't explicitly handle for consolidated history
-
-            if not media_name:
-                self.logger.debug(f"Skipping item due to missing name (media_name is None): {item}")
+            filtered_item = self._to_items_filtered(item, user_id=user_id, external_id_cache=external_id_cache)
+            if not filtered_item:
                 continue
-        
-            if not tmdb_id and user_id:
-                if media_id in external_id_cache:
-                    self.logger.debug(f"TMDB ID=None: Using cached external IDs for media_id '{media_id}'")
-                    external_ids = external_id_cache[media_id]
-                else:
-                    self.logger.debug(f"TMDB ID=None: Fetching external IDs for media '{media_name}' (ID: {media_id})")
-                    external_ids = self.get_item_external_ids(item_id=media_id, user_id=user_id)
-                    external_id_cache[media_id] = external_ids # Store in cache
-
-                if external_ids:
-                    tmdb_id = external_ids.get("tmdbid")
-                else:
-                    self.logger.debug(f"Missing TMDB ID for media '{media_name}' (ID: {media_id}) after fetch/cache lookup.")
-
-            poster_url = f"{self.jellyfin_url}/Items/{media_id}/Images/Primary?fillHeight=1440&fillWidth=960&quality=96"
+            media_name = filtered_item.name
+            current_last_played_date_str = filtered_item.last_played_date
 
             if media_name in processed_media_map:
                 existing_item = processed_media_map[media_name]
@@ -349,16 +493,7 @@ class JellyfinProvider(LibraryProviderBase):
                 else:
                     self.logger.debug(f"No last_played_date for '{media_name}'")
             else:
-                processed_media_map[media_name] = ItemsFiltered(
-                    name=media_name,
-                    id=tmdb_id,
-                    type=output_media_type,
-                    last_played_date=current_last_played_date_str,
-                    play_count=play_count,
-                    is_favorite=is_favorite,
-                    poster_url=poster_url
-                )
-                #self.logger.debug(f"Added new media '{media_name}' (Type: {output_media_type}, ID: {media_id}) with last_played_date {current_last_played_date_str}")
+                processed_media_map[media_name] = filtered_item
 
         if attribute_filter:
             # If attribute_filter is 'Name' (case-insensitive for safety), return list of names
@@ -369,31 +504,33 @@ class JellyfinProvider(LibraryProviderBase):
         self.logger.debug(f"Total filtered items: {len(processed_media_map)}")
         return list(processed_media_map.values())
     
+    def _library_items_request(self) -> Optional[tuple]:
+        """Returns the endpoint and query parameters for the library items, or None if Jellyfin is not configured."""
+        if not self.jellyfin_url or not self.jellyfin_api_key:
+            self.logger.error("Jellyfin URL, Key, and User ID are required.")
+            return None
+        endpoint = urljoin(self.jellyfin_url, f"/Items")
+        params = {
+            "Recursive": "true",
+            "IncludeItemTypes": "Movie,Series", # Add or remove types as needed
+            "Fields": self.ITEM_FIELDS,
+            "EnableImages": "false",
+        }
+        return endpoint, params
+
     def get_all_items(self) -> Optional[List[Dict[str, Any]]]:
         """
-        Retrieves all items from the Jellyfin API for the user, recursively.
+        Retrieves all items from the Jellyfin API for the user, recursively, in pages of ITEMS_PAGE_SIZE.
 
         Returns:
             list: A list of all items (dictionaries) from the Jellyfin API, or None on error.
         """
         try:
-            if not self.jellyfin_url or not self.jellyfin_api_key:
-                self.logger.error("Jellyfin URL, Key, and User ID are required.")
+            request = self._library_items_request()
+            if not request:
                 return None
-
-            endpoint = urljoin(self.jellyfin_url, f"/Items")
-            headers = {
-                "Authorization": self.jellyfin_auth,
-                "Content-Type": "application/json",
-            }
-            params = {
-                "Recursive": "true",
-                "IncludeItemTypes": "Movie,Series", # Add or remove types as needed
-            }
-
-            response = requests.get(endpoint, headers=headers, params=params)
-            response.raise_for_status()
-            return response.json().get("Items", [])
+            endpoint, params = request
+            return [item for page in self._iter_item_pages(endpoint, params) for item in page]
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Jellyfin get_all_items request failed: {e}")
         except json.JSONDecodeError:
@@ -402,6 +539,26 @@ class JellyfinProvider(LibraryProviderBase):
             self.logger.exception(f"An unexpected error occurred in get_all_items: {e}")
         return None
 
+    def iter_all_items_filtered(self) -> Iterator[ItemsFiltered]:
+        """
+        Streams the library as ItemsFiltered, one page at a time, so the whole library is never held as raw JSON.
+        Items are unique by name like get_items_filtered. Raises requests exceptions to the caller.
+
+        Yields:
+            ItemsFiltered: Each library movie or series.
+        """
+        request = self._library_items_request()
+        if not request:
+            return
+        endpoint, params = request
+        seen_names = set()
+        for page in self._iter_item_pages(endpoint, params):
+            for item in page:
+                filtered_item = self._to_items_filtered(item)
+                if filtered_item and filtered_item.name not in seen_names:
+                    seen_names.add(filtered_item.name)
+                    yield filtered_item
+
     def get_all_items_filtered(self, attribute_filter: Optional[str] = None) -> Optional[Union[List[ItemsFiltered], List[str]]]:
         """
         Retrieves all relevant items (e.g., movies, shows) from the library and filters them.
@@ -411,13 +568,27 @@ class JellyfinProvider(LibraryProviderBase):
         Returns:
             Optional[Union[List[ItemsFiltered], List[str]]]: Filtered items or None on error.
         """
-        items = self.get_all_items()
-        self.logger.debug(f"Retrieved {len(items) if items else 0} items from Jellyfin.")
-        if items is None:
-            self.logger.warning("No items returned from Jellyfin.")
+        if not self.jellyfin_url or not self.jellyfin_api_key:
+            self.logger.error("Jellyfin URL and API Key are required.")
+            return None
+        if attribute_filter and attribute_filter.lower() != "name":
+            self.logger.warning(f"Unsupported attribute_filter '{attribute_filter}' for Jellyfin. Returning full objects.")
+        try:
+            items = list(self.iter_all_items_filtered())
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Jellyfin get_all_items_filtered request failed: {e}")
+            return None
+        except json.JSONDecodeError:
+            self.logger.error("Error decoding JSON response from Jellyfin in get_all_items_filtered.")
+            return None
+        except Exception as e:
+            self.logger.exception(f"An unexpected error occurred in get_all_items_filtered: {e}")
             return None
+        self.logger.debug(f"Retrieved {len(items)} items from Jellyfin.")
 
-        return self.get_items_filtered(items=items, attribute_filter=attribute_filter)
+        if attribute_filter and attribute_filter.lower() == "name":
+            return [item.name for item in items]
+        return items
 
     @classmethod
     def get_default_settings(cls) -> Dict[str, Dict[str, Any]]:
@@ -1,7 +1,8 @@
 import json
 import logging
 import asyncio
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Type
+from pydantic import BaseModel
 
 from ollama import AsyncClient
 
@@ -104,7 +105,7 @@ class OllamaProvider(LLMProviderBase):
             self.logger.debug(f"Ollama raw response for _generate_content: {response}")
             return {'success': False, 'content': None, 'token_counts': None, 'message': f"Ollama API general error: {e}"}
 
-    async def get_similar_media(self, model: str, prompt: str, system_prompt: Optional[str] = None, temperature: Optional[float] = 0.7, **kwargs: Any) -> Optional[Dict[str, Any]]:
+    async def get_similar_media(self, model: str, prompt: str, system_prompt: Optional[str] = None, temperature: Optional[float] = 0.7, response_model: Optional[Type[BaseModel]] = None, **kwargs: Any) -> Optional[Dict[str, Any]]:
         """
         Uses the Ollama API to find media similar to the user's prompt, returning structured JSON.
 
@@ -113,6 +114,7 @@ class OllamaProvider(LLMProviderBase):
             prompt (str): The user's request/prompt.
             system_prompt (Optional[str]): Base system instructions for the AI.
             temperature (Optional[float]): Controls randomness. Higher is more random.
+            response_model (Optional[Type[BaseModel]]): Structured response schema. Defaults to SuggestionList.
             **kwargs: Additional provider-specific parameters (ignored by Ollama for this method).
             temperature (Optional[float]): Controls randomness. Higher is more random.
 
@@ -137,7 +139,7 @@ class OllamaProvider(LLMProviderBase):
             prompt_data=prompt,
             system_prompt=system_prompt,
             temperature=temperature,
-            response_format_details=SuggestionList, # Specific schema format for this task
+            response_format_details=response_model or SuggestionList, # Specific schema format for this task
             **kwargs # Pass through other kwargs if any
         )
 
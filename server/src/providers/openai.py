@@ -1,6 +1,6 @@
 import json
 import logging
-from typing import Optional, Dict, Any, List, Union
+from typing import Optional, Dict, Any, List, Union, Type
 from openai import AsyncOpenAI
 from pydantic import BaseModel
 
@@ -116,7 +116,7 @@ class OpenAIProvider(LLMProviderBase):
             self.logger.debug(f"OpenAI raw response for _generate_content: {response}")
             return {'success': False, 'content': None, 'token_counts': None, 'message': f"OpenAI API general error: {e}"}
 
-    async def get_similar_media(self, model: str, prompt: str, system_prompt: Optional[str] = None, temperature: Optional[float] = 0.7, **kwargs: Any) -> Optional[Dict[str, Any]]:
+    async def get_similar_media(self, model: str, prompt: str, system_prompt: Optional[str] = None, temperature: Optional[float] = 0.7, response_model: Optional[Type[BaseModel]] = None, **kwargs: Any) -> Optional[Dict[str, Any]]:
         """
         Uses the OpenAI API to find media similar to the user's prompt, returning structured JSON.
         """
@@ -138,7 +138,7 @@ class OpenAIProvider(LLMProviderBase):
             model=model,
             prompt_data=messages,
             temperature=temperature,
-            response_format_details=SuggestionList, # Pass the Pydantic model to indicate JSON output is desired
+            response_format_details=response_model or SuggestionList, # Pass the Pydantic model to indicate JSON output is desired
             **kwargs
         )
 
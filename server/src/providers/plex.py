@@ -1,13 +1,11 @@
 import requests
-import json
 import logging
-from typing import Optional, Dict, List, Any, Union
+from typing import Optional, Dict, List, Any, Union, Iterator
 from datetime import datetime, timezone
 
 # Import plexapi
 from plexapi.server import PlexServer
 from plexapi.exceptions import NotFound, BadRequest, Unauthorized 
-from plexapi.utils import toJson
 from plexapi.media import Media # For type hinting if needed
 from plexapi.video import Movie, Show, Episode, MovieHistory, EpisodeHistory
 from services.models import ItemsFiltered, LibraryUser, SettingType
@@ -41,6 +39,8 @@ class PlexProvider(LibraryProviderBase):
     Utilizes the python-plexapi library for communication with a Plex server.
     """
     PROVIDER_NAME = "plex"
+    LIBRARY_PAGE_SIZE = 500 # X-Plex-Container-Size when paging through library sections
+    FAVORITE_MIN_RATING = 9 # Items rated at least this (out of 10) are favorites
 
     def __init__(self, plex_url: str, plex_api_key: str, limit: int = 10):
         """
@@ -119,7 +119,7 @@ class PlexProvider(LibraryProviderBase):
         self.logger.info(f"User '{username}' not found among managed accounts.")
         return None
 
-    def get_recently_watched(self, user_id: str, limit: Optional[int] = None) -> Optional[List[ItemsFiltered]]:
+    def get_recently_watched(self, user_id: str, limit: Optional[int] = None, since: Optional[datetime] = None) -> Optional[List[ItemsFiltered]]:
         """
         Retrieves recently watched items from Plex for a specific user ID.
         Returns a list of ItemsFiltered.
@@ -127,6 +127,7 @@ class PlexProvider(LibraryProviderBase):
         Args:
             user_id (str): The ID of the Plex user (from /accounts).
             limit (int, optional): The maximum number of items to retrieve. Defaults to the class default.
+            since (Optional[datetime]): Only return items viewed after this time (UTC), filtered by the server.
         Returns:
             Optional[List[ItemsFiltered]]: A list of filtered recently watched items, or None on error.
         """
@@ -145,13 +146,13 @@ class PlexProvider(LibraryProviderBase):
 
         try:
             # Pass 'limit' directly to maxresults. If limit is None, plexapi handles it as no limit.
-            history_items: List[Media] = self.server.history(accountID=user_id_int, maxresults=limit)
+            if since is not None and since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc) # plexapi converts mindate with timestamp(), which treats naive datetimes as local time
+            history_items: List[Media] = self.server.history(accountID=user_id_int, maxresults=limit, mindate=since)
             
             watched_videos = [item for item in history_items if isinstance(item, (MovieHistory, EpisodeHistory))]
-            raw_items_json = json.loads(toJson(watched_videos)) if watched_videos else []
-
             # Filter and transform to ItemsFiltered
-            filtered_items = self.get_items_filtered(items=raw_items_json)
+            filtered_items = self.get_items_filtered(items=watched_videos)
             if isinstance(filtered_items, list) and all(isinstance(i, ItemsFiltered) for i in filtered_items):
                 return filtered_items
             self.logger.warning("get_items_filtered did not return a list of ItemsFiltered for Plex recently watched.")
@@ -189,21 +190,17 @@ class PlexProvider(LibraryProviderBase):
             for section in self.server.library.sections():
                 if section.type in ['movie', 'show']:
                     self.logger.debug(f"Searching for favorites in section: {section.title} (Type: {section.type})")
-                    items_in_section = section.all() 
-                    
-                    for item in items_in_section:
-                        if len(favorites) >= current_limit:
-                            break
-                        if hasattr(item, 'userRating') and item.userRating is not None and item.userRating >= 9.0:
-                            if isinstance(item, (Movie, Show)): 
-                                favorites.append(item)
-                    
+                    # The rating filter runs on the server, only rated items are returned
+                    favorites.extend(self._iter_section_items(
+                        section,
+                        filters={'userRating>>': self.FAVORITE_MIN_RATING - 1},
+                        maxresults=current_limit - len(favorites)
+                    ))
                     if len(favorites) >= current_limit:
                         break 
-            result_favorites = favorites[:current_limit]
-            raw_items_json = json.loads(toJson(result_favorites)) if result_favorites else []
+            result_favorites = [item for item in favorites[:current_limit] if (vars(item).get('userRating') or 0) >= self.FAVORITE_MIN_RATING]
 
-            filtered_items = self.get_items_filtered(items=raw_items_json)
+            filtered_items = self.get_items_filtered(items=result_favorites)
             if isinstance(filtered_items, list) and all(isinstance(i, ItemsFiltered) for i in filtered_items):
                 return filtered_items
             self.logger.warning("get_items_filtered did not return a list of ItemsFiltered for Plex favorites.")
@@ -245,10 +242,7 @@ class PlexProvider(LibraryProviderBase):
                 self.logger.warning(f"No item found with ratingKey {rating_key} or API returned empty response.")
                 return None
 
-            # Convert the single Plex object to a list of one dictionary for get_items_filtered
-            raw_item_json_list = json.loads(toJson([plex_item])) if plex_item else []
-
-            filtered_list = self.get_items_filtered(items=raw_item_json_list)
+            filtered_list = self.get_items_filtered(items=[plex_item])
             
             if isinstance(filtered_list, list) and len(filtered_list) == 1 and isinstance(filtered_list[0], ItemsFiltered):
                 return filtered_list[0]
@@ -262,106 +256,80 @@ class PlexProvider(LibraryProviderBase):
             self.logger.error(f"Error fetching Plex item with ratingKey {rating_key}: {e}", exc_info=True)
         return None
 
-    def get_items_filtered(self, items: Optional[List[Dict[str, Any]]], attribute_filter: Optional[str] = None) -> Union[List[ItemsFiltered], List[str]]:
+    def get_items_filtered(self, items: Optional[List[Any]], attribute_filter: Optional[str] = None) -> Union[List[ItemsFiltered], List[str]]:
         """
-        Filters Plex items (dictionaries from JSON), consolidating episodes under series and ensuring uniqueness.
+        Filters Plex items (plexapi Movie, Show, Episode and history objects), consolidating episodes under series and ensuring uniqueness.
         Updates to the most recent last_played_date if duplicates are found (for history source).
+        Attributes are read from each object's loaded data, so no item is reloaded from the server.
         Conforms to LibraryProviderBase.
 
         Args:
-            items (Optional[List[Dict[str, Any]]]): List of raw Plex item dictionaries (from toJson utility).
+            items (Optional[List[Any]]): List of plexapi objects.
             attribute_filter (Optional[str]): If 'name', returns a list of names. Otherwise, List[ItemsFiltered].
         Returns:
             Union[List[ItemsFiltered], List[str]]: Filtered items. Empty list if input is None/empty.
         """
         if not items:
-            self.logger.debug(f"No Plex items provided for filtering. Returning empty list.")
+            self.logger.debug("No Plex items provided for filtering. Returning empty list.")
             return []
 
         processed_media_map: Dict[str, ItemsFiltered] = {}
+        names_only = bool(attribute_filter and attribute_filter.lower() == "name")
 
         self.logger.debug(f"Total raw items: {len(items)}")
         for item in items:
-            media_name: Optional[str] = None
-            consolidated_media_id: Optional[str] = None 
-            output_media_type: Optional[str] = None  # 'movie' or 'tv'
-            
-            current_last_played_date_iso: Optional[str] = None
-            play_count_val: Optional[int] = None
-            is_favorite_val: Optional[bool] = False
-            poster_url_val: Optional[str] = None
-            thumb_path: Optional[str] = None
-            
-            #
-            # Leave for manual debugging
-            #
-            self.logger.debug(f"Plex raw item: {json.dumps(item, indent=2)}")
-            # Determine item type from dictionary keys (based on plexapi.utils.toJson output)
-            item_type_from_dict = item.get('type') # 'movie', 'show', 'episode'
-
-            if item_type_from_dict == 'episode':
-                media_name = item.get('grandparentTitle') # Show title
-                key = item.get('grandparentKey')
-                output_media_type = "tv" 
-                thumb_path = item.get('grandparentThumb')
-            elif item_type_from_dict == 'show': 
-                media_name = item.get('title')
-                key = item.get('key')
+            # Read the loaded attributes directly, getattr on a partial plexapi object reloads it when a value is None.
+            # Per-item debug lines use lazy %-formatting, they run for every item of the library
+            attrs = vars(item)
+            item_type = attrs.get('type') # 'movie', 'show', 'episode'
+
+            if item_type == 'episode':
+                media_name = attrs.get('grandparentTitle') # Show title
+                key = attrs.get('grandparentKey')
                 output_media_type = "tv"
-                thumb_path = item.get('thumb')
-            elif item_type_from_dict == 'movie': 
-                media_name = item.get('title')
-                key = item.get('key')
-                output_media_type = "movie"
-                thumb_path = item.get('thumb')
+                thumb_path = attrs.get('grandparentThumb')
+            elif item_type in ('show', 'movie'):
+                media_name = attrs.get('title')
+                key = attrs.get('key')
+                output_media_type = "tv" if item_type == 'show' else "movie"
+                thumb_path = attrs.get('thumb')
             else:
-                self.logger.debug(f"Skipping history item with unhandled dict type '{item_type_from_dict}': {item.get('title', 'Unknown Item')}")
+                self.logger.debug("Skipping history item with unhandled type '%s': %s", item_type, attrs.get('title', 'Unknown Item'))
+                continue
+
+            if not media_name:
+                self.logger.debug("Skipping item due to missing name (media_name is None): %s", attrs.get('ratingKey'))
+                continue
+
+            if names_only:
+                processed_media_map.setdefault(media_name, None)
                 continue
 
+            consolidated_media_id: Optional[str] = None
             if key:
                 try:
                     # Extract the last part of the key as the ID
                     consolidated_media_id = str(key.split('/')[-1])
                 except (AttributeError, IndexError) as e:
                     self.logger.warning(f"Could not extract ID from key '{key}': {e}")
-                    self.logger.debug(f"Plex raw item: {json.dumps(item, indent=2)}")
-                    consolidated_media_id = None # Ensure it's None on failure
-
-            viewed_at_val = None
-            if item.get('viewedAt'):
-                viewed_at_val = item.get('viewedAt')
-            elif item.get('lastViewedAt'):
-                viewed_at_val = item.get('lastViewedAt')
-            #self.logger.debug(f"Plex ViewedAt (raw value from history item '{media_name}'): {viewed_at_val}, type: {type(viewed_at_val)}")
-            if isinstance(viewed_at_val, str):
-                try:
-                    # Attempt to parse the string as an ISO datetime
-                    dt_obj = datetime.fromisoformat(viewed_at_val)
-                    current_last_played_date_iso = _datetime_to_iso(dt_obj)
-                except ValueError:
-                    self.logger.warning(f"Could not parse viewedAt string '{viewed_at_val}' as ISO datetime for Plex history item '{media_name}'.")
-                    current_last_played_date_iso = None
+
+            # History entries carry viewedAt, library items lastViewedAt. plexapi parses both into naive local datetimes
+            viewed_at_val = attrs.get('viewedAt') or attrs.get('lastViewedAt')
+            if isinstance(viewed_at_val, datetime):
+                current_last_played_date_iso = _datetime_to_iso(viewed_at_val.astimezone(timezone.utc))
             elif isinstance(viewed_at_val, (int, float)):
-                # If it's already a number, treat as epoch (plexapi.utils.toJson default for datetime)
                 current_last_played_date_iso = _epoch_to_iso(viewed_at_val)
             else:
                 current_last_played_date_iso = None
-    
-            play_count_val = item.get('viewCount')
-            user_rating = item.get('userRating')
+
+            play_count_val = attrs.get('viewCount')
+            is_favorite_val: Optional[bool] = False
+            user_rating = attrs.get('userRating')
             if user_rating is not None:
                 try:
                     is_favorite_val = float(user_rating) >= 9.0
                 except ValueError:
                     self.logger.warning(f"Could not parse userRating '{user_rating}' as float for item '{media_name}'.")
-            
-            # Get poster URL
-            if thumb_path and self.server:
-                poster_url_val = self.server.url(thumb_path, includeToken=True) # includeToken=False is often better for caching
-
-            if not media_name:
-                self.logger.debug(f"Skipping item due to missing name (media_name is None): {item}")
-                continue
 
             if media_name in processed_media_map:
                 existing_pm_item = processed_media_map[media_name]
@@ -375,6 +343,8 @@ class PlexProvider(LibraryProviderBase):
                 if is_favorite_val is not None and existing_pm_item.is_favorite is None: # Only set if not already set
                     existing_pm_item.is_favorite = is_favorite_val
             else:
+                # Get poster URL, only built once per title
+                poster_url_val = self.server.url(thumb_path, includeToken=True) if thumb_path and self.server else None # includeToken=False is often better for caching
                 processed_media_map[media_name] = ItemsFiltered(
                     name=media_name,
                     id=consolidated_media_id,
@@ -386,18 +356,47 @@ class PlexProvider(LibraryProviderBase):
                 )
 
         self.logger.debug(f"Total filtered items: {len(processed_media_map)}")
-        if attribute_filter and attribute_filter.lower() == "name":
-            return [pm_item.name for pm_item in processed_media_map.values()]
+        if names_only:
+            return list(processed_media_map.keys())
         else:
             return list(processed_media_map.values())
 
-    def _get_all_items_raw(self) -> Optional[List[Dict[str, Any]]]:
+    def _iter_section_items(self, section: Any, filters: Optional[Dict[str, Any]] = None, maxresults: Optional[int] = None) -> Iterator[Union[Movie, Show]]:
+        """
+        Yields a library section's movies or shows one page at a time, requesting LIBRARY_PAGE_SIZE items per query
+        with container_start/container_size. Filters are applied by the Plex server.
+
+        Args:
+            section (Any): The plexapi movie or show library section.
+            filters (Optional[Dict[str, Any]]): plexapi search filters, e.g. {'userRating>>': 8}.
+            maxresults (Optional[int]): Stop after this many items.
+
+        Yields:
+            Union[Movie, Show]: Each matching item.
+        """
+        container_start = 0
+        while True:
+            container_size = self.LIBRARY_PAGE_SIZE if maxresults is None else min(self.LIBRARY_PAGE_SIZE, maxresults - container_start)
+            if container_size <= 0:
+                return
+            page = section.search(
+                libtype=section.TYPE,
+                filters=filters,
+                container_start=container_start,
+                container_size=container_size,
+                maxresults=container_size, # One request per page
+            )
+            yield from page
+            if len(page) < container_size:
+                return
+            container_start += len(page)
+
+    def _get_all_items_raw(self) -> Optional[List[Union[Movie, Show]]]:
         """
         Retrieves all movie and TV show (series) items from the Plex library.
-        Internal helper to fetch items and convert them to JSON dictionaries.
 
         Returns:
-            Optional[List[Dict[str, Any]]]: List of all movie and show items as dictionaries.
+            Optional[List[Union[Movie, Show]]]: List of all movie and show items.
                                  Returns None on error or server not connected.
         """
         if not self.server:
@@ -407,21 +406,18 @@ class PlexProvider(LibraryProviderBase):
         all_media_items: List[Union[Movie, Show]] = []
         try:
             for section in self.server.library.sections():
-                if section.type == 'movie':
-                    self.logger.debug(f"Fetching all movies from section: {section.title}")
-                    all_media_items.extend(section.all()) # type: ignore # section.all() returns List[Movie]
-                elif section.type == 'show':
-                    self.logger.debug(f"Fetching all shows from section: {section.title}")
-                    all_media_items.extend(section.all()) # type: ignore # section.all() returns List[Show]
-            
-            return json.loads(toJson(all_media_items)) if all_media_items else []
+                if section.type in ('movie', 'show'):
+                    self.logger.debug(f"Fetching all {section.type}s from section: {section.title}")
+                    all_media_items.extend(self._iter_section_items(section))
+
+            return all_media_items
         except Exception as e:
             self.logger.error(f"Error fetching all items from Plex library: {e}", exc_info=True)
             return None
 
     def get_all_items_filtered(self, attribute_filter: Optional[str] = None) -> Optional[Union[List[ItemsFiltered], List[str]]]:
         """
-        Retrieves all movie/show items from Plex as dictionaries and filters them.
+        Retrieves all movie/show items from Plex and filters them.
         Conforms to LibraryProviderBase.
 
         Args:
@@ -430,13 +426,13 @@ class PlexProvider(LibraryProviderBase):
         Returns:
             Optional[Union[List[ItemsFiltered], List[str]]]: Filtered list or None on error.
         """
-        raw_plex_item_dicts = self._get_all_items_raw()
-        if raw_plex_item_dicts is None:
+        raw_plex_items = self._get_all_items_raw()
+        if raw_plex_items is None:
             self.logger.warning("No items returned from Plex library (error state or not connected) for get_all_items_filtered.")
             return None
         
-        self.logger.debug(f"Retrieved {len(raw_plex_item_dicts)} raw Plex item dictionaries from library for filtering.")
-        return self.get_items_filtered(items=raw_plex_item_dicts, attribute_filter=attribute_filter)
+        self.logger.debug(f"Retrieved {len(raw_plex_items)} raw Plex items from library for filtering.")
+        return self.get_items_filtered(items=raw_plex_items, attribute_filter=attribute_filter)
 
     @classmethod
     def get_default_settings(cls) -> Dict[str, Dict[str, Any]]:
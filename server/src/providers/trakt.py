@@ -2,6 +2,8 @@ import json
 import logging
 from typing import Optional, Dict, List, Any, Union, TYPE_CHECKING
 from threading import Condition
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 from trakt import Trakt
 from trakt.objects.episode import Episode # Keep for get_items_filtered
@@ -23,6 +25,8 @@ class TraktProvider(LibraryProviderBase):
     """
 
     PROVIDER_NAME = "trakt"
+    HISTORY_PAGE_SIZE = 100 # Plays per history page when fetching the whole (or the since-watermark) history
+    HISTORY_PAGE_CONCURRENCY = 4 # Concurrent history page requests, well within Trakt's limit of 1000 GET calls per 5 minutes
 
     def __init__(self, client_id: str, client_secret: str, redirect_uri: Optional[str] = None, discovarr_app: Optional['Discovarr'] = None, initial_authorization: Optional[Dict[str, Any]] = None):
         """
@@ -258,10 +262,34 @@ class TraktProvider(LibraryProviderBase):
         self.logger.info(f"TraktProvider: User '{username}' not found or does not match the authenticated user.")
         return None
 
-    def get_recently_watched(self, user_id: str, limit: Optional[int] = None) -> Optional[List[ItemsFiltered]]:
+    def get_history_activity_marker(self, user_id: str) -> Optional[str]:
+        """
+        Retrieves the watched_at timestamps of the authenticated user's movies and episodes from sync/last_activities.
+        They move whenever a play is added to or removed from the history, so an unchanged marker means there is nothing to sync.
+        """
+        if not self.authorization or not Trakt['oauth'].token:
+            self.logger.warning("TraktProvider: get_history_activity_marker requires an authenticated session.")
+            return None
+        try:
+            with Trakt.configuration.oauth.from_response(self.authorization):
+                activities = Trakt['sync'].last_activities()
+            if not isinstance(activities, dict):
+                self.logger.warning(f"TraktProvider: Unexpected last_activities response for user {user_id}: {activities}")
+                return None
+            movies_watched_at = (activities.get('movies') or {}).get('watched_at')
+            episodes_watched_at = (activities.get('episodes') or {}).get('watched_at')
+            if not movies_watched_at and not episodes_watched_at:
+                return None
+            return f"movies={movies_watched_at};episodes={episodes_watched_at}"
+        except Exception as e:
+            self._handle_trakt_exception(e, f"get_history_activity_marker for user {user_id}")
+        return None
+
+    def get_recently_watched(self, user_id: str, limit: Optional[int] = None, since: Optional[datetime] = None) -> Optional[List[ItemsFiltered]]:
         """
         Retrieves recently watched items for the Trakt user.
         'user_id' for Trakt would typically be the authenticated user's ID/slug (e.g., 'me' or actual slug).
+        With `since` (UTC), only plays after that time are requested using Trakt's start_at.
         Returns a list of ItemsFiltered.
         """
         if not Trakt['oauth'].token:
@@ -272,28 +300,33 @@ class TraktProvider(LibraryProviderBase):
             'media': None,  # All types: movies, episodes
             'extended': 'full',
         }
-        if limit is None:
-            # If limit is None, fetch all items by letting the library paginate
-            get_kwargs['per_page'] = None
-        else:
-            # Fetch up to 'limit' items, using a reasonable page size
-            # Trakt API default per_page is 10, max is 1000. Using 100 as a good chunk size.
-            get_kwargs['per_page'] = min(limit, 100)
+        if since is not None:
+            # trakt.py formats start_at as UTC without converting, so normalize aware datetimes first
+            get_kwargs['start_at'] = since.astimezone(timezone.utc) if since.tzinfo else since
 
         try:
             # Fetch combined history (movies and episodes)
             endpoint = f"users/{user_id}/history"
-            self.logger.debug(f"Get recently watched from endpoint: {endpoint} with params: {get_kwargs}")
-            
-            history_items_iter = Trakt[endpoint].get(**get_kwargs) # This is now an iterable that handles pagination
-            
-            raw_watched_items = []
-            count = 0
-            for item in history_items_iter:
-                raw_watched_items.append(item)
-                count += 1
-                if limit is not None and count >= limit:
-                    break # Stop once the desired limit is reached
+            if limit is None:
+                # Fetch every page, the page count is known from the first request so the rest are fetched concurrently
+                raw_watched_items = self._get_all_history_pages(endpoint, get_kwargs)
+                if raw_watched_items is None:
+                    return None
+            else:
+                # Fetch up to 'limit' items, using a reasonable page size
+                # Trakt API default per_page is 10, max is 1000. Using 100 as a good chunk size.
+                get_kwargs['per_page'] = min(limit, 100)
+                self.logger.debug(f"Get recently watched from endpoint: {endpoint} with params: {get_kwargs}")
+
+                history_items_iter = Trakt[endpoint].get(**get_kwargs)
+
+                raw_watched_items = []
+                count = 0
+                for item in history_items_iter or []:
+                    raw_watched_items.append(item)
+                    count += 1
+                    if count >= limit:
+                        break # Stop once the desired limit is reached
             #
             # Leave for manual debugging
             #
@@ -313,6 +346,43 @@ class TraktProvider(LibraryProviderBase):
             self._handle_trakt_exception(e, f"get_recently_watched for user {user_id}")
         return None
 
+    def _get_all_history_pages(self, endpoint: str, get_kwargs: Dict[str, Any]) -> Optional[List[Any]]:
+        """
+        Fetches every page of a history endpoint. trakt.py resolves the page count from the pagination headers,
+        then pages are requested HISTORY_PAGE_CONCURRENCY at a time and returned in order (newest first).
+
+        Args:
+            endpoint (str): The history endpoint, e.g. 'users/{slug}/history'.
+            get_kwargs (Dict[str, Any]): Query arguments for the endpoint (media, extended, start_at).
+
+        Returns:
+            Optional[List[Any]]: The history items (trakt.Object), or None if any page could not be fetched.
+        """
+        page_kwargs = dict(get_kwargs, per_page=self.HISTORY_PAGE_SIZE, pagination=True)
+        self.logger.debug(f"Get all history pages from endpoint: {endpoint} with params: {page_kwargs}")
+        paginator = Trakt[endpoint].get(**page_kwargs)
+        if paginator is None or paginator.total_pages is None:
+            self.logger.error(f"Could not resolve the Trakt pagination state for {endpoint}.")
+            return None
+
+        def fetch_page(page: int) -> Optional[List[Any]]:
+            items = paginator.get(page)
+            return list(items) if items is not None else None
+
+        total_pages = paginator.total_pages
+        self.logger.info(f"Fetching {total_pages} Trakt history page(s) ({paginator.total_items} plays) from {endpoint}.")
+        if total_pages < 1:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.HISTORY_PAGE_CONCURRENCY, total_pages)) as executor:
+            pages = list(executor.map(fetch_page, range(1, total_pages + 1)))
+
+        failed_pages = [page for page, items in enumerate(pages, start=1) if items is None]
+        if failed_pages:
+            # A partial import would move the sync watermark past the missing plays
+            self.logger.error(f"Could not fetch Trakt history page(s) {failed_pages} of {total_pages} from {endpoint}.")
+            return None
+        return [item for items in pages for item in items]
+
     def get_favorites(self, user_id: str, limit: Optional[int] = None) -> Optional[List[ItemsFiltered]]:
         """
         Retrieves favorite items (e.g., watchlist, personal lists) for the Trakt user.
@@ -442,7 +512,7 @@ class TraktProvider(LibraryProviderBase):
             "client_id": {"value": None, "type": SettingType.STRING, "description": "Trakt Client ID.", "required": True}, # Already marked
             "client_secret": {"value": None, "type": SettingType.STRING, "description": "Trakt Client Secret.", "required": True}, # Already marked
             "default_user": {"value": None, "type": SettingType.STRING, "description": "Trakt Default User to use for watch history and favorites, if None use all."},
-            "authorization": {"value": None, "type": SettingType.STRING, "show": False, "hide": True, "description": "Trakt Authorization."},
+            "authorization": {"value": None, "type": SettingType.STRING, "show": False, "hide": True, "reload": False, "description": "Trakt Authorization."},
             "redirect_uri": {
                 "value": "urn:ietf:wg:oauth:2.0:oob", 
                 "type": SettingType.STRING, 
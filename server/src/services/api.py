@@ -3,6 +3,7 @@ import json
 import logging
 from typing import Optional, Dict, Any
 from .response import APIResponse # Import the APIResponse class
+from .http_client import transport as http_transport # Shared pooled session with timeouts and retries
 
 class Api:
     def __init__(self, url: str, api_key: str, api_key_header_name: str = "X-Api-Key", api_base_path: str = "api/v3"):
@@ -47,7 +48,7 @@ class Api:
         self.logger.debug(f"Making {method} request to {full_url} with params={params}, data is_present={data is not None}")
 
         try:
-            response = requests.request(method, full_url, headers=self.headers, params=params, json=data)
+            response = http_transport.request(method, full_url, headers=self.headers, params=params, json=data)
             response.raise_for_status()  # Raises HTTPError for 4xx/5xx responses
 
             if response.status_code == 204: # No Content
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class LRUCache:
+    """
+    A small thread-safe in-process LRU cache with optional per-entry expiry.
+    Used to keep hot lookups out of the database and off the network.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        Initializes the LRUCache.
+
+        Args:
+            maxsize (int): Maximum number of entries kept before the least recently used one is evicted.
+        """
+        self.maxsize = max(1, int(maxsize))
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the cached value for key, or default if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def contains(self, key: Hashable) -> bool:
+        """Returns True if key holds a live (non-expired) entry."""
+        return self.get(key, self._MISSING) is not self._MISSING
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Stores a value.
+
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to store. None is a valid value.
+            ttl (Optional[float]): Seconds until the entry expires. None means no expiry.
+        """
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Removes key from the cache if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
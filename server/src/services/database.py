@@ -2,7 +2,7 @@ import importlib
 import logging
 import os
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Set
 from datetime import datetime, timezone
 import json
 from peewee import fn, SqliteDatabase, PostgresqlDatabase, JOIN, OperationalError
@@ -10,11 +10,14 @@ from peewee import fn, SqliteDatabase, PostgresqlDatabase, JOIN, OperationalErro
 #import sqlite_vec 
 from playhouse.migrate import SqliteMigrator, PostgresqlMigrator, migrate
 from playhouse.shortcuts import model_to_dict
-from .models import database, MODELS as BASE_MODELS, DEFAULT_PROMPT_TEMPLATE, Media, WatchHistory, Search, LLMStat, Schedule, Settings, Migrations, MediaResearch
+from .models import database, MODELS as BASE_MODELS, DEFAULT_PROMPT_TEMPLATE, Media, WatchHistory, Search, LLMStat, Schedule, Settings, Migrations, MediaResearch, TMDBCache, LibrarySnapshot, SyncState, ExternalIdCache, ImageCacheEntry, NON_TMDB_ID_PROVIDERS, media_has_tmdb_id
 from .backup import BackupService
 from .settings import SettingsService # Import SettingsService
 from .migrations import Migration
 
+# Media columns included with each watch history entry, nested under 'media'
+WATCH_HISTORY_MEDIA_FIELDS = ("id", "title", "media_type", "tmdb_id", "poster_url", "poster_url_source", "source_provider", "entity_type")
+
 class Database:
     """
     A class to handle database operations using Peewee ORM.
@@ -179,7 +182,9 @@ class Database:
 
         # Create tables using the determined list of models
         self.logger.info(f"Final list of models for table creation: {[m.__name__ for m in default_models]}")
-        database.create_tables(default_models, safe=True)
+        # Only create missing tables. Indexes on existing tables are added by migrations,
+        # which can clean up data (e.g., duplicates) before a unique index is created.
+        database.create_tables([m for m in default_models if not m.table_exists()], safe=True)
         
         # Run migrations after creating tables
         self._run_migrations()
@@ -343,6 +348,42 @@ class Database:
                 kwargs={},
                 enabled=True)
 
+        # Add daily job for refreshing the library snapshot if it doesn't exist
+        job_id="refresh_library_snapshot"
+        schedule = self.get_schedule_by_job_id(job_id)
+        if not schedule:
+            self.add_schedule(
+                search_id=None,
+                job_id=job_id,
+                func_name="refresh_library_snapshot",
+                year="*",
+                month="*",
+                hour="4",
+                minute="0",
+                day="*",
+                day_of_week="*",
+                args=[],
+                kwargs={},
+                enabled=True)
+
+        # Add daily job for removing orphaned and over-budget cached images if it doesn't exist
+        job_id="clean_image_cache"
+        schedule = self.get_schedule_by_job_id(job_id)
+        if not schedule:
+            self.add_schedule(
+                search_id=None,
+                job_id=job_id,
+                func_name="clean_image_cache",
+                year="*",
+                month="*",
+                hour="5",
+                minute="0",
+                day="*",
+                day_of_week="*",
+                args=[],
+                kwargs={},
+                enabled=True)
+
     def create_media(self, media_data: Dict[str, Any]) -> Optional[int]:
         """Create a new media entry in the database."""
         try:
@@ -387,6 +428,15 @@ class Database:
             self.logger.error(f"Error deleting media entry: {e}")
             return False
 
+    def get_media_by_tmdb_id(self, tmdb_id: str, media_type: str) -> Optional[Dict[str, Any]]:
+        """Get a media entry by its TMDB ID and media type. Rows holding a provider item ID instead (Plex) never match."""
+        try:
+            media = Media.get_or_none((Media.tmdb_id == str(tmdb_id)) & (Media.media_type == media_type) & media_has_tmdb_id())
+            return model_to_dict(media) if media else None
+        except Exception as e:
+            self.logger.error(f"Error retrieving media entry by TMDB ID {tmdb_id}: {e}")
+            return None
+
     def delete_media_by_tmdb_id(self, tmdb_id: str, media_type: str) -> bool:
         """Delete a media entry from the database by TMDB ID and media type."""
         try:
@@ -398,6 +448,159 @@ class Database:
             self.logger.error(f"Error deleting media entry by TMDB ID {tmdb_id}: {e}")
             return False
 
+    def _parse_last_played_date(self, last_played_date_iso: Optional[str]) -> Optional[datetime]:
+        """
+        Parses an ISO 8601 last played date into a naive UTC datetime for storage.
+
+        Args:
+            last_played_date_iso (Optional[str]): The ISO 8601 string. If None, defaults to now (UTC).
+
+        Returns:
+            Optional[datetime]: The naive UTC datetime, or None if the string could not be parsed.
+        """
+        # If last_played_date is None, default to now (UTC)
+        if last_played_date_iso is None:
+            self.logger.info("last_played_date_iso is None, defaulting to current UTC time.")
+            last_played_date_iso = datetime.now(timezone.utc).isoformat()
+        try:
+            # Parse the ISO 8601 date string.
+            if last_played_date_iso.endswith('Z'):
+                # Python's fromisoformat before 3.11 doesn't handle 'Z' directly.
+                dt_last_played_date = datetime.fromisoformat(last_played_date_iso[:-1] + '+00:00')
+            else:
+                # Attempt direct parsing for other ISO 8601 compliant strings (e.g., with offset)
+                dt_last_played_date = datetime.fromisoformat(last_played_date_iso)
+        except ValueError as ve:
+            self.logger.error(f"Error parsing last_played_date_iso '{last_played_date_iso}': {ve}")
+            return None
+        # Convert to naive UTC datetime for storage, common practice for SQLite with Peewee.
+        return dt_last_played_date.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def _find_watch_history_media(self, entries: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Matches watch history entries to existing Media in bulk, by media type and title
+        (case-insensitive), falling back to media type and TMDB ID. The TMDB ID fallback only
+        applies when both the entry and the Media row hold real TMDB IDs (not Plex item IDs).
+        Raises on database errors, callers handle them.
+        """
+        titles = list({entry["title"].lower() for entry in entries})
+        tmdb_ids = list({entry["tmdb_id"] for entry in entries if entry.get("tmdb_id") and entry.get("source_provider") not in NON_TMDB_ID_PROVIDERS})
+        by_title: Dict[tuple, Dict[str, Any]] = {}
+        by_tmdb_id: Dict[tuple, Dict[str, Any]] = {}
+        columns = (Media.id, Media.title, Media.media_type, Media.tmdb_id, Media.watch_count, Media.source_provider)
+        for values, condition in ((titles, lambda chunk: fn.Lower(Media.title).in_(chunk)),
+                                  (tmdb_ids, lambda chunk: Media.tmdb_id.in_(chunk) & media_has_tmdb_id())):
+            for i in range(0, len(values), 500): # Stay under the bound parameter limit
+                for row in Media.select(*columns).where(condition(values[i:i + 500])).order_by(Media.id).dicts():
+                    by_title.setdefault((row["media_type"], row["title"].lower()), row)
+                    if row["tmdb_id"] and row["source_provider"] not in NON_TMDB_ID_PROVIDERS:
+                        by_tmdb_id.setdefault((row["media_type"], row["tmdb_id"]), row)
+        return [
+            by_title.get((entry["media_type"], entry["title"].lower()))
+            or (by_tmdb_id.get((entry["media_type"], entry.get("tmdb_id"))) if entry.get("source_provider") not in NON_TMDB_ID_PROVIDERS else None)
+            for entry in entries
+        ]
+
+    def find_watch_history_media(self, entries: List[Dict[str, Any]]) -> Optional[List[Optional[Dict[str, Any]]]]:
+        """
+        Matches watch history entries to existing Media records in bulk.
+
+        Args:
+            entries (List[Dict[str, Any]]): Entries with 'title', 'media_type' and optionally 'tmdb_id' and 'source_provider'.
+
+        Returns:
+            Optional[List[Optional[Dict[str, Any]]]]: The matched Media (id, title, media_type, tmdb_id, watch_count, source_provider)
+                                                      for each entry, None where there is no match.
+                                                      None if an error occurs.
+        """
+        try:
+            return self._find_watch_history_media(entries)
+        except Exception as e:
+            self.logger.error(f"Error matching watch history media: {e}", exc_info=True)
+            return None
+
+    def sync_watch_history_batch(self, watched_by: str, entries: List[Dict[str, Any]], new_media: Optional[List[Dict[str, Any]]] = None) -> Optional[int]:
+        """
+        Adds or updates watch history for a batch of items in a single transaction.
+        New Media rows are inserted in bulk, watch history is upserted per media and user, and the
+        watch count of existing media with a new or changed play is incremented.
+
+        Args:
+            watched_by (str): The identifier of who watched the media.
+            entries (List[Dict[str, Any]]): Entries with 'title', 'media_type', 'tmdb_id', 'source_provider' and 'last_played_date' (ISO 8601).
+            new_media (Optional[List[Dict[str, Any]]]): Media rows to create before matching the entries.
+
+        Returns:
+            Optional[int]: The number of watch history entries added or updated, None if an error occurs.
+        """
+        try:
+            with self.db.atomic():
+                new_media = new_media or []
+                if new_media:
+                    # Media built outside the transaction may have been created by another writer since
+                    existing_media = self._find_watch_history_media(new_media)
+                    new_media = [media for media, existing in zip(new_media, existing_media) if not existing]
+                for i in range(0, len(new_media), 100):
+                    Media.insert_many(new_media[i:i + 100]).execute()
+                new_media_keys = {(media["media_type"], media["title"].lower()) for media in new_media}
+
+                matches = self._find_watch_history_media(entries)
+                media_ids = list({media["id"] for media in matches if media})
+                existing_history = {}
+                for i in range(0, len(media_ids), 500):
+                    query = (WatchHistory
+                             .select(WatchHistory.media, WatchHistory.watched_by, WatchHistory.last_played_date)
+                             .where(WatchHistory.media.in_(media_ids[i:i + 500]) & (fn.Lower(WatchHistory.watched_by) == watched_by.lower())))
+                    for history in query:
+                        existing_history[history.media_id] = history
+
+                now = datetime.now()
+                upserts: Dict[int, Dict[str, Any]] = {}
+                created_media_ids = set()
+                for entry, media in zip(entries, matches):
+                    if not media:
+                        self.logger.error(f"No media found for '{entry['title']}' ({entry['media_type']}). Skipping watch history.")
+                        continue
+                    last_played_date = self._parse_last_played_date(entry.get("last_played_date"))
+                    if last_played_date is None:
+                        continue
+                    existing = existing_history.get(media["id"])
+                    if existing and existing.last_played_date == last_played_date:
+                        continue # Already up to date
+                    if media["id"] in upserts and upserts[media["id"]]["last_played_date"] >= last_played_date:
+                        continue # Keep the most recent play within the batch
+                    upserts[media["id"]] = {
+                        "media": media["id"],
+                        # Reuse the stored spelling so the upsert hits the existing entry
+                        "watched_by": existing.watched_by if existing else watched_by,
+                        "last_played_date": last_played_date,
+                        "updated_at": now,
+                    }
+                    if (media["media_type"], media["title"].lower()) in new_media_keys:
+                        created_media_ids.add(media["id"])
+
+                rows = list(upserts.values())
+                for i in range(0, len(rows), 100):
+                    (WatchHistory
+                     .insert_many(rows[i:i + 100])
+                     .on_conflict(conflict_target=[WatchHistory.media, WatchHistory.watched_by],
+                                  preserve=[WatchHistory.last_played_date, WatchHistory.updated_at])
+                     .execute())
+
+                # Newly created media already start with a watch count of 1
+                watched_media_ids = [row["media"] for row in rows if row["media"] not in created_media_ids]
+                for i in range(0, len(watched_media_ids), 500):
+                    (Media
+                     .update(watch_count=fn.COALESCE(Media.watch_count, 0) + 1, watched=True, updated_at=now)
+                     .where(Media.id.in_(watched_media_ids[i:i + 500]))
+                     .execute())
+
+            self.logger.info(f"Synced watch history batch for {watched_by}: {len(new_media)} new media, {len(rows)} entries added/updated.")
+            return len(rows)
+        except Exception as e:
+            self.logger.error(f"Error syncing watch history batch for {watched_by}: {e}", exc_info=True)
+            return None
+
     def add_watch_history(self, media_id: int, watched_by: str, last_played_date_iso: str) -> bool:
         """
         Add or update a watch history entry.
@@ -411,27 +614,11 @@ class Database:
             bool: True if the operation was successful, False otherwise.
         """
         try:
-            # If last_played_date is None, default to now (UTC)
-            if last_played_date_iso is None:
-                self.logger.info(f"last_played_date_iso is None for media_id {media_id}, defaulting to current UTC time.")
-                last_played_date_iso = datetime.now(timezone.utc).isoformat()
-                
-            dt_last_played_date: datetime
-            try:
-                # Parse the ISO 8601 date string.
-                if last_played_date_iso.endswith('Z'):
-                    # Python's fromisoformat before 3.11 doesn't handle 'Z' directly.
-                    dt_last_played_date = datetime.fromisoformat(last_played_date_iso[:-1] + '+00:00')
-                else:
-                    # Attempt direct parsing for other ISO 8601 compliant strings (e.g., with offset)
-                    dt_last_played_date = datetime.fromisoformat(last_played_date_iso)
-            except ValueError as ve:
-                self.logger.error(f"Error parsing last_played_date_iso '{last_played_date_iso}' for media_id {media_id}: {ve}")
+            dt_last_played_date_utc = self._parse_last_played_date(last_played_date_iso)
+            if dt_last_played_date_utc is None:
+                self.logger.error(f"Error parsing last_played_date_iso '{last_played_date_iso}' for media_id {media_id}")
                 return False
             
-            # Convert to naive UTC datetime for storage, common practice for SQLite with Peewee.
-            dt_last_played_date_utc = dt_last_played_date.astimezone(timezone.utc).replace(tzinfo=None)
-            
             # Check if an entry already exists for this media_id and user.
             existing_entry = WatchHistory.get_or_none(
                 (WatchHistory.media_id == media_id) &
@@ -487,6 +674,31 @@ class Database:
             self.logger.error(f"Error updating processed status for watch history ID {watch_history_id}: {e}", exc_info=True)
             return False
 
+    def bulk_update_watch_history_processed(self, watch_history_ids: List[int], processed: bool) -> int:
+        """
+        Update the processed status and processed_at timestamp for many watch history entries in one statement.
+
+        Args:
+            watch_history_ids (List[int]): The primary keys of the WatchHistory entries.
+            processed (bool): The new processed status.
+
+        Returns:
+            int: The number of rows updated. Returns 0 on error.
+        """
+        if not watch_history_ids:
+            return 0
+        try:
+            now = datetime.now()
+            updated = (WatchHistory
+                .update(processed=processed, processed_at=now if processed else None, updated_at=now)
+                .where(WatchHistory.id.in_(watch_history_ids))
+                .execute())
+            self.logger.info(f"Updated processed status to {processed} for {updated} watch history entries.")
+            return updated
+        except Exception as e:
+            self.logger.error(f"Error bulk updating processed status for watch history IDs {watch_history_ids}: {e}", exc_info=True)
+            return 0
+
     def get_watch_history_item_by_id(self, history_item_id: int) -> Optional[Dict[str, Any]]:
         """
         Get a specific watch history item by its ID.
@@ -506,6 +718,7 @@ class Database:
     def get_watch_history(self, limit: Optional[int] = 10, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, processed: Optional[bool] = None, media_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Get watch history, optionally filtered by date range.
+        Media is fetched in the same query (joined) rather than loaded per row.
         
         Args:
             limit (Optional[int]): Maximum number of records to return. If None, returns all.
@@ -513,11 +726,15 @@ class Database:
             end_date (Optional[datetime]): The end date for filtering.
 
         Returns:
-            List[Dict[str, Any]]: A list of watch history entries.
+            List[Dict[str, Any]]: A list of watch history entries, each with its media nested under 'media'.
         """
         try:
+            media_columns = [getattr(Media, field).alias(f"media__{field}") for field in WATCH_HISTORY_MEDIA_FIELDS]
             query = (WatchHistory
-                    .select(WatchHistory)
+                    .select(WatchHistory.id, WatchHistory.watched_by, WatchHistory.last_played_date,
+                            WatchHistory.processed, WatchHistory.processed_at, WatchHistory.created_at,
+                            WatchHistory.updated_at, *media_columns)
+                    .join(Media, on=(WatchHistory.media == Media.id))
                     .order_by(WatchHistory.last_played_date.desc()))
             
             if start_date:
@@ -530,10 +747,35 @@ class Database:
                 query = query.where(WatchHistory.media_id == media_id)
             if limit is not None:
                 query = query.limit(limit)
-            return [model_to_dict(h) for h in query]
+
+            history = []
+            for row in query.dicts():
+                entry = {key: value for key, value in row.items() if not key.startswith("media__")}
+                entry["media"] = {field: row[f"media__{field}"] for field in WATCH_HISTORY_MEDIA_FIELDS}
+                history.append(entry)
+            return history
         except Exception as e:
             self.logger.error(f"Error retrieving watch history: {e}")
             return []
+
+    def get_watch_history_titles(self) -> List[str]:
+        """
+        Get the distinct titles of all watched media, sorted.
+
+        Returns:
+            List[str]: Unique watched media titles.
+        """
+        try:
+            query = (Media
+                    .select(Media.title)
+                    .join(WatchHistory, on=(WatchHistory.media == Media.id))
+                    .where(Media.title.is_null(False) & (Media.title != ""))
+                    .distinct()
+                    .order_by(Media.title))
+            return [title for (title,) in query.tuples()]
+        except Exception as e:
+            self.logger.error(f"Error retrieving watch history titles: {e}")
+            return []
         
     def get_media_count_for_provider(self, provider: str) -> int:
         """
@@ -578,8 +820,10 @@ class Database:
             int: The number of rows deleted. Returns 0 on error.
         """
         try:
-            query = WatchHistory.delete()
-            return query.execute()  # Returns the number of rows deleted
+            with database.atomic():
+                deleted = WatchHistory.delete().execute()  # Returns the number of rows deleted
+                SyncState.delete().execute() # Without history the next sync must fetch everything again
+            return deleted
         except Exception as e:
             self.logger.error(f"Error deleting all watch history items: {e}", exc_info=True)
             return 0
@@ -1093,6 +1337,435 @@ class Database:
             self.logger.error(f"Error deleting setting: {e}")
             return False
 
+    def get_tmdb_cache(self, endpoint: str, media_type: str, lookup_key: str, language: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached TMDB response if it exists and has not expired.
+
+        Args:
+            endpoint (str): The cached TMDB endpoint (e.g., 'search', 'detail').
+            media_type (str): 'movie' or 'tv'.
+            lookup_key (str): The normalized search query or TMDB ID.
+            language (str): The language the response was requested in.
+
+        Returns:
+            Optional[Dict[str, Any]]: A dict with 'response' (the decoded payload, None for a cached miss)
+                                      and 'expires_at', or None if nothing usable is cached.
+        """
+        try:
+            entry = TMDBCache.get_or_none(
+                (TMDBCache.endpoint == endpoint) &
+                (TMDBCache.media_type == media_type) &
+                (TMDBCache.lookup_key == lookup_key) &
+                (TMDBCache.language == language)
+            )
+            if not entry or entry.expires_at <= datetime.now():
+                return None
+            return {
+                "response": json.loads(entry.response) if entry.response else None,
+                "expires_at": entry.expires_at,
+            }
+        except Exception as e:
+            self.logger.error(f"Error reading TMDB cache for {endpoint}/{media_type}/{lookup_key}: {e}")
+            return None
+
+    def set_tmdb_cache(self, endpoint: str, media_type: str, lookup_key: str, language: str, response: Optional[Dict[str, Any]], expires_at: datetime) -> bool:
+        """
+        Insert or replace a cached TMDB response.
+
+        Args:
+            endpoint (str): The cached TMDB endpoint (e.g., 'search', 'detail').
+            media_type (str): 'movie' or 'tv'.
+            lookup_key (str): The normalized search query or TMDB ID.
+            language (str): The language the response was requested in.
+            response (Optional[Dict[str, Any]]): The payload to cache. None caches a miss.
+            expires_at (datetime): When the entry stops being served.
+
+        Returns:
+            bool: True if the entry was stored, False on error.
+        """
+        try:
+            now = datetime.now()
+            (TMDBCache
+                .insert(
+                    endpoint=endpoint,
+                    media_type=media_type,
+                    lookup_key=lookup_key,
+                    language=language,
+                    response=json.dumps(response) if response is not None else None,
+                    created_at=now,
+                    expires_at=expires_at)
+                .on_conflict(
+                    conflict_target=[TMDBCache.endpoint, TMDBCache.media_type, TMDBCache.lookup_key, TMDBCache.language],
+                    update={
+                        TMDBCache.response: json.dumps(response) if response is not None else None,
+                        TMDBCache.created_at: now,
+                        TMDBCache.expires_at: expires_at,
+                    })
+                .execute())
+            return True
+        except Exception as e:
+            self.logger.error(f"Error writing TMDB cache for {endpoint}/{media_type}/{lookup_key}: {e}")
+            return False
+
+    def delete_expired_tmdb_cache(self) -> int:
+        """
+        Deletes all expired TMDB cache entries.
+
+        Returns:
+            int: The number of rows deleted. Returns 0 on error.
+        """
+        try:
+            return TMDBCache.delete().where(TMDBCache.expires_at <= datetime.now()).execute()
+        except Exception as e:
+            self.logger.error(f"Error deleting expired TMDB cache entries: {e}")
+            return 0
+
+    def get_external_ids(self, provider: str, item_ids: List[str]) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        Get cached external IDs for a provider's items.
+
+        Args:
+            provider (str): The provider name (e.g., 'jellyfin').
+            item_ids (List[str]): The provider's item IDs.
+
+        Returns:
+            Dict[str, Dict[str, Optional[str]]]: Per cached item ID, a dict with 'tmdbid', 'tvdbid' and 'imdbid'.
+                                                 Items that are not cached are missing. Returns {} on error.
+        """
+        try:
+            external_ids: Dict[str, Dict[str, Optional[str]]] = {}
+            item_ids = list(dict.fromkeys(str(item_id) for item_id in item_ids if item_id))
+            for i in range(0, len(item_ids), 500):
+                query = ExternalIdCache.select().where(
+                    (ExternalIdCache.provider == provider) & (ExternalIdCache.item_id.in_(item_ids[i:i + 500]))
+                )
+                for entry in query:
+                    external_ids[entry.item_id] = {"tmdbid": entry.tmdb_id, "tvdbid": entry.tvdb_id, "imdbid": entry.imdb_id}
+            return external_ids
+        except Exception as e:
+            self.logger.error(f"Error reading cached external IDs for {provider}: {e}")
+            return {}
+
+    def set_external_ids(self, provider: str, external_ids: Dict[str, Dict[str, Optional[str]]]) -> bool:
+        """
+        Insert or replace cached external IDs for a provider's items.
+
+        Args:
+            provider (str): The provider name (e.g., 'jellyfin').
+            external_ids (Dict[str, Dict[str, Optional[str]]]): Per item ID, a dict with 'tmdbid', 'tvdbid' and 'imdbid'.
+
+        Returns:
+            bool: True if the entries were stored, False on error.
+        """
+        try:
+            now = datetime.now()
+            rows = [
+                {
+                    "provider": provider,
+                    "item_id": str(item_id),
+                    "tmdb_id": ids.get("tmdbid"),
+                    "tvdb_id": ids.get("tvdbid"),
+                    "imdb_id": ids.get("imdbid"),
+                    "updated_at": now,
+                }
+                for item_id, ids in external_ids.items()
+            ]
+            with database.atomic():
+                for i in range(0, len(rows), 100):
+                    (ExternalIdCache
+                        .insert_many(rows[i:i + 100])
+                        .on_conflict(
+                            conflict_target=[ExternalIdCache.provider, ExternalIdCache.item_id],
+                            preserve=[ExternalIdCache.tmdb_id, ExternalIdCache.tvdb_id, ExternalIdCache.imdb_id, ExternalIdCache.updated_at])
+                        .execute())
+            return True
+        except Exception as e:
+            self.logger.error(f"Error writing cached external IDs for {provider}: {e}", exc_info=True)
+            return False
+
+    def record_cached_image(self, filename: str, source_url: Optional[str], size_bytes: int) -> bool:
+        """
+        Insert or update the cache index entry of a downloaded image and mark it as just used.
+
+        Args:
+            filename (str): The cache filename (e.g., 'tmdb_603.jpg').
+            source_url (Optional[str]): Where the image was downloaded from.
+            size_bytes (int): Disk usage of the image and its variants.
+
+        Returns:
+            bool: True if the entry was stored, False on error.
+        """
+        try:
+            now = datetime.now()
+            (ImageCacheEntry
+                .insert(filename=filename, source_url=source_url, size_bytes=size_bytes, last_accessed_at=now, created_at=now)
+                .on_conflict(
+                    conflict_target=[ImageCacheEntry.filename],
+                    preserve=[ImageCacheEntry.source_url, ImageCacheEntry.size_bytes, ImageCacheEntry.last_accessed_at])
+                .execute())
+            return True
+        except Exception as e:
+            self.logger.error(f"Error recording cached image {filename}: {e}")
+            return False
+
+    def update_cached_image_size(self, filename: str, size_bytes: int) -> bool:
+        """Update the disk usage of an indexed image, e.g. after a variant was added. Images not indexed are left alone."""
+        try:
+            ImageCacheEntry.update(size_bytes=size_bytes).where(ImageCacheEntry.filename == filename).execute()
+            return True
+        except Exception as e:
+            self.logger.error(f"Error updating cached image size of {filename}: {e}")
+            return False
+
+    def get_cached_image(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Get the cache index entry of an image, None if it is not indexed or on error."""
+        try:
+            entry = ImageCacheEntry.get_or_none(ImageCacheEntry.filename == filename)
+            return model_to_dict(entry) if entry else None
+        except Exception as e:
+            self.logger.error(f"Error retrieving cached image {filename}: {e}")
+            return None
+
+    def get_poster_source_url(self, filename: str) -> Optional[str]:
+        """Get the original URL of a media poster by its cache filename, None if no media uses it or on error."""
+        try:
+            return (Media
+                    .select(Media.poster_url_source)
+                    .where((Media.poster_url == filename) & Media.poster_url_source.is_null(False))
+                    .limit(1)
+                    .scalar())
+        except Exception as e:
+            self.logger.error(f"Error retrieving poster source URL for {filename}: {e}")
+            return None
+
+    def touch_cached_images(self, filenames: Iterable[str], accessed_at: Optional[datetime] = None) -> int:
+        """
+        Mark cached images as used for LRU eviction.
+
+        Args:
+            filenames (Iterable[str]): The cache filenames.
+            accessed_at (Optional[datetime]): When they were used. Defaults to now.
+
+        Returns:
+            int: The number of entries updated. Returns 0 on error.
+        """
+        try:
+            filenames = list(filenames)
+            accessed_at = accessed_at or datetime.now()
+            updated = 0
+            with database.atomic():
+                for i in range(0, len(filenames), 500):
+                    updated += (ImageCacheEntry
+                        .update(last_accessed_at=accessed_at)
+                        .where(ImageCacheEntry.filename.in_(filenames[i:i + 500]))
+                        .execute())
+            return updated
+        except Exception as e:
+            self.logger.error(f"Error updating cached image access times: {e}")
+            return 0
+
+    def get_cached_images_size(self) -> int:
+        """Get the total disk usage of the indexed images in bytes. Returns 0 on error."""
+        try:
+            return ImageCacheEntry.select(fn.COALESCE(fn.SUM(ImageCacheEntry.size_bytes), 0)).scalar() or 0
+        except Exception as e:
+            self.logger.error(f"Error summing cached image sizes: {e}")
+            return 0
+
+    def get_least_recently_used_images(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Get the cached images that were used the longest time ago, skipping evicted ones.
+
+        Args:
+            limit (int): Maximum number of entries to return.
+
+        Returns:
+            List[Dict[str, Any]]: Entries with 'filename' and 'size_bytes', least recently used first. Returns [] on error.
+        """
+        try:
+            query = (ImageCacheEntry
+                    .select(ImageCacheEntry.filename, ImageCacheEntry.size_bytes)
+                    .where(ImageCacheEntry.size_bytes > 0)
+                    .order_by(ImageCacheEntry.last_accessed_at.asc(), ImageCacheEntry.id.asc())
+                    .limit(limit))
+            return list(query.dicts())
+        except Exception as e:
+            self.logger.error(f"Error retrieving least recently used images: {e}")
+            return []
+
+    def mark_cached_images_evicted(self, filenames: List[str]) -> bool:
+        """Zero the size of evicted images. Their entries keep the source URL so they can be fetched again."""
+        try:
+            with database.atomic():
+                for i in range(0, len(filenames), 500):
+                    ImageCacheEntry.update(size_bytes=0).where(ImageCacheEntry.filename.in_(filenames[i:i + 500])).execute()
+            return True
+        except Exception as e:
+            self.logger.error(f"Error marking cached images as evicted: {e}")
+            return False
+
+    def delete_cached_image_entries(self, keep: Set[str]) -> int:
+        """
+        Delete the cache index entries of every image not in keep.
+
+        Args:
+            keep (Set[str]): Filenames whose entries are kept.
+
+        Returns:
+            int: The number of entries deleted. Returns 0 on error.
+        """
+        try:
+            stale = [filename for (filename,) in ImageCacheEntry.select(ImageCacheEntry.filename).tuples() if filename not in keep]
+            deleted = 0
+            with database.atomic():
+                for i in range(0, len(stale), 500):
+                    deleted += ImageCacheEntry.delete().where(ImageCacheEntry.filename.in_(stale[i:i + 500])).execute()
+            return deleted
+        except Exception as e:
+            self.logger.error(f"Error deleting stale cached image entries: {e}")
+            return 0
+
+    def get_media_poster_filenames(self) -> Optional[Set[str]]:
+        """
+        Get every poster_url referenced by the Media table in a single query.
+
+        Returns:
+            Optional[Set[str]]: The distinct poster values, or None on error so callers never treat a failure as "nothing referenced".
+        """
+        try:
+            query = Media.select(Media.poster_url).where(Media.poster_url.is_null(False)).distinct().tuples()
+            return {poster_url for (poster_url,) in query}
+        except Exception as e:
+            self.logger.error(f"Error retrieving media poster filenames: {e}")
+            return None
+
+    def get_library_snapshot(self, provider: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the stored library snapshot rows.
+
+        Args:
+            provider (Optional[str]): Only return rows for this provider. If None, returns all providers.
+
+        Returns:
+            List[Dict[str, Any]]: Snapshot rows with provider, category, user_name, name, tmdb_id, media_type and refreshed_at.
+        """
+        try:
+            query = LibrarySnapshot.select().order_by(LibrarySnapshot.id)
+            if provider:
+                query = query.where(LibrarySnapshot.provider == provider)
+            return list(query.dicts())
+        except Exception as e:
+            self.logger.error(f"Error retrieving library snapshot: {e}")
+            return []
+
+    def delete_library_snapshot(self, provider: str) -> bool:
+        """Delete all snapshot rows for a provider. Returns True on success, False on error."""
+        try:
+            LibrarySnapshot.delete().where(LibrarySnapshot.provider == provider).execute()
+            return True
+        except Exception as e:
+            self.logger.error(f"Error deleting library snapshot for {provider}: {e}")
+            return False
+
+    def replace_library_snapshot(self, provider: str, rows: List[Dict[str, Any]]) -> bool:
+        """
+        Replace all snapshot rows for a provider in a single transaction.
+
+        Args:
+            provider (str): The provider whose snapshot is replaced.
+            rows (List[Dict[str, Any]]): Rows with category, user_name, name, tmdb_id and media_type.
+
+        Returns:
+            bool: True if the snapshot was replaced, False on error.
+        """
+        try:
+            now = datetime.now()
+            with database.atomic():
+                LibrarySnapshot.delete().where(LibrarySnapshot.provider == provider).execute()
+                records = [dict(row, provider=provider, refreshed_at=now) for row in rows]
+                for i in range(0, len(records), 100):
+                    LibrarySnapshot.insert_many(records[i:i + 100]).execute()
+            self.logger.info(f"Stored library snapshot for {provider} with {len(rows)} rows.")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error replacing library snapshot for {provider}: {e}", exc_info=True)
+            return False
+
+    def get_sync_state(self, provider: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the watch history sync state of a provider user.
+
+        Args:
+            provider (str): The provider name.
+            user_id (str): The provider's user ID.
+
+        Returns:
+            Optional[Dict[str, Any]]: The sync state with last_played_date (naive UTC), activity_marker and last_synced_at, or None if the user was never synced or an error occurs.
+        """
+        try:
+            return SyncState.select().where(
+                (SyncState.provider == provider) & (SyncState.user_id == str(user_id))
+            ).dicts().get()
+        except SyncState.DoesNotExist:
+            return None
+        except Exception as e:
+            self.logger.error(f"Error retrieving sync state for {provider} user {user_id}: {e}")
+            return None
+
+    def update_sync_state(self, provider: str, user_id: str, user_name: Optional[str], last_played_date: Optional[datetime], activity_marker: Optional[str] = None) -> bool:
+        """
+        Record a completed watch history sync for a provider user. The stored watermark only moves forward.
+
+        Args:
+            provider (str): The provider name.
+            user_id (str): The provider's user ID.
+            user_name (Optional[str]): The provider's user name.
+            last_played_date (Optional[datetime]): The newest play that was synced (naive UTC). None keeps the current watermark.
+            activity_marker (Optional[str]): The provider's history activity marker read before the sync. None keeps the current marker.
+
+        Returns:
+            bool: True if the sync state was saved, False on error.
+        """
+        try:
+            now = datetime.now()
+            with database.atomic():
+                state, created = SyncState.get_or_create(
+                    provider=provider, user_id=str(user_id),
+                    defaults={"user_name": user_name, "last_played_date": last_played_date, "activity_marker": activity_marker, "last_synced_at": now}
+                )
+                if not created:
+                    state.user_name = user_name
+                    if last_played_date and (not state.last_played_date or last_played_date > state.last_played_date):
+                        state.last_played_date = last_played_date
+                    if activity_marker:
+                        state.activity_marker = activity_marker
+                    state.last_synced_at = now
+                    state.updated_at = now
+                    state.save()
+            return True
+        except Exception as e:
+            self.logger.error(f"Error updating sync state for {provider} user {user_id}: {e}", exc_info=True)
+            return False
+
+    def reset_sync_state(self, provider: Optional[str] = None) -> int:
+        """
+        Delete stored sync state so the next sync fetches the full watch history again.
+
+        Args:
+            provider (Optional[str]): Only reset this provider. If None, resets all providers.
+
+        Returns:
+            int: The number of rows deleted. Returns 0 on error.
+        """
+        try:
+            query = SyncState.delete()
+            if provider:
+                query = query.where(SyncState.provider == provider)
+            return query.execute()
+        except Exception as e:
+            self.logger.error(f"Error resetting sync state: {e}", exc_info=True)
+            return 0
+
     def cleanup(self):
         """Close the database connection."""
         if not database.is_closed():
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import threading
+from typing import Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+class HttpTransport:
+    """
+    Shared synchronous HTTP transport for the REST providers (Jellyfin, Radarr, Sonarr, Jellyseerr, Overseerr).
+    Reuses keep-alive connections per host, applies default timeouts and retries idempotent calls
+    with jittered exponential backoff. request_async runs a request off the event loop.
+    """
+
+    TIMEOUT = (5, 30) # (connect, read) seconds
+    POOL_CONNECTIONS = 10 # Number of hosts to keep pools for
+    POOL_MAXSIZE = 20 # Connections kept per host
+    MAX_RETRIES = 3
+    BACKOFF_FACTOR = 0.5
+    BACKOFF_JITTER = 0.5
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+
+    def _build_session(self) -> requests.Session:
+        """Creates a session with pooled, retrying adapters for http and https."""
+        retry = Retry(
+            total=self.MAX_RETRIES,
+            backoff_factor=self.BACKOFF_FACTOR,
+            backoff_jitter=self.BACKOFF_JITTER,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS, # Idempotent methods only, POST is never replayed
+            respect_retry_after_header=True,
+            raise_on_status=False, # Return the last response so callers handle the status as before
+        )
+        adapter = HTTPAdapter(pool_connections=self.POOL_CONNECTIONS, pool_maxsize=self.POOL_MAXSIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        """The shared session, created on first use."""
+        with self._lock:
+            if self._session is None:
+                self._session = self._build_session()
+            return self._session
+
+    def request(self, method: str, url: str, timeout: Optional[Union[float, Tuple[float, float]]] = None, **kwargs) -> requests.Response:
+        """
+        Sends a request through the shared session.
+
+        Args:
+            method (str): HTTP method (GET, POST, PUT, DELETE, etc.)
+            url (str): The full URL.
+            timeout (Optional[Union[float, Tuple[float, float]]]): Overrides the default (connect, read) timeout.
+            **kwargs: Passed to requests (headers, params, json, ...).
+
+        Returns:
+            requests.Response: The response. Raises requests exceptions like requests.request does.
+        """
+        return self.session.request(method, url, timeout=timeout or self.TIMEOUT, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Sends a GET request through the shared session."""
+        return self.request("GET", url, **kwargs)
+
+    async def request_async(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Sends a request through the shared session in a worker thread, without blocking the event loop."""
+        return await asyncio.to_thread(self.request, method, url, **kwargs)
+
+    def close(self) -> None:
+        """Closes the pooled connections. A new session is created if the transport is used again."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+transport = HttpTransport()
@@ -1,26 +1,62 @@
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, List, Set, Tuple, TYPE_CHECKING
 from urllib.parse import urlparse
 import os
+import time
 import asyncio
+import threading
+import uuid
 import aiohttp
 import aiofiles
+from PIL import Image, UnidentifiedImageError
+
+if TYPE_CHECKING:
+    from services.database import Database
 
 class ImageCacheService:
     """
     A service to download and cache images locally.
+    Downloads share one keep-alive aiohttp session per event loop and can be queued
+    to a bounded set of background workers, so callers do not wait on each image.
+    Each cache file is downloaded once at a time and only appears once it is complete.
+    Resized WebP variants are stored next to each original, e.g. "tmdb_603.jpg.grid.webp".
+    With a database, downloads are indexed so the cache can be kept under a disk budget by
+    evicting the least recently served images, and files no longer used by any media are removed.
     """
 
-    def __init__(self, cache_base_dir: str = "/cache/image"):
+    MAX_CONNECTIONS = 10
+    MAX_CONCURRENT_DOWNLOADS = 4 # Background workers per event loop
+    MAX_QUEUED_DOWNLOADS = 1000 # Queue_image falls back to the source URL beyond this
+    TIMEOUT = aiohttp.ClientTimeout(total=30, connect=5)
+    VARIANTS = {"grid": 342, "detail": 780} # Variant name -> maximum width in pixels, never upscaled
+    ORIGINAL = "original"
+    WEBP_QUALITY = 80
+    BUDGET_CHECK_BYTES = 50 * 1024 * 1024 # Downloaded bytes between disk budget checks
+    EVICTION_BATCH_SIZE = 100
+    ORPHAN_GRACE_SECONDS = 3600 # Recent files may belong to media that is not saved yet
+
+    def __init__(self, cache_base_dir: str = "/cache/image", db: Optional['Database'] = None, max_size_bytes: int = 0):
         """
         Initializes the ImageCacheService.
 
         Args:
             cache_base_dir (str): The base directory where images will be cached.
+            db (Optional[Database]): Database holding the cache index. Without it there is no eviction or orphan collection.
+            max_size_bytes (int): Disk budget for cached images and their variants. 0 means no limit.
         """
         self.logger = logging.getLogger(__name__)
         self.cache_base_dir = Path(cache_base_dir)
+        self.db = db
+        self.max_size_bytes = max_size_bytes
+        self._accessed: Set[str] = set() # Served since the last flush to the index
+        self._bytes_since_budget_check = 0
+        self._maintenance_lock = threading.Lock()
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._queues: Dict[asyncio.AbstractEventLoop, asyncio.Queue] = {}
+        self._workers: Dict[asyncio.AbstractEventLoop, List[asyncio.Task]] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {} # Cache filename -> pending download result
+        self._lock = threading.Lock()
         self._ensure_cache_dir_exists()
 
     def _ensure_cache_dir_exists(self) -> None:
@@ -42,52 +78,432 @@ class ImageCacheService:
         except Exception:
             return '.jpg' # Default on any parsing error
 
-    async def save_image_from_url(self, session: aiohttp.ClientSession, image_url: str, provider_name: str, item_id: str) -> Optional[str]:
+    def get_cache_filename(self, image_url: str, provider_name: str, item_id: str) -> str:
         """
-        Downloads an image from a URL and saves it to the local cache.
+        Builds the cache filename for an image, e.g. "plex_123.jpg".
 
         Args:
-            image_url (str): The URL of the image to download.
+            image_url (str): The URL of the image.
             provider_name (str): The name of the provider (e.g., 'plex', 'tmdb').
             item_id (str): The unique ID of the item associated with the image.
-            session (aiohttp.ClientSession): An active aiohttp client session.
 
         Returns:
-            Optional[str]: The local path to the cached image if successful, otherwise None.
-                           The path will be relative to the server root, e.g., "/cache/plex_123.jpg".
+            str: The filename, relative to the cache directory.
         """
-        if not image_url:
-            self.logger.warning("No image URL provided. Skipping cache.")
-            return None
+        extension = self._get_file_extension_from_url(image_url)
+        # Sanitize item_id to be safe for filenames (e.g., replace slashes if any)
+        safe_item_id = str(item_id).replace('/', '_').replace('\\', '_')
+        return f"{provider_name.lower()}_{safe_item_id}{extension}"
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Returns the pooled session bound to the running event loop, creating it if needed."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                # Forget sessions whose loop is gone (e.g., short-lived loops in scripts/tests)
+                for stale_loop in [l for l in self._sessions if l.is_closed()]:
+                    self._sessions.pop(stale_loop, None)
+                connector = aiohttp.TCPConnector(limit=self.MAX_CONNECTIONS, ttl_dns_cache=300)
+                session = aiohttp.ClientSession(connector=connector, timeout=self.TIMEOUT)
+                self._sessions[loop] = session
+            return session
+
+    def _get_queue(self) -> asyncio.Queue:
+        """Returns the download queue of the running event loop, starting its workers on first use."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            queue = self._queues.get(loop)
+            if queue is None:
+                for stale_loop in [l for l in self._queues if l.is_closed()]:
+                    self._queues.pop(stale_loop, None)
+                    self._workers.pop(stale_loop, None)
+                queue = asyncio.Queue(maxsize=self.MAX_QUEUED_DOWNLOADS)
+                self._queues[loop] = queue
+                self._workers[loop] = [
+                    loop.create_task(self._download_worker(queue), name=f"image-cache-worker-{i}")
+                    for i in range(self.MAX_CONCURRENT_DOWNLOADS)
+                ]
+            return queue
 
+    def _claim(self, filename: str) -> Tuple[asyncio.Future, bool]:
+        """
+        Returns the in-flight download future for a cache file, registering a new one if there is none.
+
+        Returns:
+            Tuple[asyncio.Future, bool]: The future resolving to True once the file is cached, and
+                                         whether the caller owns it and must perform the download.
+        """
+        loop = asyncio.get_running_loop()
+        future = self._in_flight.get(filename)
+        if future is not None and not future.done() and future.get_loop() is loop:
+            return future, False
+        future = loop.create_future()
+        self._in_flight[filename] = future
+        return future, True
+
+    def _release(self, filename: str, future: asyncio.Future, cached: bool) -> None:
+        """Resolves a claimed download future and forgets it."""
+        if not future.done():
+            future.set_result(cached)
+        if self._in_flight.get(filename) is future:
+            del self._in_flight[filename]
+
+    async def _download_worker(self, queue: asyncio.Queue) -> None:
+        """Downloads queued images one at a time until cancelled."""
+        while True:
+            image_url, filename, future = await queue.get()
+            try:
+                await self._download(image_url, filename, future)
+            finally:
+                queue.task_done()
+
+    async def _download(self, image_url: str, filename: str, future: asyncio.Future) -> bool:
+        """
+        Downloads a claimed image into the cache under the given filename and resolves its future.
+        The body is written to a temporary file that is renamed into place once complete.
+
+        Returns:
+            bool: True if the image is cached, False on error.
+        """
+        cached = False
+        try:
+            cached = await self._fetch(image_url, filename)
+        finally:
+            self._release(filename, future, cached) # Also wakes waiters if the download is cancelled
+        return cached
+
+    async def _fetch(self, image_url: str, filename: str) -> bool:
+        """Fetches an image into the cache. Use _download, which prevents duplicate fetches of the same file."""
+        local_image_path = self.cache_base_dir / filename
+        if local_image_path.exists():
+            self.logger.debug(f"Image already cached at {local_image_path}. Using existing file.")
+            return True
+
+        temp_path = self.cache_base_dir / f".{filename}.{uuid.uuid4().hex}.tmp"
         try:
-            extension = self._get_file_extension_from_url(image_url)
-            # Sanitize item_id to be safe for filenames (e.g., replace slashes if any)
-            safe_item_id = str(item_id).replace('/', '_').replace('\\', '_')
-            filename = f"{provider_name.lower()}_{safe_item_id}{extension}"
-            local_image_path = self.cache_base_dir / filename
-            #web_accessible_path = f"/{self.cache_base_dir.name}/{filename}"
-
-            if local_image_path.exists():
-                self.logger.info(f"Image already cached at {local_image_path}. Using existing file.")
-                return filename
-
-            async with session.get(image_url, timeout=10) as response:
+            async with self._get_session().get(image_url) as response:
                 response.raise_for_status()  # Will raise an ClientResponseError for bad responses (4XX or 5XX)
 
-                async with aiofiles.open(local_image_path, 'wb') as f:
+                async with aiofiles.open(temp_path, 'wb') as f:
                     async for chunk in response.content.iter_chunked(8192):
                         await f.write(chunk)
-                        
+
+            os.replace(temp_path, local_image_path) # Atomic, readers never see a partial file
             self.logger.info(f"Successfully cached image to {local_image_path}")
-            return filename
+            await asyncio.to_thread(self.create_variants, filename)
+            await asyncio.to_thread(self._index_image, filename, image_url)
+            return True
         except aiohttp.ClientError as e:
             self.logger.error(f"Failed to download image from {image_url}: {e}")
+        except asyncio.TimeoutError:
+            self.logger.error(f"Timed out downloading image from {image_url}")
         except IOError as e:
             self.logger.error(f"Failed to save image to {local_image_path}: {e}")
         except Exception as e:
             self.logger.error(f"An unexpected error occurred while caching image from {image_url}: {e}", exc_info=True)
-        return None
+        finally:
+            temp_path.unlink(missing_ok=True)
+        return False
+
+    async def save_image_from_url(self, image_url: str, provider_name: str, item_id: str) -> Optional[str]:
+        """
+        Downloads an image from a URL and saves it to the local cache, waiting for the download.
+        If the same image is already being downloaded, waits for that download instead.
+
+        Args:
+            image_url (str): The URL of the image to download.
+            provider_name (str): The name of the provider (e.g., 'plex', 'tmdb').
+            item_id (str): The unique ID of the item associated with the image.
+
+        Returns:
+            Optional[str]: The cache filename (e.g., "plex_123.jpg") if successful, otherwise None.
+        """
+        if not image_url:
+            self.logger.warning("No image URL provided. Skipping cache.")
+            return None
+
+        filename = self.get_cache_filename(image_url, provider_name, item_id)
+        future, owner = self._claim(filename)
+        cached = await self._download(image_url, filename, future) if owner else await asyncio.shield(future)
+        return filename if cached else None
+
+    def queue_image(self, image_url: str, provider_name: str, item_id: str) -> Optional[str]:
+        """
+        Queues an image for a background download and returns its cache filename right away.
+        Must be called from a running event loop.
+
+        Args:
+            image_url (str): The URL of the image to download.
+            provider_name (str): The name of the provider (e.g., 'plex', 'tmdb').
+            item_id (str): The unique ID of the item associated with the image.
+
+        Returns:
+            Optional[str]: The cache filename the image will be saved as, or None if there is
+                           no URL or the queue is full.
+        """
+        if not image_url:
+            self.logger.warning("No image URL provided. Skipping cache.")
+            return None
+
+        filename = self.get_cache_filename(image_url, provider_name, item_id)
+        if (self.cache_base_dir / filename).exists():
+            return filename
+
+        future, owner = self._claim(filename)
+        if not owner:
+            return filename # Already queued or downloading
+        try:
+            self._get_queue().put_nowait((image_url, filename, future))
+        except asyncio.QueueFull:
+            self._release(filename, future, False)
+            self.logger.warning(f"Image download queue is full. Not caching {image_url}.")
+            return None
+        return filename
+
+    def _source_url(self, filename: str) -> Optional[str]:
+        """Looks up where an image comes from in the cache index, then in the media posters. Blocking."""
+        if not self.db:
+            return None
+        entry = self.db.get_cached_image(filename)
+        if entry and entry.get("source_url"):
+            return entry["source_url"]
+        return self.db.get_poster_source_url(filename) # Queued downloads that failed were never indexed
+
+    async def restore_image(self, filename: str) -> bool:
+        """
+        Downloads a missing image again, e.g. after it was evicted or its queued download failed,
+        from the URL recorded in the cache index or on the media using it.
+
+        Args:
+            filename (str): The cache filename.
+
+        Returns:
+            bool: True if the image is cached, False if its source is unknown or the download failed.
+        """
+        source_url = await asyncio.to_thread(self._source_url, filename)
+        if not source_url:
+            return False
+        self.logger.info(f"Restoring missing image {filename} from {source_url}")
+        future, owner = self._claim(filename)
+        return await self._download(source_url, filename, future) if owner else await asyncio.shield(future)
+
+    async def wait_for_downloads(self) -> None:
+        """Waits until every image queued on the running event loop has been processed."""
+        queue = self._queues.get(asyncio.get_running_loop())
+        if queue is not None:
+            await queue.join()
+
+    async def close(self) -> None:
+        """Stops the download workers and closes the session bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            queue = self._queues.pop(loop, None)
+            workers = self._workers.pop(loop, [])
+            session = self._sessions.pop(loop, None)
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        while queue is not None and not queue.empty():
+            _, filename, future = queue.get_nowait()
+            self._release(filename, future, False) # Wake anyone waiting on a download that will not run
+        if session and not session.closed:
+            await session.close()
+
+    def _variant_path(self, filename: str, size: str) -> Path:
+        """Returns where the given variant of a cached image is stored."""
+        return self.cache_base_dir / f"{filename}.{size}.webp"
+
+    def create_variants(self, filename: str, sizes: Optional[List[str]] = None) -> bool:
+        """
+        Writes resized WebP variants of a cached image. Blocking, run it in a worker thread from async code.
+
+        Args:
+            filename (str): The cached image (e.g., "plex_123.jpg").
+            sizes (Optional[List[str]]): The variants to create. Defaults to every entry in VARIANTS.
+
+        Returns:
+            bool: True if every variant was written, False otherwise.
+        """
+        local_image_path = self.cache_base_dir / filename
+        try:
+            with Image.open(local_image_path) as source:
+                source.load()
+                has_alpha = "A" in source.getbands() or "transparency" in source.info
+                image = source.convert("RGBA" if has_alpha else "RGB")
+            for size in sizes or self.VARIANTS:
+                variant = image.copy()
+                variant.thumbnail((self.VARIANTS[size], variant.height)) # Keeps the aspect ratio, only shrinks
+                variant_path = self._variant_path(filename, size)
+                temp_path = self.cache_base_dir / f".{variant_path.name}.{uuid.uuid4().hex}.tmp"
+                try:
+                    variant.save(temp_path, format="WEBP", quality=self.WEBP_QUALITY, method=4)
+                    os.replace(temp_path, variant_path)
+                finally:
+                    temp_path.unlink(missing_ok=True)
+            return True
+        except (UnidentifiedImageError, OSError, ValueError) as e:
+            self.logger.warning(f"Could not create image variants for {local_image_path}: {e}")
+        except Exception as e:
+            self.logger.error(f"An unexpected error occurred while creating variants for {local_image_path}: {e}", exc_info=True)
+        return False
+
+    def get_image_path(self, filename: str, size: Optional[str] = None) -> Optional[Path]:
+        """
+        Resolves the file to serve for a cached image, creating a missing variant on the fly.
+        Blocking, run it in a worker thread from async code.
+
+        Args:
+            filename (str): The cached image (e.g., "plex_123.jpg").
+            size (Optional[str]): A key of VARIANTS, or None/"original" for the downloaded file.
+
+        Returns:
+            Optional[Path]: The variant, the original if the variant cannot be created, or None if the image is not cached.
+        """
+        if not filename or Path(filename).name != filename or filename.startswith('.'):
+            return None # Only plain names inside the cache directory
+        local_image_path = self.cache_base_dir / filename
+        if not local_image_path.is_file():
+            return None
+        if self.db and self.max_size_bytes > 0:
+            self._accessed.add(filename) # Only needed for LRU eviction
+        if not size or size == self.ORIGINAL:
+            return local_image_path
+
+        variant_path = self._variant_path(filename, size)
+        if variant_path.is_file():
+            return variant_path
+        if self.create_variants(filename, [size]):
+            if self.db:
+                self.db.update_cached_image_size(filename, self._disk_usage(filename))
+            return variant_path
+        return local_image_path
+
+    def _base_filename(self, name: str) -> str:
+        """Maps a variant file name back to the cached image it belongs to."""
+        for size in self.VARIANTS:
+            suffix = f".{size}.webp"
+            if name.endswith(suffix):
+                return name[:-len(suffix)]
+        return name
+
+    def _remove_image_files(self, filename: str) -> int:
+        """Deletes a cached image and its variants without logging each file. Returns the bytes freed."""
+        freed = 0
+        for path in [self.cache_base_dir / filename, *(self._variant_path(filename, size) for size in self.VARIANTS)]:
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.logger.warning(f"Failed to delete cached image file {path}: {e}")
+        return freed
+
+    def _disk_usage(self, filename: str) -> int:
+        """Returns the bytes used by a cached image and its variants."""
+        size_bytes = 0
+        for path in [self.cache_base_dir / filename, *(self._variant_path(filename, size) for size in self.VARIANTS)]:
+            try:
+                size_bytes += path.stat().st_size
+            except OSError:
+                pass
+        return size_bytes
+
+    def _index_image(self, filename: str, image_url: str) -> None:
+        """Records a downloaded image in the cache index and enforces the disk budget every BUDGET_CHECK_BYTES."""
+        if not self.db:
+            return
+        size_bytes = self._disk_usage(filename)
+        self.db.record_cached_image(filename, image_url, size_bytes)
+        self._bytes_since_budget_check += size_bytes
+        if self.max_size_bytes > 0 and self._bytes_since_budget_check >= self.BUDGET_CHECK_BYTES:
+            self._bytes_since_budget_check = 0
+            self.enforce_budget()
+
+    def enforce_budget(self) -> int:
+        """
+        Evicts the least recently served images until the cache fits the disk budget.
+        Evicted images keep their index entry and are downloaded again the next time they are requested.
+        Blocking, run it in a worker thread from async code.
+
+        Returns:
+            int: The number of images evicted.
+        """
+        if not self.db or self.max_size_bytes <= 0:
+            return 0
+        if not self._maintenance_lock.acquire(blocking=False):
+            return 0 # Another thread is already cleaning up
+        try:
+            accessed, self._accessed = self._accessed, set()
+            if accessed:
+                self.db.touch_cached_images(accessed)
+
+            total = self.db.get_cached_images_size()
+            evicted = 0
+            while total > self.max_size_bytes:
+                entries = self.db.get_least_recently_used_images(self.EVICTION_BATCH_SIZE)
+                batch = []
+                for entry in entries:
+                    if total <= self.max_size_bytes:
+                        break
+                    self._remove_image_files(entry["filename"])
+                    total -= entry["size_bytes"]
+                    batch.append(entry["filename"])
+                if not batch or not self.db.mark_cached_images_evicted(batch):
+                    break
+                evicted += len(batch)
+            if evicted:
+                self.logger.info(f"Evicted {evicted} cached image(s) to stay within {self.max_size_bytes} bytes.")
+            return evicted
+        finally:
+            self._maintenance_lock.release()
+
+    def collect_orphans(self) -> int:
+        """
+        Deletes cached images (and their variants) that no Media entry references, along with their index entries
+        and leftover temporary files. Files younger than ORPHAN_GRACE_SECONDS are kept.
+        Blocking, run it in a worker thread from async code.
+
+        Returns:
+            int: The number of images deleted.
+        """
+        if not self.db:
+            return 0
+        referenced = self.db.get_media_poster_filenames()
+        if referenced is None:
+            self.logger.warning("Could not read media posters. Skipping orphaned image collection.")
+            return 0
+        with self._maintenance_lock:
+            cutoff = time.time() - self.ORPHAN_GRACE_SECONDS
+            kept: Set[str] = set(referenced) | set(self._in_flight)
+            orphans: Set[str] = set()
+            try:
+                entries = list(os.scandir(self.cache_base_dir))
+            except OSError as e:
+                self.logger.error(f"Failed to list cache directory {self.cache_base_dir}: {e}")
+                return 0
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                if entry.name.startswith('.'):
+                    if entry.stat().st_mtime < cutoff: # Temporary file left behind by an interrupted download
+                        Path(entry.path).unlink(missing_ok=True)
+                    continue
+                filename = self._base_filename(entry.name)
+                if filename in kept or filename in orphans:
+                    continue
+                if entry.stat().st_mtime >= cutoff:
+                    kept.add(filename)
+                    continue
+                orphans.add(filename)
+
+            for filename in orphans:
+                self._remove_image_files(filename)
+            self.db.delete_cached_image_entries(keep=kept)
+            if orphans:
+                self.logger.info(f"Deleted {len(orphans)} orphaned cached image(s).")
+            return len(orphans)
 
     def delete_cached_image(self, filename: str) -> bool:
         """
@@ -104,6 +520,11 @@ class ImageCacheService:
             return True # Consider it success if no action needed
         
         local_image_path = self.cache_base_dir / filename
+        for size in self.VARIANTS:
+            try:
+                self._variant_path(filename, size).unlink(missing_ok=True)
+            except OSError as e:
+                self.logger.warning(f"Failed to delete {size} variant of cached image {local_image_path}: {e}")
         if local_image_path.exists():
             try:
                 local_image_path.unlink()
@@ -0,0 +1,157 @@
+import logging
+import threading
+from datetime import datetime
+from typing import List, Optional, Dict, Any
+
+from .database import Database # Import Database for type hinting
+from base.library_provider_base import LibraryProviderBase
+
+class LibrarySnapshotService:
+    """
+    Keeps a snapshot of each library provider's titles and per-user favorites in memory,
+    backed by the LibrarySnapshot table, so prompts can be rendered without scanning the libraries.
+    Snapshots are refreshed on a schedule, on demand, or lazily the first time a provider is read.
+    """
+
+    def __init__(self, db_service: Database):
+        """
+        Initializes the LibrarySnapshotService.
+
+        Args:
+            db_service (Database): Instance of the database service.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db = db_service
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {} # Per provider, serializes lazy snapshot builds
+
+    def _load(self) -> None:
+        """Loads the persisted snapshots into memory once."""
+        with self._lock:
+            if self._loaded:
+                return
+            snapshots: Dict[str, Dict[str, Any]] = {}
+            for row in self.db.get_library_snapshot():
+                snapshot = snapshots.setdefault(row["provider"], {"library": [], "favorites": [], "refreshed_at": row["refreshed_at"]})
+                entry = {"name": row["name"], "tmdb_id": row["tmdb_id"], "media_type": row["media_type"], "user_name": row["user_name"]}
+                snapshot["library" if row["category"] == "library" else "favorites"].append(entry)
+            self._snapshots = snapshots
+            self._loaded = True
+            self.logger.info(f"Loaded library snapshots for providers: {', '.join(snapshots.keys()) or 'none'}")
+
+    def has_snapshot(self, provider_name: str) -> bool:
+        """Returns True if a snapshot exists for the provider."""
+        self._load()
+        return provider_name in self._snapshots
+
+    def refresh(self, provider_name: str, provider: LibraryProviderBase) -> bool:
+        """
+        Fetches the provider's library and every user's favorites, then replaces the stored snapshot.
+        The previous snapshot is kept if the library cannot be fetched.
+
+        Args:
+            provider_name (str): The provider name (e.g., 'jellyfin', 'plex').
+            provider (LibraryProviderBase): The provider instance to fetch from.
+
+        Returns:
+            bool: True if the snapshot was refreshed, False otherwise.
+        """
+        self._load()
+        self.logger.info(f"Refreshing library snapshot for {provider_name}...")
+        items = provider.get_all_items_filtered()
+        if items is None:
+            self.logger.warning(f"Could not fetch library items from {provider_name}. Keeping the previous snapshot.")
+            return False
+
+        library = [{"name": item.name, "tmdb_id": item.id, "media_type": item.type, "user_name": None} for item in items if item.name]
+        favorites = []
+        for user in provider.get_users() or []:
+            for item in provider.get_favorites(user_id=user.id) or []:
+                if item.name:
+                    favorites.append({"name": item.name, "tmdb_id": item.id, "media_type": item.type, "user_name": user.name})
+
+        rows = [dict(entry, category="library") for entry in library] + [dict(entry, category="favorite") for entry in favorites]
+        if not self.db.replace_library_snapshot(provider_name, rows):
+            return False
+
+        with self._lock:
+            self._snapshots[provider_name] = {"library": library, "favorites": favorites, "refreshed_at": datetime.now()}
+        self.logger.info(f"Library snapshot for {provider_name} refreshed: {len(library)} titles, {len(favorites)} favorites.")
+        return True
+
+    def invalidate(self, provider_name: str) -> None:
+        """
+        Drops a provider's snapshot, e.g. after its server or API key changed.
+        The next read builds it again from the provider.
+
+        Args:
+            provider_name (str): The provider name (e.g., 'jellyfin', 'plex').
+        """
+        self._load()
+        with self._lock:
+            dropped = self._snapshots.pop(provider_name, None) is not None
+        if self.db.delete_library_snapshot(provider_name) and dropped:
+            self.logger.info(f"Library snapshot for {provider_name} invalidated.")
+
+    def _get_snapshot(self, provider_name: str, provider: Optional[LibraryProviderBase] = None) -> Optional[Dict[str, Any]]:
+        """Returns the snapshot for a provider, building it first if it does not exist yet and a provider is given."""
+        if not self.has_snapshot(provider_name) and provider:
+            with self._lock:
+                build_lock = self._build_locks.setdefault(provider_name, threading.Lock())
+            with build_lock:
+                if not self.has_snapshot(provider_name): # Another caller may have built it while this one waited
+                    self.refresh(provider_name, provider)
+        return self._snapshots.get(provider_name)
+
+    def get_library_names(self, provider_name: str, provider: Optional[LibraryProviderBase] = None) -> List[str]:
+        """
+        Gets the names of all titles in a provider's library.
+
+        Args:
+            provider_name (str): The provider name.
+            provider (Optional[LibraryProviderBase]): Used to build the snapshot if none exists yet.
+
+        Returns:
+            List[str]: Library titles.
+        """
+        snapshot = self._get_snapshot(provider_name, provider)
+        return [entry["name"] for entry in snapshot["library"]] if snapshot else []
+
+    def get_favorite_names(self, provider_name: str, user_name: Optional[str] = None, provider: Optional[LibraryProviderBase] = None) -> List[str]:
+        """
+        Gets the names of favorited titles for a provider.
+
+        Args:
+            provider_name (str): The provider name.
+            user_name (Optional[str]): Only return this user's favorites (case-insensitive). If None, returns all users' favorites.
+            provider (Optional[LibraryProviderBase]): Used to build the snapshot if none exists yet.
+
+        Returns:
+            List[str]: Favorite titles.
+        """
+        snapshot = self._get_snapshot(provider_name, provider)
+        if not snapshot:
+            return []
+        return [
+            entry["name"] for entry in snapshot["favorites"]
+            if not user_name or (entry["user_name"] or "").lower() == user_name.lower()
+        ]
+
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Gets a summary of the loaded snapshots.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per provider, the number of titles and favorites and when it was refreshed.
+        """
+        self._load()
+        return {
+            provider_name: {
+                "titles": len(snapshot["library"]),
+                "favorites": len(snapshot["favorites"]),
+                "refreshed_at": snapshot["refreshed_at"],
+            }
+            for provider_name, snapshot in self._snapshots.items()
+        }
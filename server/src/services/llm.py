@@ -1,6 +1,8 @@
+import hashlib
 import logging
-from typing import Optional, Dict, List, Any, Union
-from jinja2 import Template
+from typing import Optional, Dict, List, Any, Union, Type, Tuple, Set
+from jinja2 import Environment, Template, meta
+from pydantic import BaseModel
 
 from .settings import SettingsService
 from providers.gemini import GeminiProvider
@@ -10,6 +12,11 @@ from providers.jellyfin import JellyfinProvider
 from providers.plex import PlexProvider
 from providers.trakt import TraktProvider
 from .database import Database # Import Database for type hinting
+from .library_snapshot import LibrarySnapshotService
+from .cache import LRUCache
+
+_TEMPLATE_ENV = Environment()
+_TEMPLATE_CACHE = LRUCache(64) # Parsed prompt templates keyed by the hash of their source
 
 class LLMService:
     """
@@ -26,7 +33,8 @@ class LLMService:
                  ollama_provider: Optional[OllamaProvider] = None,
                  jellyfin_provider: Optional[JellyfinProvider] = None,
                  plex_provider: Optional[PlexProvider] = None,
-                 trakt_provider: Optional[TraktProvider] = None):
+                 trakt_provider: Optional[TraktProvider] = None,
+                 library_snapshot: Optional[LibrarySnapshotService] = None):
         self.logger = logger
         self.settings = settings_service
         self.db = db_service # Store the database service instance
@@ -38,15 +46,17 @@ class LLMService:
         self.jellyfin_provider = jellyfin_provider
         self.plex_provider = plex_provider
         self.trakt_provider = trakt_provider
+        self.library_snapshot = library_snapshot if library_snapshot else LibrarySnapshotService(db_service=db_service)
 
         if not self.enabled_llm_provider_names:
             self.logger.info("No LLM providers are enabled in the configuration.")
         else:
             self.logger.info(f"Enabled LLM providers: {self.enabled_llm_provider_names}")
 
-    async def generate_suggestions(self, prompt: str, system_prompt: Optional[str], reference: Optional[str] = None, **kwargs) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    async def generate_suggestions(self, prompt: str, system_prompt: Optional[str], reference: Optional[str] = None, response_model: Optional[Type[BaseModel]] = None, **kwargs) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
         """
         Generates media suggestions using the first available and configured LLM provider.
+        response_model overrides the structured response schema (defaults to SuggestionList).
         """
         if not self.enabled_llm_provider_names:
             self.logger.warning("No LLM provider is enabled or configured to generate suggestions.")
@@ -70,6 +80,7 @@ class LLMService:
                     system_prompt=system_prompt,
                     temperature=gemini_temp,
                     thinking_budget=gemini_tb,
+                    response_model=response_model,
                     **kwargs
                 )
             elif provider_name == OllamaProvider.PROVIDER_NAME and self.ollama_provider:
@@ -84,6 +95,7 @@ class LLMService:
                     model=ollama_model,
                     system_prompt=system_prompt,
                     temperature=ollama_temp,
+                    response_model=response_model,
                     **kwargs
                 )
             elif provider_name == OpenAIProvider.PROVIDER_NAME and self.openai_provider:
@@ -99,6 +111,7 @@ class LLMService:
                     model=openai_model,
                     system_prompt=system_prompt,
                     temperature=openai_temp,
+                    response_model=response_model,
                     **kwargs
                 )
 
@@ -177,9 +190,89 @@ class LLMService:
                 self.logger.error("All enabled LLM providers are misconfigured (e.g., missing model name). Cannot generate content.")
                 return {'success': False, 'content': None, 'token_counts': None, 'message': "Enabled LLM providers are misconfigured."}
 
+    @staticmethod
+    def _get_template(template_string: str) -> Tuple[Template, Set[str]]:
+        """
+        Parses a Jinja2 template, or returns the cached parse for the same template text.
+
+        Args:
+            template_string (str): The Jinja2 template string.
+
+        Returns:
+            Tuple[Template, Set[str]]: The compiled template and the names of the variables it references.
+        """
+        cache_key = hashlib.sha256(template_string.encode("utf-8")).hexdigest()
+        cached = _TEMPLATE_CACHE.get(cache_key)
+        if cached is None:
+            variables = meta.find_undeclared_variables(_TEMPLATE_ENV.parse(template_string))
+            cached = (_TEMPLATE_ENV.from_string(template_string), variables)
+            _TEMPLATE_CACHE.set(cache_key, cached)
+        return cached
+
+    def _get_library_providers(self) -> List[Tuple[str, Any]]:
+        """Returns (name, provider) pairs for the enabled library providers with media enabled."""
+        library_providers = []
+        if JellyfinProvider.PROVIDER_NAME in self.enabled_library_provider_names and self.settings.get("jellyfin", "enable_media"):
+            library_providers.append((JellyfinProvider.PROVIDER_NAME, self.jellyfin_provider))
+        if PlexProvider.PROVIDER_NAME in self.enabled_library_provider_names and self.settings.get("plex", "enable_media"):
+            library_providers.append((PlexProvider.PROVIDER_NAME, self.plex_provider))
+        # Trakt media exclusion is not typically done this way, so self.trakt_enable_media is not used here.
+        # TODO: Add support for listing out entire Trakt collection. Does that even make sense in this context?
+        return library_providers
+
+    def _get_exclusions_str(self) -> str:
+        """Returns library titles and ignored suggestions as a comma-separated string."""
+        # Library titles come from the library snapshot, which is refreshed
+        # on a schedule (or built on first use) instead of scanning the libraries for every prompt.
+        all_media_for_exclusion = []
+        for provider_name, provider in self._get_library_providers():
+            all_media_for_exclusion.extend(self.library_snapshot.get_library_names(provider_name, provider=provider))
+
+        self.logger.debug(f"{len(all_media_for_exclusion)} titles found")
+        # Get ignored suggestions to exclude as well
+        all_ignored = self.db.get_ignored_suggestions_titles()
+        self.logger.debug(f"{len(all_ignored)} titles to ignore")
+        # Combine lists and convert to a comma-separated string
+        all_ignored_str = ",".join(all_ignored + all_media_for_exclusion)
+        self.logger.info("Exclude: %s", all_ignored_str)
+        return all_ignored_str
+
+    def _get_favorites_str(self) -> str:
+        """Returns the favorites of each provider's default user (or all users if none is set) as a comma-separated string."""
+        all_favorites = []
+        for provider_name, provider in self._get_library_providers():
+            default_user_setting = self.settings.get(provider_name, "default_user")
+            self.logger.debug(f"{provider_name} default_user setting for favorites: {default_user_setting}")
+            provider_favorites = self.library_snapshot.get_favorite_names(provider_name, user_name=default_user_setting, provider=provider)
+            self.logger.debug(f"{provider_name} favorites: {provider_favorites}")
+            all_favorites.extend(provider_favorites)
+
+        self.logger.debug(f"All favorites count: {len(all_favorites)}")
+        favorites_str = ",".join(all_favorites)
+        if favorites_str:
+            self.logger.info(f"Favorite Media: {favorites_str}")
+        return favorites_str
+
+    def _get_watch_history_str(self) -> str:
+        """Returns the unique watched titles as a sorted, comma-separated string."""
+        # Get watch history from DB. The DB is populated by sync_watch_history,
+        # which respects the enable_history flags of providers.
+        # So, if a provider's history is disabled, it won't be in the DB to begin with.
+        # No direct check of enable_history is needed here for fetching from DB.
+        self.logger.debug(f"Fetching watch history from database for prompt...")
+        all_watch_history = self.db.get_watch_history_titles() # Distinct and sorted for consistency in the prompt
+
+        self.logger.debug(f"Total unique watch history titles for prompt: {len(all_watch_history)}")
+        watch_history_str = ",".join(all_watch_history)
+        if watch_history_str:
+            self.logger.info(f"Watch History: {watch_history_str}")
+        return watch_history_str
+
     def get_prompt(self, limit: int, media_name: Optional[str] = None, template_string: Optional[str] = None) -> str:
         """
         Renders a prompt string using Jinja2 templating.
+        Only the variables referenced by the template are resolved, so a template that does not
+        use {{all_media}}, {{favorites}} or {{watch_history}} never reads the library or watch history.
 
         Args:
             limit (int): The limit to be used in the template.
@@ -193,124 +286,29 @@ class LLMService:
             self.logger.debug(f"Prompt limit: {limit}")
             self.logger.debug(f"Prompt media_name: {media_name}")
             self.logger.debug(f"Prompt template_string: {template_string}")
-            # Get current movies and series from jellyfin to exclude from suggestions
-            all_media_for_exclusion = []
-            if JellyfinProvider.PROVIDER_NAME in self.enabled_library_provider_names and self.settings.get("jellyfin", "enable_media"):
-                self.logger.debug("Jellyfin media enabled, fetching for exclusion list.")
-                jellyfin_media = self.jellyfin_provider.get_all_items_filtered(attribute_filter="Name")
-                if jellyfin_media: all_media_for_exclusion.extend(jellyfin_media)
-            if PlexProvider.PROVIDER_NAME in self.enabled_library_provider_names and self.settings.get("plex", "enable_media"):
-                self.logger.debug("Plex media enabled, fetching for exclusion list.")
-                plex_media = self.plex_provider.get_all_items_filtered(attribute_filter="name") # ItemsFiltered uses 'name'
-                if plex_media: all_media_for_exclusion.extend(plex_media)
-                
-            # Trakt media exclusion is not typically done this way, so self.trakt_enable_media is not used here.
-            # TODO: Add support for listing out entire Trakt collection. Does that even make sense in this context?
-
-            self.logger.debug(f"{len(all_media_for_exclusion)} titles found")
-            # Get ignored suggestions to exclude as well
-            all_ignored = self.db.get_ignored_suggestions_titles()
-            self.logger.debug(f"{len(all_ignored)} titles to ignore")
-            # Combine lists and convert to a comma-separated string
-            all_ignored_str = ",".join(all_ignored + all_media_for_exclusion)
             self.logger.info("Finding similar media for: %s", media_name)
-            self.logger.info("Exclude: %s", all_ignored_str)
-
-            # Template variables
-            favorites_str = ""
-            all_favorites = []
-            watch_history_str = ""
-            all_watch_history = []
-
-            # Fetch Jellyfin
-            if JellyfinProvider.PROVIDER_NAME in self.enabled_library_provider_names and self.settings.get("jellyfin", "enable_media"):
-                self.logger.debug("Jellyfin media enabled, fetching favorites.")
-                jellyfin_default_user_setting = self.settings.get("jellyfin", "default_user")
-                self.logger.debug(f"Jellyfin default_user setting for favorites: {jellyfin_default_user_setting}")
-                if jellyfin_default_user_setting:
-                    user = self.jellyfin_provider.get_user_by_name(username=jellyfin_default_user_setting)
-                    if user:
-                        # Get favorites
-                        self.logger.debug(f"Fetching Jellyfin favorites for specific user: {user.name}")
-                        user_favorites_items = self.jellyfin_provider.get_favorites(user_id=user.id) 
-                        if user_favorites_items:
-                            user_favorites_names = [fav.name for fav in user_favorites_items if fav.name]
-                            all_favorites.extend(user_favorites_names)
-                            self.logger.debug(f"Jellyfin User {user.name} favorites: {user_favorites_names}")
-                    else:
-                        self.logger.warning(f"Jellyfin default user '{jellyfin_default_user_setting}' not found")
-                else: 
-                    self.logger.debug("Fetching Jellyfin favorites for all users.")
-                    all_jellyfin_users = self.jellyfin_provider.get_users()
-                    if all_jellyfin_users:
-                        for user_in_loop in all_jellyfin_users:
-                            user_favorites_items = self.jellyfin_provider.get_favorites(user_id=user_in_loop.id) 
-                            if user_favorites_items:
-                                user_favorites_names = [fav.name for fav in user_favorites_items if fav.name]
-                                self.logger.debug(f"Jellyfin User {user_in_loop.name} favorites: {user_favorites_names}")
-                                all_favorites.extend(user_favorites_names)
-
-            # Fetch Plex
-            if PlexProvider.PROVIDER_NAME in self.enabled_library_provider_names and self.settings.get("plex", "enable_media"):
-                self.logger.debug("Plex media enabled, fetching favorites.")
-                plex_default_user_setting = self.settings.get("plex", "default_user")
-                self.logger.debug(f"Plex default_user setting for favorites: {plex_default_user_setting}")
-                plex_user_context_id_for_api = None
-
-                if plex_default_user_setting:
-                    plex_user_obj = self.plex_provider.get_user_by_name(plex_default_user_setting)
-                    if plex_user_obj:
-                        self.logger.debug(f"Fetching Plex favorites for specific user: {plex_user_obj.name}")
-                        plex_user_context_id_for_api = plex_user_obj.id
-                        plex_user_context_name_for_log = plex_user_obj.name
-                        plex_favs_items = self.plex_provider.get_favorites(user_id=plex_user_context_id_for_api) 
-                        if plex_favs_items:
-                            plex_favs_names = [fav.name for fav in plex_favs_items if fav.name]
-                            all_favorites.extend(plex_favs_names)
-                            self.logger.debug(f"Plex User context '{plex_user_context_name_for_log}' favorites (names): {plex_favs_names}")
-                        else:
-                            self.logger.warning(f"Plex default user '{plex_default_user_setting}' not found")
-                else: 
-                    self.logger.debug("No default Plex user specified. Fetching favorites for all Plex users.")
-                    all_plex_users = self.plex_provider.get_users()
-                    if all_plex_users:
-                        for plex_user_in_loop in all_plex_users:
-                            user_favorites_items = self.plex_provider.get_favorites(user_id=plex_user_in_loop.id)
-                            if user_favorites_items:
-                                user_favorites_names = [fav.name for fav in user_favorites_items if fav.name]
-                                self.logger.debug(f"Plex User {plex_user_in_loop.name} favorites: {user_favorites_names}")
-                                all_favorites.extend(user_favorites_names)
-
-            self.logger.debug(f"All favorites count: {len(all_favorites)}")
-            if len(all_favorites) > 0:
-                favorites_str = ",".join(all_favorites)
-                self.logger.info(f"Favorite Media: {favorites_str}")
-
-            # Get watch history from DB. The DB is populated by sync_watch_history,
-            # which respects the enable_history flags of providers.
-            # So, if a provider's history is disabled, it won't be in the DB to begin with.
-            # No direct check of enable_history is needed here for fetching from DB.
-            self.logger.debug(f"Fetching watch history from database for prompt...")
-            db_watch_history = self.db.get_watch_history(limit=None) # Get all watch history from DB
-            if db_watch_history:
-                watch_history_names = [o["media"]["title"] for o in db_watch_history if o["media"]["title"]]
-                # Deduplicate and sort for consistency in the prompt
-                unique_watch_history_names = sorted(list(set(watch_history_names)))
-                all_watch_history.extend(unique_watch_history_names)
-
-            self.logger.debug(f"Total unique watch history titles for prompt: {len(all_watch_history)}")
-            if all_watch_history:
-                watch_history_str = ",".join(all_watch_history)
-                self.logger.info(f"Watch History: {watch_history_str}")
 
             if not template_string:
                 template_string = self.settings.get("app", "default_prompt")
 
-            template = Template(template_string)
-            rendered_prompt = template.render(
-                limit=limit, media_name=media_name, media_exclude=all_ignored_str, all_media=all_ignored_str, favorites=favorites_str, watch_history=watch_history_str
-            )
-            return rendered_prompt
+            template, referenced_variables = self._get_template(template_string)
+
+            # Template variables, resolved on demand
+            variable_resolvers = {
+                "limit": lambda: limit,
+                "media_name": lambda: media_name,
+                "favorites": self._get_favorites_str,
+                "watch_history": self._get_watch_history_str,
+            }
+            context: Dict[str, Any] = {
+                name: resolver() for name, resolver in variable_resolvers.items() if name in referenced_variables
+            }
+            if referenced_variables & {"all_media", "media_exclude"}: # media_exclude is an alias of all_media
+                all_ignored_str = self._get_exclusions_str()
+                context.update(all_media=all_ignored_str, media_exclude=all_ignored_str)
+            self.logger.debug(f"Prompt variables resolved: {sorted(context.keys())}")
+
+            return template.render(**context)
         except Exception as e:
             self.logger.error(f"Error rendering Jinja2 template: {e}", exc_info=True)
             # Depending on desired behavior, you might return an empty string or raise the exception
@@ -335,7 +333,7 @@ class LLMService:
             if not template_string:
                 template_string = self.settings.get("app", "default_research_prompt")
 
-            template = Template(template_string)
+            template, _ = self._get_template(template_string)
             rendered_prompt = template.render(
                 media_name=media_name,
             )
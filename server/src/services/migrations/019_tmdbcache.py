@@ -0,0 +1,13 @@
+import peewee as pw
+from peewee import *
+from playhouse.migrate import migrate as run_migrations, SchemaMigrator
+# Import necessary models and the database proxy
+from services.models import TMDBCache, database
+
+def upgrade(migrator: SchemaMigrator):
+    # Create the persistent TMDB response cache table
+    database.create_tables([TMDBCache], safe=True)
+
+def rollback(migrator: SchemaMigrator):
+    if TMDBCache.table_exists():
+        TMDBCache.drop_table(safe=True)
@@ -0,0 +1,13 @@
+import peewee as pw
+from peewee import *
+from playhouse.migrate import migrate as run_migrations, SchemaMigrator
+# Import necessary models and the database proxy
+from services.models import LibrarySnapshot, database
+
+def upgrade(migrator: SchemaMigrator):
+    # Create the library snapshot table used for prompt exclusion and favorites
+    database.create_tables([LibrarySnapshot], safe=True)
+
+def rollback(migrator: SchemaMigrator):
+    if LibrarySnapshot.table_exists():
+        LibrarySnapshot.drop_table(safe=True)
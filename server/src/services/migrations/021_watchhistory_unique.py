@@ -0,0 +1,32 @@
+import peewee as pw
+from peewee import *
+from playhouse.migrate import migrate as run_migrations, SchemaMigrator
+# Import necessary models and the database proxy
+from services.models import WatchHistory, database
+
+def upgrade(migrator: SchemaMigrator):
+    # === WatchHistory table changes ===
+    # Remove duplicate entries per media and user (case-insensitive), keeping the most recent play
+    seen = set()
+    duplicate_ids = []
+    query = (WatchHistory
+             .select(WatchHistory.id, WatchHistory.media, WatchHistory.watched_by)
+             .order_by(WatchHistory.last_played_date.desc(), WatchHistory.id.desc()))
+    for entry in query:
+        key = (entry.media_id, entry.watched_by.lower())
+        if key in seen:
+            duplicate_ids.append(entry.id)
+        else:
+            seen.add(key)
+    for i in range(0, len(duplicate_ids), 500):
+        WatchHistory.delete().where(WatchHistory.id.in_(duplicate_ids[i:i + 500])).execute()
+
+    run_migrations(
+        migrator.add_index('watchhistory', ('media_id', 'watched_by'), True),
+    )
+
+def rollback(migrator: SchemaMigrator):
+    # === WatchHistory table rollback ===
+    run_migrations(
+        migrator.drop_index('watchhistory', 'watchhistory_media_id_watched_by'),
+    )
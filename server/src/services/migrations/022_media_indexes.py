@@ -0,0 +1,68 @@
+import peewee as pw
+from peewee import *
+from playhouse.migrate import migrate as run_migrations, SchemaMigrator
+# Import necessary models and the database proxy
+from services.models import Media, MediaResearch, WatchHistory, MEDIA_HAS_TMDB_ID_SQL, media_has_tmdb_id, database
+
+def _merge_duplicate_media():
+    """
+    Merges Media rows sharing a TMDB ID and media type into one canonical row.
+    Rows from providers that store their own item ID in tmdb_id (Plex) are left alone.
+    """
+    # Empty TMDB IDs are not an identity
+    Media.update(tmdb_id=None).where(Media.tmdb_id == '').execute()
+
+    duplicate_keys = (Media
+                      .select(Media.tmdb_id, Media.media_type)
+                      .where(Media.tmdb_id.is_null(False) & media_has_tmdb_id())
+                      .group_by(Media.tmdb_id, Media.media_type)
+                      .having(fn.COUNT(Media.id) > 1)
+                      .tuples())
+    for tmdb_id, media_type in list(duplicate_keys):
+        # Prefer the library entry, then the most watched, then the oldest
+        rows = list(Media
+                    .select()
+                    .where((Media.tmdb_id == tmdb_id) & (Media.media_type == media_type) & media_has_tmdb_id())
+                    .order_by(Case(None, [(Media.entity_type == 'library', 0)], 1), Media.watch_count.desc(), Media.id))
+        canonical, duplicates = rows[0], rows[1:]
+        canonical_history = {h.watched_by.lower(): h for h in WatchHistory.select().where(WatchHistory.media == canonical.id)}
+
+        for duplicate in duplicates:
+            for history in WatchHistory.select().where(WatchHistory.media == duplicate.id):
+                existing = canonical_history.get(history.watched_by.lower())
+                if existing:
+                    # Keep a single entry per user with the most recent play
+                    if history.last_played_date > existing.last_played_date:
+                        existing.last_played_date = history.last_played_date
+                        existing.save()
+                    history.delete_instance()
+                else:
+                    history.media = canonical.id
+                    history.save()
+                    canonical_history[history.watched_by.lower()] = history
+            MediaResearch.update(media=canonical.id).where(MediaResearch.media == duplicate.id).execute()
+
+            canonical.watch_count = (canonical.watch_count or 0) + (duplicate.watch_count or 0)
+            canonical.watched = canonical.watched or duplicate.watched
+            canonical.favorite = canonical.favorite or duplicate.favorite
+            canonical.ignore = canonical.ignore or duplicate.ignore
+            duplicate.delete_instance()
+        canonical.save()
+
+def upgrade(migrator: SchemaMigrator):
+    # === Media table changes ===
+    _merge_duplicate_media()
+    database.execute_sql(f'CREATE UNIQUE INDEX IF NOT EXISTS media_tmdb_id_media_type ON media (tmdb_id, media_type) WHERE {MEDIA_HAS_TMDB_ID_SQL}')
+    database.execute_sql('CREATE INDEX IF NOT EXISTS media_lower_title_media_type ON media (LOWER(title), media_type)')
+
+    # === WatchHistory table changes ===
+    database.execute_sql('CREATE INDEX IF NOT EXISTS watchhistory_last_played_date ON watchhistory (last_played_date)')
+    database.execute_sql('CREATE INDEX IF NOT EXISTS watchhistory_processed_last_played_date ON watchhistory (processed, last_played_date)')
+    database.execute_sql('CREATE INDEX IF NOT EXISTS watchhistory_media_id_lower_watched_by ON watchhistory (media_id, LOWER(watched_by))')
+
+def rollback(migrator: SchemaMigrator):
+    # === Index rollback ===
+    # Merged duplicate media are not restored
+    for index_name in ('media_tmdb_id_media_type', 'media_lower_title_media_type', 'watchhistory_last_played_date',
+                       'watchhistory_processed_last_played_date', 'watchhistory_media_id_lower_watched_by'):
+        database.execute_sql(f'DROP INDEX IF EXISTS {index_name}')
@@ -0,0 +1,13 @@
+import peewee as pw
+from peewee import *
+from playhouse.migrate import migrate as run_migrations, SchemaMigrator
+# Import necessary models and the database proxy
+from services.models import SyncState, database
+
+def upgrade(migrator: SchemaMigrator):
+    # Create the per provider user sync state table holding the watch history watermark
+    database.create_tables([SyncState], safe=True)
+
+def rollback(migrator: SchemaMigrator):
+    if SyncState.table_exists():
+        SyncState.drop_table(safe=True)
@@ -0,0 +1,13 @@
+import peewee as pw
+from peewee import *
+from playhouse.migrate import migrate as run_migrations, SchemaMigrator
+# Import necessary models and the database proxy
+from services.models import ExternalIdCache, database
+
+def upgrade(migrator: SchemaMigrator):
+    # Create the persistent cache of library provider item IDs to TMDB, TVDB and IMDb IDs
+    database.create_tables([ExternalIdCache], safe=True)
+
+def rollback(migrator: SchemaMigrator):
+    if ExternalIdCache.table_exists():
+        ExternalIdCache.drop_table(safe=True)
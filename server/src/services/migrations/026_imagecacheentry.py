@@ -0,0 +1,13 @@
+import peewee as pw
+from peewee import *
+from playhouse.migrate import migrate as run_migrations, SchemaMigrator
+# Import necessary models and the database proxy
+from services.models import ImageCacheEntry, database
+
+def upgrade(migrator: SchemaMigrator):
+    # Create the index of cached images used for the disk budget and LRU eviction
+    database.create_tables([ImageCacheEntry], safe=True)
+
+def rollback(migrator: SchemaMigrator):
+    if ImageCacheEntry.table_exists():
+        ImageCacheEntry.drop_table(safe=True)
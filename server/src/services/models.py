@@ -87,6 +87,20 @@ class Media(PeeweeBaseModel):
     watched = BooleanField(default=False)
     watch_count = IntegerField(default=0)
 
+# Providers that store their own item ID in Media.tmdb_id instead of a TMDB ID (Plex stores the ratingKey)
+NON_TMDB_ID_PROVIDERS = ('plex',)
+# Same condition as media_has_tmdb_id(), as literal SQL because partial index predicates cannot use parameters
+MEDIA_HAS_TMDB_ID_SQL = "source_provider IS NULL OR source_provider NOT IN (%s)" % ", ".join(f"'{p}'" for p in NON_TMDB_ID_PROVIDERS)
+
+def media_has_tmdb_id():
+    """Query condition matching Media rows whose tmdb_id is a real TMDB ID."""
+    return Media.source_provider.is_null() | Media.source_provider.not_in(NON_TMDB_ID_PROVIDERS)
+
+# Canonical identity, one entry per TMDB ID and media type (NULL TMDB IDs and provider item IDs are not constrained)
+Media.add_index(Media.index(Media.tmdb_id, Media.media_type, unique=True, where=SQL(MEDIA_HAS_TMDB_ID_SQL), name='media_tmdb_id_media_type'))
+# Case-insensitive title lookups used by watch history sync
+Media.add_index(Media.index(fn.LOWER(Media.title), Media.media_type, name='media_lower_title_media_type'))
+
 class MediaResearch(PeeweeBaseModel):
     media = ForeignKeyField(Media, backref='media_ref', unique=False, null=True, on_delete='CASCADE') # One-to-many relationship
     title = CharField(null=False)
@@ -110,6 +124,92 @@ class WatchHistory(PeeweeBaseModel):
     created_at = DateTimeField(default=datetime.now)
     updated_at = DateTimeField(default=datetime.now)
 
+    class Meta:
+        indexes = (
+            # One entry per media and user, allows upserts on sync
+            (('media', 'watched_by'), True),
+            # Ordering and processed filtering in get_watch_history
+            (('last_played_date',), False),
+            (('processed', 'last_played_date'), False),
+        )
+
+# Case-insensitive per-user lookups used by add_watch_history
+WatchHistory.add_index(WatchHistory.index(WatchHistory.media, fn.LOWER(WatchHistory.watched_by), name='watchhistory_media_id_lower_watched_by'))
+
+class TMDBCache(PeeweeBaseModel):
+    endpoint = CharField(null=False) # e.g., 'search', 'detail'
+    media_type = CharField(null=False) # 'movie' or 'tv'
+    lookup_key = CharField(null=False) # Normalized search query or TMDB ID
+    language = CharField(null=False)
+    response = TextField(null=True) # JSON string of the cached response, 'null' for a cached miss
+    created_at = DateTimeField(default=datetime.now)
+    expires_at = DateTimeField(null=False)
+
+    class Meta:
+        table_name = 'tmdbcache'
+        indexes = (
+            # Unique together constraint on the request identity
+            (('endpoint', 'media_type', 'lookup_key', 'language'), True),
+        )
+
+class LibrarySnapshot(PeeweeBaseModel):
+    provider = CharField(null=False) # e.g., 'jellyfin', 'plex'
+    category = CharField(null=False) # 'library' or 'favorite'
+    user_name = CharField(null=True) # Set for favorites, the library user that favorited the item
+    name = CharField(null=False)
+    tmdb_id = CharField(null=True)
+    media_type = CharField(null=True) # 'movie' or 'tv'
+    refreshed_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        table_name = 'librarysnapshot'
+        indexes = (
+            (('provider', 'category'), False),
+        )
+
+class ExternalIdCache(PeeweeBaseModel):
+    provider = CharField(null=False) # e.g., 'jellyfin'
+    item_id = CharField(null=False) # The provider's item ID
+    tmdb_id = CharField(null=True)
+    tvdb_id = CharField(null=True)
+    imdb_id = CharField(null=True)
+    updated_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        table_name = 'externalidcache'
+        indexes = (
+            (('provider', 'item_id'), True),
+        )
+
+class ImageCacheEntry(PeeweeBaseModel):
+    filename = CharField(null=False, unique=True) # e.g., 'tmdb_603.jpg'
+    source_url = TextField(null=True) # Where the image was downloaded from, used to fetch it again after eviction
+    size_bytes = BigIntegerField(default=0) # Original plus variants, 0 once evicted
+    last_accessed_at = DateTimeField(default=datetime.now)
+    created_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        table_name = 'imagecacheentry'
+        indexes = (
+            (('last_accessed_at',), False),
+        )
+
+class SyncState(PeeweeBaseModel):
+    provider = CharField(null=False) # e.g., 'jellyfin', 'plex', 'trakt'
+    user_id = CharField(null=False) # The provider's user ID
+    user_name = CharField(null=True)
+    last_played_date = DateTimeField(null=True) # Newest play synced, in UTC. Only newer plays are fetched on the next sync
+    activity_marker = CharField(null=True) # Provider history activity marker at the last sync, an unchanged marker skips the sync
+    last_synced_at = DateTimeField(null=True)
+    created_at = DateTimeField(default=datetime.now)
+    updated_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        table_name = 'syncstate'
+        indexes = (
+            (('provider', 'user_id'), True),
+        )
+
 class Schedule(PeeweeBaseModel):
     search = ForeignKeyField(Search, backref='search_ref', null=True)
     job_id = TextField(unique=True)
@@ -133,7 +233,7 @@ class Migrations(PeeweeBaseModel):
     class Meta:
         table_name = 'migrations'
 
-MODELS = [Media, MediaResearch, WatchHistory, Search, LLMStat, Schedule, Migrations, Settings]
+MODELS = [Media, MediaResearch, WatchHistory, Search, LLMStat, Schedule, Migrations, Settings, TMDBCache, LibrarySnapshot, SyncState, ExternalIdCache, ImageCacheEntry]
 
 # Application Models
 
@@ -169,6 +269,13 @@ class Suggestion(BaseModel):
 class SuggestionList(BaseModel):
     suggestions: List[Suggestion]
 
+class SeededSuggestion(Suggestion):
+    source_title: str = Field(description="The exact title from the requested list that this media is similar to.")
+
+class SeededSuggestionList(BaseModel):
+    """Response schema for multi-seed prompts, where each suggestion is attributed to one of the seed titles."""
+    suggestions: List[SeededSuggestion]
+
 # FastAPI/Pydantic Models 
 class WatchHistoryCreateRequest(BaseModel):
     title: str
@@ -181,6 +288,7 @@ class WatchHistoryCreateRequest(BaseModel):
 
 # Constants
 DEFAULT_PROMPT_TEMPLATE = "Recommend {{limit}} tv series or movies similar to {{media_name}}. \n\nExclude the following media from your recommendations: {{all_media}}"
+DEFAULT_PROMPT_MULTI_SEED_TEMPLATE = "For each of the following titles, recommend {{limit}} tv series or movies similar to it: {{media_name}}. \n\nSet source_title on every recommendation to the exact title from that list it is similar to. \n\nExclude the following media from your recommendations: {{all_media}}"
 DEFAULT_PROMPT_RESEARCH_TEMPLATE = """Please provide an in-depth analysis of {{media_name}}. Use the following markdown template as a basis for your research. Respond in markdown only without any backticks or 'markdown' tags.
 
 # Movie/TV Series Analysis
@@ -65,6 +65,12 @@ class DiscovarrScheduler(Schedule):
         elif func_name == 'process_watch_history':
             # _create_process_function returns an async function directly.
             return self._create_process_function()
+        elif func_name == 'refresh_library_snapshot':
+            # Async function, expects no runtime args/kwargs.
+            return self.discovarr.refresh_library_snapshot
+        elif func_name == 'clean_image_cache':
+            # Async function, expects no runtime args/kwargs.
+            return self.discovarr.clean_image_cache
         elif func_name == 'get_active_media':
             # Synchronous, expects no runtime args/kwargs.
             return self.discovarr.get_active_media
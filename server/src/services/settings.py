@@ -1,9 +1,10 @@
 import logging
 import json
+import threading
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Union, TYPE_CHECKING
 from urllib.parse import urlparse
-from .models import Settings, SettingType, DEFAULT_PROMPT_TEMPLATE, DEFAULT_PROMPT_RESEARCH_TEMPLATE
+from .models import database, Settings, SettingType, DEFAULT_PROMPT_TEMPLATE, DEFAULT_PROMPT_RESEARCH_TEMPLATE
 
 if TYPE_CHECKING:
     from ..discovarr import Discovarr # For type hinting Discovarr instance
@@ -25,10 +26,15 @@ class SettingsService:
             "suggestion_limit": {"value": 20, "type": SettingType.INTEGER, "description": "Maximum number of suggestions to return"},
             "request_only": {"value": False, "type": SettingType.BOOLEAN, "description": "Sets the search_for_missing to False when requesting media from Radarr and Sonarr. This won't start a search just add the media."},
             "auto_media_save": {"value": True, "type": SettingType.BOOLEAN, "description": "Automatically save the results from a Search to the Discovarr Media table"},
+            "enrichment_concurrency": {"value": 5, "type": SettingType.INTEGER, "description": "Maximum number of suggestions enriched with TMDB details, posters and database saves at the same time"},
+            "watch_history_batch_size": {"value": 5, "type": SettingType.INTEGER, "description": "Number of recently watched titles sent to the LLM in a single prompt when processing watch history. Set to 1 for one prompt per title. Batches use a built-in prompt, so titles are sent one at a time while default_prompt is customized."},
+            "image_cache_max_size_mb": {"value": 2048, "type": SettingType.INTEGER, "description": "Maximum disk space in MB for cached posters and their resized variants. The least recently viewed images are removed when it is exceeded and downloaded again when needed. Set to 0 for no limit."},
             "system_prompt": {"value": "You are a movie recommendation assistant. Your job is to suggest movies to users based on their preferences and current context.", "type": SettingType.STRING, "description": "Default system prompt to guide the model's behavior."},
         },
         "tmdb": {
             "api_key": {"value": None, "type": SettingType.STRING, "description": "TMDB API Read Access Token", "required": True},
+            "search_cache_ttl": {"value": 168, "type": SettingType.INTEGER, "description": "Hours to cache TMDB search results. Set to 0 to disable."},
+            "detail_cache_ttl": {"value": 24, "type": SettingType.INTEGER, "description": "Hours to cache TMDB media details. Set to 0 to disable."},
         },
     }
     # DEFAULT_SETTINGS will be populated by _build_default_settings_if_needed
@@ -39,6 +45,9 @@ class SettingsService:
         """Initialize the settings service."""
         self.logger = logging.getLogger(__name__)
         self.discovarr_app = discovarr_app
+        # Raw (string) setting values keyed by (group, name), loaded once and kept up to date on writes
+        self._cache: Optional[Dict[tuple, Optional[str]]] = None
+        self._cache_lock = threading.Lock()
         SettingsService._build_default_settings_if_needed()
         # self._initialize_settings() # Moved to be called by Discovarr after DB init
 
@@ -143,6 +152,9 @@ class SettingsService:
         """
         import os
 
+        # Load all existing settings in a single query
+        existing_settings = {(s.group, s.name): s for s in Settings.select()}
+
         for group, settings in SettingsService.DEFAULT_SETTINGS.items():
             for name, config in settings.items():
                 # Check environment variable (e.g., JELLYFIN_URL for jellyfin.url)
@@ -152,17 +164,16 @@ class SettingsService:
                 # Determine the value to use for creation
                 value_for_creation = env_value if env_value is not None else config["value"]
 
-                setting, created = Settings.get_or_create(
-                    group=group,
-                    name=name,
-                    defaults={
-                        'value': value_for_creation,
-                        'type': config["type"].value,
-                        'description': config["description"],
-                    }
-                )
-
-                if created:
+                setting = existing_settings.get((group, name))
+                if setting is None:
+                    setting = Settings.create(
+                        group=group,
+                        name=name,
+                        value=value_for_creation,
+                        type=config["type"].value,
+                        description=config["description"],
+                    )
+                    existing_settings[(group, name)] = setting
                     self.logger.info(f"Created setting {group}.{name} with value from {'environment variable ' + env_var if env_value is not None else 'defaults'}")
                 elif env_value is not None and setting.value != env_value:
                     # Setting existed, but env var has a different value. Overwrite.
@@ -171,6 +182,35 @@ class SettingsService:
                     setting.updated_at = datetime.now()
                     setting.save()
 
+        # Cache values as stored in the database (text), newly created rows still hold the Python default
+        with self._cache_lock:
+            self._cache = {
+                key: str(setting.value) if setting.value is not None else None
+                for key, setting in existing_settings.items()
+            }
+
+    def _get_cached_settings(self) -> Dict[tuple, Optional[str]]:
+        """Returns the cached raw setting values, loading them with a single query on first use."""
+        with self._cache_lock:
+            if self._cache is None:
+                self._cache = {
+                    (s.group, s.name): s.value
+                    for s in Settings.select(Settings.group, Settings.name, Settings.value)
+                }
+                self.logger.debug(f"Loaded {len(self._cache)} settings into the cache.")
+            return self._cache
+
+    def _set_cached_value(self, group: str, name: str, value: Optional[str]) -> None:
+        """Writes a raw setting value through to the cache, if it is loaded."""
+        with self._cache_lock:
+            if self._cache is not None:
+                self._cache[(group, name)] = value
+
+    def invalidate_cache(self) -> None:
+        """Drops the cached settings so the next read reloads them from the database."""
+        with self._cache_lock:
+            self._cache = None
+
     def get(self, group: str, name: str) -> Optional[Any]:
         """Get a setting value with proper type conversion."""
         try:
@@ -182,12 +222,13 @@ class SettingsService:
             setting_config = SettingsService.DEFAULT_SETTINGS[group][name]
             setting_type = setting_config["type"]
 
-            # Try to get value from database
-            try:
-                setting = Settings.get(Settings.group == group, Settings.name == name)
-                if setting.value is not None:
-                    return self._convert_value(setting.value, setting_type)
-            except Settings.DoesNotExist:
+            # Try to get value from the settings cache (backed by the database)
+            cached_settings = self._get_cached_settings()
+            if (group, name) in cached_settings:
+                cached_value = cached_settings[(group, name)]
+                if cached_value is not None:
+                    return self._convert_value(cached_value, setting_type)
+            else:
                 self.logger.warning(f"Setting {group}.{name} not found in database")
 
             # Fall back to default from DEFAULT_SETTINGS
@@ -213,14 +254,17 @@ class SettingsService:
             setting.value = str(value) if value is not None else None
             setting.updated_at = datetime.now()
             setting.save()
+            self._set_cached_value(group, name, setting.value)
             
             self.logger.info(f"Updated setting {group}.{name} to {value}")
             
-            # Attempt to reload configuration with the new setting
-            if self.discovarr_app: # discovarr_app is an instance of Discovarr
+            # Attempt to reload configuration with the new setting, settings marked reload=False
+            # (e.g., tokens saved by a provider itself) do not affect the running services.
+            reload_needed = SettingsService.DEFAULT_SETTINGS.get(group, {}).get(name, {}).get("reload", True)
+            if self.discovarr_app and reload_needed: # discovarr_app is an instance of Discovarr
                 try:
                     self.logger.info(f"Attempting to reload Discovarr configuration after updating {group}.{name}.")
-                    self.discovarr_app.reload_configuration()
+                    self.discovarr_app.reload_configuration(changed_groups=[group])
                     self.logger.info(f"Discovarr configuration reloaded successfully after updating {group}.{name}.")
                 except ValueError as e: # Catch validation errors from Discovarr._validate_configuration
                     self.logger.error(f"Configuration reload failed after updating {group}.{name} to '{value}': {e}. Reverting setting.")
@@ -228,6 +272,7 @@ class SettingsService:
                     setting.value = old_db_value_str
                     setting.updated_at = datetime.now() # Update timestamp for the revert action
                     setting.save()
+                    self._set_cached_value(group, name, old_db_value_str)
                     self.logger.info(f"Reverted setting {group}.{name} to its previous value: '{old_db_value_str}'.")
                     return False # Indicate failure to the caller
             return True
@@ -238,14 +283,76 @@ class SettingsService:
             self.logger.error(f"Error updating setting {group}.{name}: {e}", exc_info=True)
             return False
 
+    def set_many(self, updates: Dict[str, Dict[str, Any]]) -> bool:
+        """
+        Set many setting values in a single transaction with type validation.
+        All values are validated before anything is written, and the configuration is reloaded
+        once for all changed groups. If the reload fails, every setting is reverted.
+
+        Args:
+            updates (Dict[str, Dict[str, Any]]): New values keyed by group, then by setting name.
+
+        Returns:
+            bool: True if all settings were updated, False otherwise (nothing is changed).
+        """
+        try:
+            keys = [(group, name) for group, group_updates in updates.items() for name in group_updates]
+            if not keys:
+                return True
+            existing_settings = {
+                (s.group, s.name): s
+                for s in Settings.select().where(Settings.group.in_(list(updates.keys())))
+            }
+
+            # Validate everything up front so a bad value does not leave a partial update
+            for group, name in keys:
+                setting = existing_settings.get((group, name))
+                if not setting:
+                    self.logger.error(f"Setting {group}.{name} not found")
+                    return False
+                if not self._validate_value(updates[group][name], SettingType(setting.type)):
+                    self.logger.error(f"Invalid value type for setting {group}.{name}")
+                    return False
+
+            old_values = {key: existing_settings[key].value for key in keys}
+            now = datetime.now()
+            with database.atomic():
+                for group, name in keys:
+                    value = updates[group][name]
+                    setting = existing_settings[(group, name)]
+                    setting.value = str(value) if value is not None else None
+                    setting.updated_at = now
+                    setting.save()
+            for group, name in keys:
+                self._set_cached_value(group, name, existing_settings[(group, name)].value)
+            self.logger.info(f"Updated settings: {', '.join(f'{group}.{name}' for group, name in keys)}")
+
+            # Reload once for every group with a setting that affects the running services
+            changed_groups = {group for group, name in keys if SettingsService.DEFAULT_SETTINGS.get(group, {}).get(name, {}).get("reload", True)}
+            if self.discovarr_app and changed_groups:
+                try:
+                    self.discovarr_app.reload_configuration(changed_groups=changed_groups)
+                except ValueError as e: # Catch validation errors from Discovarr._validate_configuration
+                    self.logger.error(f"Configuration reload failed after updating settings: {e}. Reverting settings.")
+                    with database.atomic():
+                        for key, old_value in old_values.items():
+                            Settings.update(value=old_value, updated_at=datetime.now()).where(
+                                (Settings.group == key[0]) & (Settings.name == key[1])
+                            ).execute()
+                    for (group, name), old_value in old_values.items():
+                        self._set_cached_value(group, name, old_value)
+                    return False # Indicate failure to the caller
+            return True
+        except Exception as e:
+            self.logger.error(f"Error updating settings: {e}", exc_info=True)
+            return False
+
     def get_all(self) -> Dict[str, Dict[str, Any]]:
         """Get all settings grouped by their groups with proper type conversion."""
         result = {}
         
-        # First get all settings from database for efficiency
-        settings = {
-            (s.group, s.name): s for s in Settings.select()
-        }
+        # All settings come from the settings cache, loaded from the database in one query
+        settings = self._get_cached_settings()
         
         # Build result using DEFAULT_SETTINGS as template
         # Iterate over sorted group names for alphabetical order
@@ -264,9 +371,9 @@ class SettingsService:
                 show = config.get("show", True)
                 required = config.get("required", False) # Get the required flag
                 
-                setting = settings.get((group, name))
-                if setting and setting.value is not None:
-                    actual_value = self._convert_value(setting.value, setting_type)
+                setting_value = settings.get((group, name))
+                if setting_value is not None:
+                    actual_value = self._convert_value(setting_value, setting_type)
                 
                 result[group][name] = {
                     "value": actual_value,
@@ -1,20 +1,143 @@
-import requests
 import logging
 import json
 import sys
-from typing import Optional
+import time
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Any, Dict, Tuple, Coroutine, TYPE_CHECKING
+import aiohttp
+from services.cache import LRUCache
+
+if TYPE_CHECKING:
+    from services.database import Database
+
+# In-process cache shared by every TMDB instance so it survives configuration reloads.
+_MEMORY_CACHE = LRUCache(maxsize=2048)
+
+class TokenBucket:
+    """
+    A token bucket rate limiter usable from any thread or event loop.
+    Each acquire() reserves a token and sleeps until the reservation is due.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (int): Maximum burst size.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes a token and returns how many seconds the caller has to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class TMDBTransport:
+    """
+    Shared HTTP transport for TMDB: one keep-alive aiohttp session per event loop,
+    a process-wide rate limiter, and a background loop that backs the sync API.
+    """
+
+    # TMDB allows roughly 50 requests per second and 20 connections per IP.
+    RATE_LIMIT_PER_SECOND = 50
+    MAX_CONNECTIONS = 20
+    TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5)
+    MAX_RETRIES = 2
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.limiter = TokenBucket(rate=self.RATE_LIMIT_PER_SECOND, capacity=self.RATE_LIMIT_PER_SECOND)
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._lock = threading.Lock()
+        self._sync_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Returns the pooled session bound to the running event loop, creating it if needed."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                # Forget sessions whose loop is gone (e.g., short-lived loops in scripts/tests)
+                for stale_loop in [l for l in self._sessions if l.is_closed()]:
+                    self._sessions.pop(stale_loop, None)
+                connector = aiohttp.TCPConnector(limit=self.MAX_CONNECTIONS, ttl_dns_cache=300)
+                session = aiohttp.ClientSession(connector=connector, timeout=self.TIMEOUT)
+                self._sessions[loop] = session
+            return session
+
+    async def get_json(self, url: str, params: Dict[str, Any], headers: Dict[str, str]) -> Any:
+        """
+        Performs a rate-limited GET and returns the decoded JSON body.
+        429 responses are retried after the advertised Retry-After delay.
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError
+        """
+        session = self._get_session()
+        for attempt in range(self.MAX_RETRIES + 1):
+            await self.limiter.acquire()
+            async with session.get(url, params=params, headers=headers) as response:
+                if response.status == 429 and attempt < self.MAX_RETRIES:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                    self.logger.warning(f"TMDB rate limit hit, retrying in {retry_after}s.")
+                    await asyncio.sleep(retry_after)
+                    continue
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    def run_sync(self, coro: Coroutine) -> Any:
+        """Runs a coroutine on the transport's background loop and waits for the result."""
+        with self._lock:
+            if self._sync_loop is None:
+                self._sync_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._sync_loop.run_forever, name="tmdb-sync-loop", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._sync_loop).result()
+
+    async def close(self) -> None:
+        """Closes the session bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.pop(loop, None)
+        if session and not session.closed:
+            await session.close()
+
+# Shared by every TMDB instance so the connection pool and rate limit are process-wide.
+transport = TMDBTransport()
 
 class TMDB:
     """
     A class to interact with the TMDB API for retrieving media information, such as poster art.
+    Responses are cached in memory and, when a database is provided, in the TMDBCache table.
+    The *_async methods are the primary API; the sync methods are thin wrappers around them.
     """
 
-    def __init__(self, tmdb_api_key: str):
+    BASE_URL = "https://api.themoviedb.org/3"
+    LANGUAGE = "en-US"
+
+    def __init__(self, tmdb_api_key: str, db: Optional['Database'] = None, search_cache_ttl: Optional[int] = 168, detail_cache_ttl: Optional[int] = 24):
         """
         Initializes the Tmdb class with the API key.
 
         Args:
             tmdb_api_key (str): The API key for TMDB.
+            db (Optional[Database]): Database used for the persistent response cache.
+            search_cache_ttl (Optional[int]): Hours to cache search results. 0 or None disables caching.
+            detail_cache_ttl (Optional[int]): Hours to cache media details. 0 or None disables caching.
         """
         # Setup Logging
         self.logger = logging.getLogger(__name__)
@@ -23,26 +146,90 @@ class TMDB:
         if not self.tmdb_api_key:
             self.logger.error("TMDB API key is not configured.")
 
-    def get_media_detail(self, tmdb_id: str, media_type: str) -> Optional[str]:
+        self.db = db
+        self.cache_ttls = {
+            "search": search_cache_ttl or 0,
+            "detail": detail_cache_ttl or 0,
+        }
+
+    async def _cache_get(self, endpoint: str, media_type: str, lookup_key: str) -> Tuple[bool, Any]:
+        """
+        Looks up a cached response, checking memory first and then the database.
+        Database reads run in a worker thread so the event loop is not blocked.
+
+        Returns:
+            Tuple[bool, Any]: (hit, value). value is None for a cached miss.
+        """
+        if not self.cache_ttls.get(endpoint):
+            return False, None
+
+        key = (endpoint, media_type, lookup_key, self.LANGUAGE)
+        sentinel = object()
+        value = _MEMORY_CACHE.get(key, sentinel)
+        if value is not sentinel:
+            self.logger.debug(f"TMDB memory cache hit for {endpoint}/{media_type}/{lookup_key}")
+            return True, value
+
+        if self.db:
+            entry = await asyncio.to_thread(self.db.get_tmdb_cache, endpoint, media_type, lookup_key, self.LANGUAGE)
+            if entry:
+                remaining = (entry["expires_at"] - datetime.now()).total_seconds()
+                _MEMORY_CACHE.set(key, entry["response"], ttl=remaining)
+                self.logger.debug(f"TMDB database cache hit for {endpoint}/{media_type}/{lookup_key}")
+                return True, entry["response"]
+        return False, None
+
+    async def _cache_set(self, endpoint: str, media_type: str, lookup_key: str, value: Any) -> None:
+        """Stores a response in memory and, if available, in the database (from a worker thread)."""
+        ttl_hours = self.cache_ttls.get(endpoint)
+        if not ttl_hours:
+            return
+
+        key = (endpoint, media_type, lookup_key, self.LANGUAGE)
+        _MEMORY_CACHE.set(key, value, ttl=ttl_hours * 3600)
+        if self.db:
+            await asyncio.to_thread(self.db.set_tmdb_cache, endpoint, media_type, lookup_key, self.LANGUAGE, value, datetime.now() + timedelta(hours=ttl_hours))
+
+    def get_media_detail(self, tmdb_id: str, media_type: str) -> Optional[dict]:
+        """Sync wrapper around get_media_detail_async."""
+        return transport.run_sync(self.get_media_detail_async(tmdb_id, media_type))
+
+    def lookup_media(self, query: str, media_type: str) -> Optional[dict]:
+        """Sync wrapper around lookup_media_async."""
+        return transport.run_sync(self.lookup_media_async(query, media_type))
+
+    async def get_media_detail_async(self, tmdb_id: str, media_type: str) -> Optional[dict]:
+        """
+        Gets the full details for a movie or TV show.
+
+        Args:
+            tmdb_id (str): The TMDB ID of the media.
+            media_type (str): 'tv' or 'movie'.
+
+        Returns:
+            Optional[dict]: The TMDB detail payload, or None on error.
+        """
         if not self.tmdb_api_key:
             self.logger.error("TMDB API key is not configured.")
             return None
 
-        base_url = "https://api.themoviedb.org/3"
-        endpoint = f"{base_url}/{media_type}/{tmdb_id}"
+        hit, cached = await self._cache_get("detail", media_type, str(tmdb_id))
+        if hit:
+            return cached
+
+        endpoint = f"{self.BASE_URL}/{media_type}/{tmdb_id}"
         params = {
-            "language": "en-US",
+            "language": self.LANGUAGE,
         }
         headers = {
             "Authorization": f"Bearer {self.tmdb_api_key}",
         }
 
         try:
-            response = requests.get(endpoint, params=params, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+            data = await transport.get_json(endpoint, params=params, headers=headers)
+            await self._cache_set("detail", media_type, str(tmdb_id), data)
             return data
-        except requests.exceptions.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             self.logger.error(f"Failed to fetch {tmdb_id} from TMDB: {e}")
             return None
         except json.JSONDecodeError:
@@ -52,7 +239,7 @@ class TMDB:
             self.logger.exception(f"An unexpected error occurred while fetching {tmdb_id}: {e}")
             return None
 
-    def lookup_media(self, query: str, media_type: str) -> Optional[dict]:
+    async def lookup_media_async(self, query: str, media_type: str) -> Optional[dict]:
         """
         Searches for media (TV show or movie) using the TMDB search API.
 
@@ -77,14 +264,18 @@ class TMDB:
             self.logger.error(f"Invalid media type: {media_type}. Must be 'tv' or 'movie'")
             return None
 
-        base_url = "https://api.themoviedb.org/3"
-        endpoint = f"{base_url}/search/{media_type}"
+        lookup_key = query.strip().lower()
+        hit, cached = await self._cache_get("search", media_type, lookup_key)
+        if hit:
+            return cached
+
+        endpoint = f"{self.BASE_URL}/search/{media_type}"
         
         params = {
             "query": query,
-            "language": "en-US",
+            "language": self.LANGUAGE,
             "page": 1,
-            "include_adult": False
+            "include_adult": "false"
         }
         
         headers = {
@@ -92,19 +283,19 @@ class TMDB:
         }
 
         try:
-            response = requests.get(endpoint, params=params, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+            data = await transport.get_json(endpoint, params=params, headers=headers)
 
             results = data.get('results', [])
             if not results:
                 self.logger.warning(f"No {media_type} found for query: {query}")
+                await self._cache_set("search", media_type, lookup_key, None) # Cache the miss as well
                 return None
 
             # Return the first result
+            await self._cache_set("search", media_type, lookup_key, results[0])
             return results[0]
 
-        except requests.exceptions.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             self.logger.error(f"Failed to search {media_type} on TMDB: {e}")
             return None
         except json.JSONDecodeError:
@@ -112,4 +303,4 @@ class TMDB:
             return None
         except Exception as e:
             self.logger.exception(f"An unexpected error occurred while searching {media_type}: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -71,4 +71,99 @@ def test_env_variable_overwrites_existing_db_value(tmp_path, monkeypatch):
     assert updated_setting.value == expected_url, "The setting value should have been overwritten by the environment variable."
 
     # Clean up the second instance.
-    discovarr_instance_2.db.cleanup()
\ No newline at end of file
+    discovarr_instance_2.db.cleanup()
+
+def test_settings_served_from_cache_with_write_through(tmp_path):
+    """
+    Tests that settings are read from the in-memory cache after initialization
+    and that set() writes through to both the database and the cache.
+    """
+    test_db_path = tmp_path / "test_settings_cache.db"
+
+    with patch('discovarr.Discovarr._validate_configuration', return_value=None):
+        discovarr_instance = Discovarr(db_path=str(test_db_path))
+    settings_service = discovarr_instance.settings
+
+    with patch.object(Settings, 'select', side_effect=AssertionError("settings should be cached")):
+        assert settings_service.get("app", "recent_limit") == 10
+        assert settings_service.get("app", "request_only") is False
+
+    with patch('discovarr.Discovarr.reload_configuration', return_value=None):
+        assert settings_service.set("app", "recent_limit", 25) is True
+
+    with patch.object(Settings, 'select', side_effect=AssertionError("settings should be cached")):
+        assert settings_service.get("app", "recent_limit") == 25
+        assert settings_service.get_all()["app"]["recent_limit"]["value"] == 25
+
+    assert Settings.get((Settings.group == "app") & (Settings.name == "recent_limit")).value == "25"
+
+    # Changes made directly in the database are picked up after invalidation
+    Settings.update(value="7").where((Settings.group == "app") & (Settings.name == "recent_limit")).execute()
+    assert settings_service.get("app", "recent_limit") == 25
+    settings_service.invalidate_cache()
+    assert settings_service.get("app", "recent_limit") == 7
+
+    discovarr_instance.db.cleanup()
+
+
+def test_setting_change_only_rebuilds_affected_services(tmp_path):
+    """
+    Tests that changing a setting only rebuilds the services built from its group,
+    and that settings marked reload=False do not trigger a reload at all.
+    """
+    test_db_path = tmp_path / "test_settings_reload.db"
+
+    with patch('discovarr.Discovarr._validate_configuration', return_value=None):
+        discovarr_instance = Discovarr(db_path=str(test_db_path))
+    discovarr_instance.settings.set("plex", "api_key", "token")
+
+    with patch('discovarr.PlexProvider') as mock_plex_class, \
+         patch('discovarr.TMDB') as mock_tmdb_class, \
+         patch.object(discovarr_instance.library_snapshot, 'invalidate') as mock_invalidate:
+        assert discovarr_instance.settings.set("plex", "enabled", True) is True
+        assert mock_plex_class.call_count == 1
+        mock_invalidate.assert_called_once_with("plex") # Titles from the previous Plex server are not kept
+        plex_instance = discovarr_instance.plex
+        assert discovarr_instance.llm_service.plex_provider is plex_instance # LLMService rebuilt with the new provider
+
+        assert discovarr_instance.settings.set("app", "recent_limit", 42) is True
+        assert mock_plex_class.call_count == 1 # Not reconnected for an unrelated group
+        mock_invalidate.assert_called_once()
+        assert discovarr_instance.plex is plex_instance
+        assert plex_instance.limit == 42
+        mock_tmdb_class.assert_not_called()
+
+        with patch.object(discovarr_instance, 'reload_configuration') as mock_reload:
+            assert discovarr_instance.settings.set("trakt", "authorization", "{}") is True
+            mock_reload.assert_not_called()
+
+    discovarr_instance.db.cleanup()
+
+
+def test_set_many_validates_all_and_reloads_once(tmp_path):
+    """
+    Tests that set_many writes nothing when any value is invalid, and otherwise
+    saves every value and reloads the configuration once for all changed groups.
+    """
+    test_db_path = tmp_path / "test_settings_bulk.db"
+
+    with patch('discovarr.Discovarr._validate_configuration', return_value=None):
+        discovarr_instance = Discovarr(db_path=str(test_db_path))
+    settings_service = discovarr_instance.settings
+
+    with patch.object(discovarr_instance, 'reload_configuration') as mock_reload:
+        assert settings_service.set_many({"app": {"recent_limit": "15", "suggestion_limit": "not a number"}}) is False
+        mock_reload.assert_not_called()
+        assert settings_service.get("app", "recent_limit") == 10
+
+        assert settings_service.set_many({
+            "app": {"recent_limit": "15", "suggestion_limit": "30"},
+            "radarr": {"url": "http://radarr:7878"},
+            "trakt": {"authorization": "{}"},
+        }) is True
+        mock_reload.assert_called_once_with(changed_groups={"app", "radarr"})
+
+    assert settings_service.get("app", "recent_limit") == 15
+    assert Settings.get((Settings.group == "app") & (Settings.name == "suggestion_limit")).value == "30"
+
+    discovarr_instance.db.cleanup()
@@ -1,10 +1,10 @@
 import pytest
 import asyncio
-from unittest.mock import patch, AsyncMock, MagicMock
+from unittest.mock import ANY, patch, AsyncMock, MagicMock
 from datetime import datetime, timezone
 from discovarr import Discovarr
 from services.models import LibraryUser, ItemsFiltered
-from services.database import Media, WatchHistory
+from services.database import Database, Media, WatchHistory
 from providers.jellyfin import JellyfinProvider
 from providers.plex import PlexProvider
 from providers.trakt import TraktProvider
@@ -44,8 +44,9 @@ async def test_sync_watch_history_jellyfin_only(discovarr_instance: Discovarr):
 
     # Mock the provider instance itself since it will be None by default
     mock_jellyfin_provider = MagicMock(spec=JellyfinProvider)
-    mock_jellyfin_provider.get_users.return_value = [jellyfin_user]
+    mock_jellyfin_provider.get_users_async.return_value = [jellyfin_user]
     mock_jellyfin_provider.get_recently_watched.return_value = [jellyfin_history_item]
+    mock_jellyfin_provider.get_history_activity_marker.return_value = None
 
     # Mock providers and settings
     with patch.object(discovarr_instance, 'jellyfin_enabled', True), \
@@ -58,14 +59,15 @@ async def test_sync_watch_history_jellyfin_only(discovarr_instance: Discovarr):
         result = await discovarr_instance.sync_watch_history()
 
         # Assertions
-        mock_jellyfin_provider.get_users.assert_called_once()
-        # DB is empty, so limit should be None for full sync
-        mock_jellyfin_provider.get_recently_watched.assert_called_once_with(user_id='jellyfin_user_123', limit=None)
+        mock_jellyfin_provider.get_users_async.assert_awaited_once()
+        # No sync state yet, so the full history is fetched
+        mock_jellyfin_provider.get_recently_watched.assert_called_once_with(user_id='jellyfin_user_123', limit=None, since=None)
         mock_sync_to_db.assert_called_once_with(
             user_name='JellyfinUser',
             user_id='jellyfin_user_123',
             recently_watched_items=[jellyfin_history_item],
-            source='jellyfin'
+            source='jellyfin',
+            write_lock=ANY
         )
         
         assert isinstance(result, dict)
@@ -84,8 +86,9 @@ async def test_sync_watch_history_plex_only(discovarr_instance: Discovarr):
 
     # Mock the provider instance itself since it will be None by default
     mock_plex_provider = MagicMock(spec=PlexProvider)
-    mock_plex_provider.get_users.return_value = [plex_user]
+    mock_plex_provider.get_users_async.return_value = [plex_user]
     mock_plex_provider.get_recently_watched.return_value = [plex_history_item]
+    mock_plex_provider.get_history_activity_marker.return_value = None
 
     # Mock providers and settings
     with patch.object(discovarr_instance, 'jellyfin_enabled', False), \
@@ -98,13 +101,14 @@ async def test_sync_watch_history_plex_only(discovarr_instance: Discovarr):
         result = await discovarr_instance.sync_watch_history()
 
         # Assertions
-        mock_plex_provider.get_users.assert_called_once()
-        mock_plex_provider.get_recently_watched.assert_called_once_with(user_id='plex_user_456', limit=None)
+        mock_plex_provider.get_users_async.assert_awaited_once()
+        mock_plex_provider.get_recently_watched.assert_called_once_with(user_id='plex_user_456', limit=None, since=None)
         mock_sync_to_db.assert_called_once_with(
             user_name='PlexUser',
             user_id='plex_user_456',
             recently_watched_items=[plex_history_item],
-            source='plex'
+            source='plex',
+            write_lock=ANY
         )
         
         assert isinstance(result, dict)
@@ -123,8 +127,9 @@ async def test_sync_watch_history_trakt_only(discovarr_instance: Discovarr):
 
     # Mock the provider instance itself since it will be None by default
     mock_trakt_provider = MagicMock(spec=TraktProvider)
-    mock_trakt_provider.get_users.return_value = [trakt_user]
+    mock_trakt_provider.get_users_async.return_value = [trakt_user]
     mock_trakt_provider.get_recently_watched.return_value = [trakt_history_item]
+    mock_trakt_provider.get_history_activity_marker.return_value = None
 
     # Mock providers and settings
     with patch.object(discovarr_instance, 'jellyfin_enabled', False), \
@@ -137,13 +142,14 @@ async def test_sync_watch_history_trakt_only(discovarr_instance: Discovarr):
         result = await discovarr_instance.sync_watch_history()
 
         # Assertions
-        mock_trakt_provider.get_users.assert_called_once()
-        mock_trakt_provider.get_recently_watched.assert_called_once_with(user_id='trakt-user', limit=None)
+        mock_trakt_provider.get_users_async.assert_awaited_once()
+        mock_trakt_provider.get_recently_watched.assert_called_once_with(user_id='trakt-user', limit=None, since=None)
         mock_sync_to_db.assert_called_once_with(
             user_name='TraktUser',
             user_id='trakt-user',
             recently_watched_items=[trakt_history_item],
-            source='trakt'
+            source='trakt',
+            write_lock=ANY
         )
         
         assert isinstance(result, dict)
@@ -175,7 +181,7 @@ async def test_sync_watch_history_to_db_new_item(discovarr_instance: Discovarr):
     )
     
     # Mock external calls within _sync_watch_history_to_db
-    with patch.object(discovarr_instance.tmdb, 'get_media_detail', return_value={'poster_path': '/newposter.jpg', 'overview': 'A great movie.'}) as mock_tmdb, \
+    with patch.object(discovarr_instance.tmdb, 'get_media_detail_async', new_callable=AsyncMock, return_value={'poster_path': '/newposter.jpg', 'overview': 'A great movie.'}) as mock_tmdb, \
          patch.object(discovarr_instance, '_cache_image_if_needed', new_callable=AsyncMock, return_value='/cache/test_provider/12345.jpg') as mock_cache:
 
         # 2. Execute
@@ -231,7 +237,7 @@ async def test_sync_watch_history_to_db_existing_item(discovarr_instance: Discov
     )
 
     # Mock external calls (should not be called for existing media)
-    with patch.object(discovarr_instance.tmdb, 'get_media_detail') as mock_tmdb, \
+    with patch.object(discovarr_instance.tmdb, 'get_media_detail_async', new_callable=AsyncMock) as mock_tmdb, \
          patch.object(discovarr_instance, '_cache_image_if_needed') as mock_cache:
 
         # 2. Execute
@@ -248,4 +254,104 @@ async def test_sync_watch_history_to_db_existing_item(discovarr_instance: Discov
         media_entry = Media.get_or_none(Media.id == media_pk)
         assert media_entry is not None
         assert media_entry.watch_count == 2 # Incremented from 1
-        assert media_entry.watched is True
\ No newline at end of file
+        assert media_entry.watched is True
+@pytest.mark.asyncio
+async def test_sync_watch_history_to_db_batch_upsert(discovarr_instance: Discovarr):
+    """
+    Tests that a batch creates each missing Media once, upserts WatchHistory per media and user
+    (case-insensitive) and does not count a play again when the last played date is unchanged.
+    """
+    with discovarr_instance.db.db.atomic():
+        for media_to_delete in Media.select().where(Media.tmdb_id.in_(["111", "222"])):
+            WatchHistory.delete().where(WatchHistory.media == media_to_delete.id).execute()
+            media_to_delete.delete_instance()
+
+    items = [
+        ItemsFiltered(id='111', type='movie', name='Batch Movie', last_played_date='2023-11-01T10:00:00Z', poster_url=None, is_favorite=False),
+        ItemsFiltered(id='222', type='tv', name='Batch Show', last_played_date='2023-11-02T10:00:00Z', poster_url=None, is_favorite=True),
+        ItemsFiltered(id='111', type='movie', name='batch movie', last_played_date='2023-11-03T10:00:00Z', poster_url=None, is_favorite=False),
+    ]
+
+    with patch.object(discovarr_instance.tmdb, 'get_media_detail_async', new_callable=AsyncMock, return_value=None) as mock_tmdb:
+        await discovarr_instance._sync_watch_history_to_db(user_name="BatchUser", user_id="batch", recently_watched_items=items, source="test_provider")
+        assert mock_tmdb.await_count == 2 # One lookup per missing title
+
+        # Same plays again, synced for the same user with different casing
+        await discovarr_instance._sync_watch_history_to_db(user_name="batchuser", user_id="batch", recently_watched_items=items[1:], source="test_provider")
+
+    movie = Media.get(Media.tmdb_id == '111')
+    show = Media.get(Media.tmdb_id == '222')
+    assert movie.watch_count == 1 and show.watch_count == 1 and show.favorite is True
+    movie_history = discovarr_instance.db.get_watch_history(media_id=movie.id)
+    assert len(movie_history) == 1
+    assert movie_history[0]['last_played_date'] == datetime(2023, 11, 3, 10, 0) # Most recent play in the batch
+    assert len(discovarr_instance.db.get_watch_history(media_id=show.id)) == 1
+
+def test_sync_state_watermark_only_moves_forward(discovarr_instance: Discovarr):
+    """
+    Tests that the sync state watermark never moves back and is reset with the watch history.
+    """
+    db = discovarr_instance.db
+    assert db.get_sync_state("test_provider", "state-user") is None
+
+    assert db.update_sync_state("test_provider", "state-user", "StateUser", datetime(2024, 5, 2))
+    assert db.update_sync_state("test_provider", "state-user", "StateUser", datetime(2024, 5, 1)) # Older play
+    assert db.update_sync_state("test_provider", "state-user", "StateUser", None) # Nothing new
+    assert db.get_sync_state("test_provider", "state-user")["last_played_date"] == datetime(2024, 5, 2)
+
+    db.delete_all_watch_history()
+    assert db.get_sync_state("test_provider", "state-user") is None
+
+def test_plex_item_ids_do_not_collide_with_tmdb_ids(tmp_path):
+    """
+    Tests that a Plex row whose ratingKey equals an unrelated TMDB ID can be stored next to the TMDB row.
+    """
+    db = Database(str(tmp_path / "test_plex_ids.db"))
+    try:
+        matrix_id = db.create_media({"title": "The Matrix", "entity_type": "suggestion", "media_type": "movie", "tmdb_id": "603"})
+        paddington_id = db.create_media({"title": "Paddington", "entity_type": "library", "media_type": "movie", "tmdb_id": "603", "source_provider": "plex"})
+        assert matrix_id and paddington_id
+
+        assert db.get_media_by_tmdb_id("603", "movie")["id"] == matrix_id
+        assert db.create_media({"title": "The Matrix (1999)", "entity_type": "suggestion", "media_type": "movie", "tmdb_id": "603", "source_provider": "jellyfin"}) is None # Real TMDB IDs stay unique
+    finally:
+        db.cleanup()
+
+def test_watch_history_only_matches_tmdb_ids_across_real_tmdb_rows(tmp_path):
+    """
+    Tests that a Plex play is not matched to a TMDB row by an ID that only looks the same.
+    """
+    db = Database(str(tmp_path / "test_plex_match.db"))
+    try:
+        matrix_id = db.create_media({"title": "The Matrix", "entity_type": "suggestion", "media_type": "movie", "tmdb_id": "603"})
+        plex_entry = {"title": "Paddington", "media_type": "movie", "tmdb_id": "603", "source_provider": "plex", "last_played_date": "2024-05-01T10:00:00Z"}
+        jellyfin_entry = {"title": "Matrix", "media_type": "movie", "tmdb_id": "603", "source_provider": "jellyfin", "last_played_date": "2024-05-01T10:00:00Z"}
+
+        plex_match, jellyfin_match = db.find_watch_history_media([plex_entry, jellyfin_entry])
+        assert plex_match is None
+        assert jellyfin_match["id"] == matrix_id # Falls back to the TMDB ID, both are real TMDB IDs
+
+        new_media = [{"title": "Paddington", "entity_type": "library", "media_type": "movie", "tmdb_id": "603", "source_provider": "plex", "watched": True, "watch_count": 1}]
+        assert db.sync_watch_history_batch("PlexUser", [plex_entry], new_media=new_media) == 1
+        paddington = Media.get((Media.title == "Paddington") & (Media.source_provider == "plex"))
+        assert [h["media"]["id"] for h in db.get_watch_history(limit=None)] == [paddington.id]
+        assert Media.get_by_id(matrix_id).watch_count == 0
+    finally:
+        db.cleanup()
+
+def test_watch_history_batch_skips_media_created_by_another_writer(tmp_path):
+    """
+    Tests that two users who built the same new media concurrently both sync without a duplicate insert.
+    """
+    db = Database(str(tmp_path / "test_batch_race.db"))
+    try:
+        entry = {"title": "Dune", "media_type": "movie", "tmdb_id": "438631", "source_provider": "jellyfin", "last_played_date": "2024-05-01T10:00:00Z"}
+        new_media = [{"title": "Dune", "entity_type": "library", "media_type": "movie", "tmdb_id": "438631", "source_provider": "jellyfin", "watched": True, "watch_count": 1}]
+        assert db.sync_watch_history_batch("Alice", [entry], new_media=new_media) == 1
+        assert db.sync_watch_history_batch("Bob", [entry], new_media=new_media) == 1 # Built before Alice's write landed
+
+        dune = Media.get(Media.tmdb_id == "438631")
+        assert dune.watch_count == 2
+        assert len(db.get_watch_history(limit=None, media_id=dune.id)) == 2
+    finally:
+        db.cleanup()
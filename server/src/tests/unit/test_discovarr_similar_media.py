@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from discovarr import Discovarr
+from services.models import DEFAULT_PROMPT_TEMPLATE
+
+from tests.unit.base.base_discovarr_tests import mocked_discovarr_instance # Import the base fixture
+
+
+@pytest.mark.asyncio
+async def test_get_similar_media_enriches_concurrently_in_order(mocked_discovarr_instance: Discovarr):
+    dv = mocked_discovarr_instance
+    dv.enrichment_concurrency = 2
+    dv.auto_media_save = False
+    dv.llm_service.get_prompt.return_value = "prompt"
+    suggestions = [
+        {"title": f"Movie {i}", "mediaType": "movie", "description": "", "similarity": "", "rt_url": "", "rt_score": 90}
+        for i in range(5)
+    ]
+    dv.llm_service.generate_suggestions = AsyncMock(return_value={"response": {"suggestions": suggestions}})
+    dv.db.search_media.return_value = []
+    dv.db.get_media_by_tmdb_id.return_value = None
+
+    in_flight = 0
+    max_in_flight = 0
+
+    async def lookup(title, media_type):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01 * (5 - int(title.split()[-1]))) # Later titles finish first
+        in_flight -= 1
+        return {"id": int(title.split()[-1]) + 100}
+
+    dv.tmdb.lookup_media_async = AsyncMock(side_effect=lookup)
+    dv.tmdb.get_media_detail_async = AsyncMock(return_value={"poster_path": None, "genres": []})
+
+    result = await dv.get_similar_media(media_name="Seed")
+
+    assert [r["title"] for r in result] == [s["title"] for s in suggestions]
+    assert [r["tmdb_id"] for r in result] == [100, 101, 102, 103, 104]
+    assert max_in_flight == 2
+    dv.db.create_media.assert_not_called() # auto_media_save disabled and no search_id
+
+
+@pytest.mark.asyncio
+async def test_process_watch_history_batches_seeds(mocked_discovarr_instance: Discovarr):
+    dv = mocked_discovarr_instance
+    dv.watch_history_batch_size = 2
+    dv.default_prompt = DEFAULT_PROMPT_TEMPLATE
+    dv.llm_service.get_prompt.return_value = "prompt"
+    dv.db.get_search.return_value = {"id": 1}
+    dv.db.get_watch_history.return_value = [
+        {"id": 1, "media": {"title": "Alpha"}},
+        {"id": 2, "media": {"title": "Beta"}},
+        {"id": 3, "media": {"title": "Alpha"}}, # Same title watched by another user
+        {"id": 4, "media": {"title": "Gamma"}},
+    ]
+    dv.db.search_media.return_value = []
+    dv.db.get_media_by_tmdb_id.return_value = None
+    dv.llm_service.generate_suggestions = AsyncMock(return_value={"response": {"suggestions": [
+        {"title": "Delta", "mediaType": "movie", "description": "", "similarity": "", "rt_url": "", "rt_score": 80, "source_title": "beta"},
+    ]}})
+    dv.tmdb.lookup_media_async = AsyncMock(return_value={"id": 42})
+    dv.tmdb.get_media_detail_async = AsyncMock(return_value={"poster_path": None, "genres": []})
+    dv._cache_image_if_needed = AsyncMock(return_value=None)
+
+    await dv.process_watch_history()
+
+    assert dv.llm_service.generate_suggestions.await_count == 2 # Three unique titles, batches of two
+    assert dv.db.bulk_update_watch_history_processed.call_args_list[0].args == ([1, 3, 2],)
+    assert dv.db.bulk_update_watch_history_processed.call_args_list[1].args == ([4],)
+    created = dv.db.create_media.call_args_list[0].args[0]
+    assert created["source_title"] == "Beta" # Normalized to the seed title
+
+
+
+@pytest.mark.asyncio
+async def test_process_watch_history_keeps_customized_prompt(mocked_discovarr_instance: Discovarr):
+    dv = mocked_discovarr_instance
+    dv.watch_history_batch_size = 5
+    dv.default_prompt = "My prompt for {{media_name}}"
+    dv.db.get_search.return_value = {"id": 1}
+    dv.db.get_watch_history.return_value = [
+        {"id": 1, "media": {"title": "Alpha"}},
+        {"id": 2, "media": {"title": "Beta"}},
+    ]
+    dv.get_similar_media = AsyncMock(return_value=[])
+    dv.get_similar_media_for_titles = AsyncMock(return_value=[])
+
+    await dv.process_watch_history()
+
+    dv.get_similar_media_for_titles.assert_not_called()
+    assert [c.kwargs["media_name"] for c in dv.get_similar_media.await_args_list] == ["Alpha", "Beta"]
+    assert dv.db.bulk_update_watch_history_processed.call_args_list[1].args == ([2],)
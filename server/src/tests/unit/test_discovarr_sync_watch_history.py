@@ -0,0 +1,166 @@
+import asyncio
+import time
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+from discovarr import Discovarr
+from services.models import ItemsFiltered, LibraryUser
+
+from tests.unit.base.base_discovarr_tests import mocked_discovarr_instance # Import the base fixture
+
+
+def _slow_provider(source: str, user_names, delay: float) -> MagicMock:
+    provider = MagicMock()
+    provider.get_users_async = AsyncMock(return_value=[LibraryUser(id=f"{source}-{name}", name=name, source_provider=source) for name in user_names])
+
+    def get_recently_watched(user_id, limit, since):
+        time.sleep(delay) # Blocking, like plexapi and trakt
+        return [ItemsFiltered(id="1", type="movie", name=f"{user_id} Movie", last_played_date=None, poster_url=None, is_favorite=False)]
+
+    provider.get_recently_watched.side_effect = get_recently_watched
+    provider.get_history_activity_marker.return_value = None
+    return provider
+
+
+@pytest.mark.asyncio
+async def test_sync_watch_history_fetches_concurrently_with_single_writer(mocked_discovarr_instance: Discovarr):
+    dv = mocked_discovarr_instance
+    dv.jellyfin_enabled = dv.jellyfin_enable_history = True
+    dv.plex_enabled = dv.plex_enable_history = True
+    dv.trakt_enabled = dv.trakt_enable_history = True
+    dv.jellyfin = _slow_provider("jellyfin", ["Alice", "Bob"], 0.2)
+    dv.plex = _slow_provider("plex", ["Alice"], 0.2)
+    dv.trakt = _slow_provider("trakt", ["Carol"], 0.2)
+    dv.db.get_sync_state.return_value = None
+
+    dv.db.find_watch_history_media.side_effect = lambda entries: [None] * len(entries)
+    builders = writers = 0
+    max_builders = max_writers = 0
+
+    async def build_media(item, source, semaphore):
+        nonlocal builders, max_builders
+        builders += 1
+        max_builders = max(max_builders, builders)
+        await asyncio.sleep(0.05) # TMDB lookup
+        builders -= 1
+        return {"title": item.name, "media_type": item.type}
+
+    def sync_batch(watched_by, entries, new_media):
+        nonlocal writers, max_writers
+        writers += 1
+        max_writers = max(max_writers, writers)
+        time.sleep(0.01) # Blocking, like peewee
+        writers -= 1
+        return len(entries)
+
+    dv._build_watch_history_media = build_media
+    dv.db.sync_watch_history_batch.side_effect = sync_batch
+
+    start = time.monotonic()
+    result = await dv.sync_watch_history()
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.6 # Four 0.2s fetches run side by side instead of one after another
+    assert max_builders > 1 # Enrichment is not serialized by the writer lock
+    assert max_writers == 1
+    assert result["Alice"]["id"] == "jellyfin-Alice" # First provider's id is kept
+    assert result["Alice"]["recent_titles"] == ["jellyfin-Alice Movie", "plex-Alice Movie"]
+    assert result["Carol"]["recent_titles"] == ["trakt-Carol Movie"]
+    assert dv.db.update_sync_state.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_sync_watch_history_only_fetches_after_watermark(mocked_discovarr_instance: Discovarr):
+    dv = mocked_discovarr_instance
+    dv.jellyfin_enabled = dv.jellyfin_enable_history = False
+    dv.plex_enabled = dv.plex_enable_history = True
+    dv.trakt_enabled = dv.trakt_enable_history = False
+    dv.plex = MagicMock()
+    dv.plex.get_history_activity_marker.return_value = None
+    dv.plex.get_users_async = AsyncMock(return_value=[LibraryUser(id="1", name="Alice", source_provider="plex")])
+    dv.plex.get_recently_watched.return_value = [
+        ItemsFiltered(id="1", type="movie", name="New", last_played_date="2024-01-02T00:00:00Z", poster_url=None, is_favorite=False),
+        ItemsFiltered(id="2", type="movie", name="Boundary", last_played_date="2024-01-01T00:00:00Z", poster_url=None, is_favorite=False),
+    ]
+    watermark = datetime(2024, 1, 1)
+    dv.db.get_sync_state.return_value = {"last_played_date": watermark}
+    dv._sync_watch_history_to_db = AsyncMock(side_effect=lambda **kwargs: kwargs["recently_watched_items"])
+
+    result = await dv.sync_watch_history()
+
+    assert dv.plex.get_recently_watched.call_args.kwargs == {"user_id": "1", "limit": None, "since": watermark.replace(tzinfo=timezone.utc)}
+    assert [item.name for item in dv._sync_watch_history_to_db.call_args.kwargs["recently_watched_items"]] == ["New"]
+    dv.db.update_sync_state.assert_called_once_with("plex", "1", "Alice", datetime(2024, 1, 2), None)
+    assert result["Alice"]["recent_titles"] == ["New"]
+
+    # Nothing new: no database sync, the watermark is kept
+    dv.plex.get_recently_watched.return_value = []
+    dv._sync_watch_history_to_db.reset_mock()
+    dv.db.update_sync_state.reset_mock()
+    await dv.sync_watch_history()
+    dv._sync_watch_history_to_db.assert_not_called()
+    dv.db.update_sync_state.assert_called_once_with("plex", "1", "Alice", None, None)
+
+
+@pytest.mark.asyncio
+async def test_sync_watch_history_skips_unchanged_activity_marker(mocked_discovarr_instance: Discovarr):
+    dv = mocked_discovarr_instance
+    dv.jellyfin_enabled = dv.jellyfin_enable_history = False
+    dv.plex_enabled = dv.plex_enable_history = False
+    dv.trakt_enabled = dv.trakt_enable_history = True
+    dv.trakt = MagicMock()
+    dv.trakt.get_users_async = AsyncMock(return_value=[LibraryUser(id="alice", name="Alice", source_provider="trakt")])
+    dv.trakt.get_history_activity_marker.return_value = "movies=2024-01-01T00:00:00.000Z;episodes=None"
+    dv.db.get_sync_state.return_value = {"last_played_date": datetime(2024, 1, 1), "activity_marker": "movies=2024-01-01T00:00:00.000Z;episodes=None"}
+
+    result = await dv.sync_watch_history()
+
+    dv.trakt.get_recently_watched.assert_not_called()
+    dv.db.update_sync_state.assert_not_called()
+    assert result["Alice"]["recent_titles"] == []
+
+    # The marker moved: history is fetched and the new marker is stored
+    dv.trakt.get_history_activity_marker.return_value = "movies=2024-01-03T00:00:00.000Z;episodes=None"
+    dv.trakt.get_recently_watched.return_value = []
+    await dv.sync_watch_history()
+    dv.trakt.get_recently_watched.assert_called_once()
+    dv.db.update_sync_state.assert_called_once_with("trakt", "alice", "Alice", None, "movies=2024-01-03T00:00:00.000Z;episodes=None")
+
+
+
+@pytest.mark.asyncio
+async def test_sync_watch_history_caps_activity_marker_requests(mocked_discovarr_instance: Discovarr):
+    dv = mocked_discovarr_instance
+    dv.jellyfin_enabled = dv.jellyfin_enable_history = False
+    dv.plex_enabled = dv.plex_enable_history = False
+    dv.trakt_enabled = dv.trakt_enable_history = True
+    dv.trakt = MagicMock()
+    dv.trakt.get_users_async = AsyncMock(return_value=[LibraryUser(id=f"u{i}", name=f"User {i}", source_provider="trakt") for i in range(5)])
+    dv.trakt.get_recently_watched.return_value = []
+    dv.db.get_sync_state.return_value = None
+    in_flight = max_in_flight = 0
+
+    def get_history_activity_marker(user_id):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.05) # sync/last_activities request
+        in_flight -= 1
+        return None
+
+    dv.trakt.get_history_activity_marker.side_effect = get_history_activity_marker
+    await dv.sync_watch_history()
+
+    assert dv.trakt.get_history_activity_marker.call_count == 5
+    assert max_in_flight == Discovarr._SYNC_PROVIDER_CONCURRENCY["trakt"]
+
+def test_delete_all_watch_history_leaves_images_to_background_cleanup(mocked_discovarr_instance: Discovarr):
+    dv = mocked_discovarr_instance
+    dv.db.delete_all_watch_history.return_value = 3
+    dv.scheduler = MagicMock()
+
+    result = dv.delete_all_watch_history()
+
+    assert result == {"success": True, "message": "Deleted 3 watch history item(s)."}
+    dv.image_cache.delete_cached_image.assert_not_called()
+    assert dv.scheduler.method_calls == [] # A paused or deleted clean_image_cache schedule stays as it is
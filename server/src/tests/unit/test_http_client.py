@@ -0,0 +1,31 @@
+import pytest
+from unittest.mock import patch
+from services.http_client import HttpTransport
+
+
+def test_session_is_pooled_and_retries_idempotent_methods():
+    transport = HttpTransport()
+    session = transport.session
+    assert transport.session is session # Reused across requests
+
+    adapter = session.get_adapter("http://radarr:7878")
+    assert adapter._pool_maxsize == HttpTransport.POOL_MAXSIZE
+    retry = adapter.max_retries
+    assert retry.total == HttpTransport.MAX_RETRIES
+    assert retry.backoff_jitter == HttpTransport.BACKOFF_JITTER
+    assert "GET" in retry.allowed_methods and "POST" not in retry.allowed_methods
+    transport.close()
+
+
+@pytest.mark.asyncio
+async def test_requests_use_default_timeout():
+    transport = HttpTransport()
+    with patch.object(transport.session, "request") as mock_request:
+        transport.get("http://jellyfin:8096/Users", headers={"a": "b"})
+        await transport.request_async("PUT", "http://sonarr:8989/api/v3/series", timeout=3)
+
+    assert mock_request.call_args_list[0].kwargs["timeout"] == HttpTransport.TIMEOUT
+    assert mock_request.call_args_list[0].kwargs["headers"] == {"a": "b"}
+    assert mock_request.call_args_list[1].args == ("PUT", "http://sonarr:8989/api/v3/series")
+    assert mock_request.call_args_list[1].kwargs["timeout"] == 3
+    transport.close()
@@ -0,0 +1,208 @@
+import asyncio
+import os
+import time
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from PIL import Image
+from services.database import Database
+from services.image_cache import ImageCacheService
+
+
+@pytest.mark.asyncio
+async def test_queue_image_returns_filename_and_downloads_in_background(tmp_path):
+    in_flight = 0
+    max_in_flight = 0
+    release = asyncio.Event()
+
+    async def poster(request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await release.wait()
+        in_flight -= 1
+        return web.Response(body=b"image-" + request.match_info["id"].encode())
+
+    app = web.Application()
+    app.router.add_get("/poster/{id}.png", poster)
+    server = TestServer(app)
+    await server.start_server()
+
+    cache = ImageCacheService(cache_base_dir=str(tmp_path))
+    cache.MAX_CONCURRENT_DOWNLOADS = 2
+    try:
+        filenames = [cache.queue_image(str(server.make_url(f"/poster/{i}.png")), "Plex", str(i)) for i in range(5)]
+        assert filenames == [f"plex_{i}.png" for i in range(5)] # Returned before any download completes
+
+        await asyncio.sleep(0.05)
+        assert not any((tmp_path / name).exists() for name in filenames)
+        release.set()
+        await cache.wait_for_downloads()
+
+        assert max_in_flight == 2
+        assert (tmp_path / "plex_3.png").read_bytes() == b"image-3"
+        # Already cached images are not queued again
+        assert cache.queue_image(str(server.make_url("/poster/3.png")), "plex", "3") == "plex_3.png"
+        assert cache._queues[asyncio.get_running_loop()].qsize() == 0
+    finally:
+        await cache.close()
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_queue_image_skips_when_queue_is_full(tmp_path):
+    cache = ImageCacheService(cache_base_dir=str(tmp_path))
+    cache.MAX_QUEUED_DOWNLOADS = 1
+    cache.MAX_CONCURRENT_DOWNLOADS = 0 # No workers, so the queue never drains
+    try:
+        assert cache.queue_image("http://example.invalid/a.jpg", "tmdb", "1") == "tmdb_1.jpg"
+        assert cache.queue_image("http://example.invalid/b.jpg", "tmdb", "2") is None
+        assert cache.queue_image(None, "tmdb", "3") is None
+    finally:
+        await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_download_and_failures_leave_no_file(tmp_path):
+    hits = {}
+
+    async def poster(request):
+        name = request.match_info["name"]
+        hits[name] = hits.get(name, 0) + 1
+        await asyncio.sleep(0.02)
+        if name == "broken":
+            response = web.StreamResponse(headers={"Content-Length": "100"})
+            await response.prepare(request)
+            await response.write(b"partial")
+            request.transport.close() # Truncated body
+            return response
+        return web.Response(body=b"image")
+
+    app = web.Application()
+    app.router.add_get("/{name}.jpg", poster)
+    server = TestServer(app)
+    await server.start_server()
+
+    cache = ImageCacheService(cache_base_dir=str(tmp_path))
+    try:
+        url = str(server.make_url("/ok.jpg"))
+        assert cache.queue_image(url, "tmdb", "603") == "tmdb_603.jpg"
+        results = await asyncio.gather(*[cache.save_image_from_url(url, "tmdb", "603") for _ in range(3)])
+        assert results == ["tmdb_603.jpg"] * 3
+        assert hits["ok"] == 1
+        await cache.wait_for_downloads()
+        assert hits["ok"] == 1
+
+        broken = str(server.make_url("/broken.jpg"))
+        assert await cache.save_image_from_url(broken, "tmdb", "1") is None
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["tmdb_603.jpg"] # No partial or temp files
+        assert cache._in_flight == {}
+    finally:
+        await cache.close()
+        await server.close()
+
+
+def test_variants_are_resized_webp_files(tmp_path):
+    Image.new("RGB", (500, 750), "red").save(tmp_path / "tmdb_603.jpg")
+    (tmp_path / "tmdb_1.jpg").write_bytes(b"not an image")
+    cache = ImageCacheService(cache_base_dir=str(tmp_path))
+
+    grid = cache.get_image_path("tmdb_603.jpg", "grid") # Created on demand
+    assert grid == tmp_path / "tmdb_603.jpg.grid.webp"
+    with Image.open(grid) as image:
+        assert (image.format, image.size) == ("WEBP", (342, 513))
+    with Image.open(cache.get_image_path("tmdb_603.jpg", "detail")) as image:
+        assert image.size == (500, 750) # Never upscaled
+    assert cache.get_image_path("tmdb_603.jpg", "original") == tmp_path / "tmdb_603.jpg"
+
+    assert cache.get_image_path("tmdb_1.jpg", "grid") == tmp_path / "tmdb_1.jpg" # Falls back to the original
+    assert cache.get_image_path("missing.jpg", "grid") is None
+    assert cache.get_image_path("../tmdb_603.jpg", "grid") is None
+    assert cache._accessed == set() # Nothing to evict without an index and a budget
+
+    assert cache.delete_cached_image("tmdb_603.jpg")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["tmdb_1.jpg"]
+
+
+@pytest.fixture
+def cache_db(tmp_path):
+    db = Database(str(tmp_path / "test_image_cache.db"))
+    yield db
+    db.cleanup()
+
+
+def _age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_budget_evicts_least_recently_served_and_gc_removes_orphans(tmp_path, cache_db: Database):
+    cache_dir = tmp_path / "image"
+    cache = ImageCacheService(cache_base_dir=str(cache_dir), db=cache_db, max_size_bytes=250)
+    for name in ["a.jpg", "b.jpg", "c.jpg"]:
+        (cache_dir / name).write_bytes(b"x" * 100)
+        cache._index_image(name, f"http://example.invalid/{name}")
+        time.sleep(0.01) # Distinct access times
+    cache.get_image_path("a.jpg") # Served, so b.jpg is now the least recently used
+
+    assert cache.enforce_budget() == 1
+    assert sorted(p.name for p in cache_dir.iterdir()) == ["a.jpg", "c.jpg"]
+    assert cache_db.get_cached_images_size() == 200
+    assert cache_db.get_cached_image("b.jpg")["source_url"] == "http://example.invalid/b.jpg" # Kept to restore it
+
+    cache_db.create_media({"title": "A", "entity_type": "library", "media_type": "movie", "poster_url": "a.jpg"})
+    cache_db.create_media({"title": "B", "entity_type": "library", "media_type": "movie", "poster_url": "b.jpg"})
+    (cache_dir / "a.jpg.grid.webp").write_bytes(b"x")
+    (cache_dir / "d.jpg").write_bytes(b"x") # Unreferenced but recent, e.g. a search result not saved yet
+    (cache_dir / ".c.jpg.1234.tmp").write_bytes(b"x") # Left behind by an interrupted download
+    for name in ["a.jpg", "a.jpg.grid.webp", "c.jpg", ".c.jpg.1234.tmp"]:
+        _age(cache_dir / name, 2 * cache.ORPHAN_GRACE_SECONDS)
+
+    assert cache.collect_orphans() == 1
+    assert sorted(p.name for p in cache_dir.iterdir()) == ["a.jpg", "a.jpg.grid.webp", "d.jpg"]
+    assert cache_db.get_cached_image("c.jpg") is None
+    assert cache_db.get_cached_image("b.jpg") is not None # Evicted but still used by media
+
+
+def test_variant_created_on_demand_is_added_to_indexed_size(tmp_path, cache_db: Database):
+    Image.new("RGB", (500, 750), "red").save(tmp_path / "tmdb_603.jpg")
+    cache = ImageCacheService(cache_base_dir=str(tmp_path), db=cache_db, max_size_bytes=10_000_000)
+    cache._index_image("tmdb_603.jpg", "http://example.invalid/603.jpg")
+    original_size = cache_db.get_cached_image("tmdb_603.jpg")["size_bytes"]
+
+    grid = cache.get_image_path("tmdb_603.jpg", "grid")
+    assert cache_db.get_cached_image("tmdb_603.jpg")["size_bytes"] == original_size + grid.stat().st_size
+    assert cache._accessed == {"tmdb_603.jpg"}
+
+
+@pytest.mark.asyncio
+async def test_restore_image_falls_back_to_media_poster_source(tmp_path, cache_db: Database):
+    available = False
+
+    async def poster(request):
+        if not available:
+            raise web.HTTPServiceUnavailable()
+        return web.Response(body=b"image")
+
+    app = web.Application()
+    app.router.add_get("/poster.jpg", poster)
+    server = TestServer(app)
+    await server.start_server()
+
+    cache_dir = tmp_path / "image"
+    cache = ImageCacheService(cache_base_dir=str(cache_dir), db=cache_db)
+    try:
+        url = str(server.make_url("/poster.jpg"))
+        filename = cache.queue_image(url, "tmdb", "603")
+        cache_db.create_media({"title": "The Matrix", "entity_type": "library", "media_type": "movie", "poster_url": filename, "poster_url_source": url})
+        await cache.wait_for_downloads()
+        assert not (cache_dir / filename).exists() and cache_db.get_cached_image(filename) is None # Failed, never indexed
+
+        available = True
+        assert await cache.restore_image(filename)
+        assert (cache_dir / filename).read_bytes() == b"image"
+        assert cache_db.get_cached_image(filename)["source_url"] == url
+        assert not await cache.restore_image("unknown.jpg")
+    finally:
+        await cache.close()
+        await server.close()
@@ -0,0 +1,97 @@
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+from providers import jellyfin as jellyfin_module
+from providers.jellyfin import JellyfinProvider
+
+
+def _response(items):
+    response = MagicMock()
+    response.json.return_value = {"Items": items}
+    return response
+
+
+def _movie(i, last_played=None):
+    return {"Id": f"id{i}", "Name": f"Movie {i}", "Type": "Movie", "ProviderIds": {"Tmdb": str(i)}, "UserData": {"LastPlayedDate": last_played}}
+
+
+def test_library_is_streamed_in_trimmed_pages():
+    provider = JellyfinProvider(jellyfin_url="http://jellyfin:8096", jellyfin_api_key="key")
+    provider.ITEMS_PAGE_SIZE = 2
+    pages = [[_movie(1), _movie(2)], [_movie(3), _movie(1)], []] # Last page is empty, duplicate name across pages
+
+    with patch.object(jellyfin_module.http_transport, "get", side_effect=[_response(page) for page in pages]) as mock_get:
+        stream = provider.iter_all_items_filtered()
+        first = next(stream)
+        assert first.name == "Movie 1" and first.id == "1"
+        assert mock_get.call_count == 1 # Later pages are only requested when consumed
+        names = [first.name] + [item.name for item in stream]
+
+    assert names == ["Movie 1", "Movie 2", "Movie 3"]
+    params = [call.kwargs["params"] for call in mock_get.call_args_list]
+    assert [p["StartIndex"] for p in params] == [0, 2, 4]
+    assert all(p["Limit"] == 2 and p["Fields"] == JellyfinProvider.ITEM_FIELDS for p in params)
+
+
+def test_recently_watched_stops_at_watermark():
+    provider = JellyfinProvider(jellyfin_url="http://jellyfin:8096", jellyfin_api_key="key")
+    page = [_movie(1, "2024-01-03T00:00:00.0000000Z"), _movie(2, "2024-01-01T00:00:00.0000000Z")]
+
+    with patch.object(jellyfin_module.http_transport, "get", return_value=_response(page)) as mock_get:
+        items = provider.get_recently_watched(user_id="u1", since=datetime(2024, 1, 2, tzinfo=timezone.utc))
+
+    assert [item.name for item in items] == ["Movie 1"]
+    mock_get.assert_called_once()
+    assert mock_get.call_args.kwargs["params"]["Limit"] == JellyfinProvider.SINCE_PAGE_SIZE
+
+
+def test_missing_external_ids_resolved_in_bulk_and_cached(tmp_path):
+    from services.database import Database
+    db = Database(str(tmp_path / "test_jellyfin_ids.db"))
+    try:
+        provider = JellyfinProvider(jellyfin_url="http://jellyfin:8096", jellyfin_api_key="key", db=db)
+        episodes = [
+            {"Id": f"ep{i}", "Type": "Episode", "SeriesName": f"Show {i % 3}", "SeriesId": f"series{i % 3}", "ProviderIds": {"Tmdb": f"99{i}"},
+             "UserData": {"LastPlayedDate": f"2024-01-0{i + 1}T00:00:00Z"}}
+            for i in range(6)
+        ]
+        lookup = _response([{"Id": f"series{i}", "ProviderIds": {"Tmdb": str(100 + i), "Imdb": f"tt{i}"}} for i in range(3)])
+
+        with patch.object(jellyfin_module.http_transport, "get", return_value=lookup) as mock_get:
+            items = provider.get_items_filtered(items=episodes, user_id="u1")
+
+        mock_get.assert_called_once() # One request for three series
+        assert set(mock_get.call_args.kwargs["params"]["Ids"].split(",")) == {"series0", "series1", "series2"}
+        assert sorted(item.id for item in items) == ["100", "101", "102"] # Series IDs, not the episodes' own
+
+        # A new provider (e.g. after a settings reload) is served from the database
+        with patch.object(jellyfin_module.http_transport, "get") as mock_get:
+            provider = JellyfinProvider(jellyfin_url="http://jellyfin:8096", jellyfin_api_key="key", db=db)
+            assert provider.get_item_external_ids("series1", user_id="u1") == {"tmdbid": "101", "tvdbid": None, "imdbid": "tt1"}
+        mock_get.assert_not_called()
+
+        # Items without a TMDB ID are not persisted, so a later run picks up an identification made in Jellyfin
+        with patch.object(jellyfin_module.http_transport, "get", return_value=_response([{"Id": "series9", "ProviderIds": {}}])):
+            assert provider.get_item_external_ids("series9", user_id="u1") == {"tmdbid": None, "tvdbid": None, "imdbid": None}
+        identified = _response([{"Id": "series9", "ProviderIds": {"Tmdb": "109"}}])
+        with patch.object(jellyfin_module.http_transport, "get", return_value=identified) as mock_get:
+            provider = JellyfinProvider(jellyfin_url="http://jellyfin:8096", jellyfin_api_key="key", db=db)
+            assert provider.get_item_external_ids("series9", user_id="u1")["tmdbid"] == "109"
+        mock_get.assert_called_once()
+    finally:
+        db.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_users_are_fetched_through_the_async_transport():
+    provider = JellyfinProvider(jellyfin_url="http://jellyfin:8096", jellyfin_api_key="key")
+    response = MagicMock()
+    response.json.return_value = [{"Id": "u1", "Name": "Alice", "PrimaryImageTag": "abc"}, {"Name": "No ID"}]
+
+    with patch.object(jellyfin_module.http_transport, "request_async", return_value=response) as mock_request, \
+         patch.object(jellyfin_module.http_transport, "get") as mock_get:
+        users = await provider.get_users_async()
+
+    mock_get.assert_not_called()
+    assert mock_request.await_args.args == ("GET", "http://jellyfin:8096/Users")
+    assert [(user.id, user.name, user.thumb) for user in users] == [("u1", "Alice", "http://jellyfin:8096/Users/u1/Images/Primary?tag=abc")]
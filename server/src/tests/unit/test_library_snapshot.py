@@ -0,0 +1,75 @@
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from services.database import Database
+from services.library_snapshot import LibrarySnapshotService
+
+
+@pytest.fixture
+def snapshot_db(tmp_path):
+    db = Database(str(tmp_path / "test_library_snapshot.db"))
+    yield db
+    db.cleanup()
+
+
+def _mock_provider():
+    provider = MagicMock()
+    provider.get_all_items_filtered.return_value = [
+        SimpleNamespace(name="The Matrix", id="1", type="movie"),
+        SimpleNamespace(name="Severance", id="2", type="tv"),
+    ]
+    provider.get_users.return_value = [SimpleNamespace(id="u1", name="Alice"), SimpleNamespace(id="u2", name="Bob")]
+    provider.get_favorites.side_effect = lambda user_id: [SimpleNamespace(name=f"Fav {user_id}", id="3", type="movie")]
+    return provider
+
+
+def test_snapshot_built_lazily_and_persisted(snapshot_db: Database):
+    provider = _mock_provider()
+    service = LibrarySnapshotService(db_service=snapshot_db)
+
+    assert service.get_library_names("jellyfin") == [] # No snapshot and no provider to build it with
+    assert service.get_library_names("jellyfin", provider=provider) == ["The Matrix", "Severance"]
+    assert service.get_favorite_names("jellyfin", user_name="alice", provider=provider) == ["Fav u1"]
+    provider.get_all_items_filtered.assert_called_once()
+
+    # A new service (e.g. after restart) reads the snapshot from the database without touching the provider
+    restarted = LibrarySnapshotService(db_service=snapshot_db)
+    assert sorted(restarted.get_library_names("jellyfin", provider=provider)) == ["Severance", "The Matrix"]
+    assert sorted(restarted.get_favorite_names("jellyfin")) == ["Fav u1", "Fav u2"]
+    assert restarted.get_status()["jellyfin"]["titles"] == 2
+    provider.get_all_items_filtered.assert_called_once()
+
+
+def test_refresh_keeps_previous_snapshot_on_failure(snapshot_db: Database):
+    provider = _mock_provider()
+    service = LibrarySnapshotService(db_service=snapshot_db)
+    assert service.refresh("plex", provider) is True
+
+    provider.get_all_items_filtered.return_value = None
+    assert service.refresh("plex", provider) is False
+    assert len(service.get_library_names("plex")) == 2
+
+
+def test_concurrent_first_reads_build_once_and_invalidate_rebuilds(snapshot_db: Database):
+    provider = _mock_provider()
+    scan = provider.get_all_items_filtered.return_value
+
+    def slow_scan():
+        time.sleep(0.05) # Library scan
+        return scan
+
+    provider.get_all_items_filtered.side_effect = slow_scan
+    service = LibrarySnapshotService(db_service=snapshot_db)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: service.get_library_names("plex", provider=provider), range(4)))
+    assert results == [["The Matrix", "Severance"]] * 4
+    provider.get_all_items_filtered.assert_called_once()
+
+    # The Plex server changed: the old titles are gone from memory and the database
+    service.invalidate("plex")
+    assert not service.has_snapshot("plex")
+    assert LibrarySnapshotService(db_service=snapshot_db).get_library_names("plex") == []
+    service.get_library_names("plex", provider=provider)
+    assert provider.get_all_items_filtered.call_count == 2
@@ -0,0 +1,45 @@
+import logging
+from unittest.mock import MagicMock
+from services import llm as llm_module
+from services.llm import LLMService
+
+
+def _llm_service():
+    settings = MagicMock()
+    settings.get.side_effect = lambda group, key: True if key == "enable_media" else None
+    db = MagicMock()
+    db.get_ignored_suggestions_titles.return_value = ["Ignored"]
+    db.get_watch_history_titles.return_value = ["A", "B"]
+    snapshot = MagicMock()
+    snapshot.get_library_names.return_value = ["Owned"]
+    snapshot.get_favorite_names.return_value = ["Fav"]
+    service = LLMService(
+        logger=logging.getLogger(__name__), settings_service=settings, db_service=db,
+        enabled_providers={"llm": [], "library": ["jellyfin"]}, jellyfin_provider=MagicMock(), library_snapshot=snapshot,
+    )
+    return service, db, snapshot
+
+
+def test_get_prompt_only_resolves_referenced_variables():
+    service, db, snapshot = _llm_service()
+
+    assert service.get_prompt(limit=3, media_name="Seed", template_string="{{limit}} like {{media_name}}") == "3 like Seed"
+    db.get_watch_history_titles.assert_not_called()
+    db.get_ignored_suggestions_titles.assert_not_called()
+    snapshot.get_library_names.assert_not_called()
+    snapshot.get_favorite_names.assert_not_called()
+
+    rendered = service.get_prompt(limit=3, template_string="{{all_media}}|{{media_exclude}}|{{watch_history}}")
+    assert rendered == "Ignored,Owned|Ignored,Owned|A,B"
+    db.get_ignored_suggestions_titles.assert_called_once() # Shared between the two aliases
+    snapshot.get_favorite_names.assert_not_called()
+
+
+def test_get_prompt_caches_parsed_templates():
+    service, _, _ = _llm_service()
+    llm_module._TEMPLATE_CACHE.clear()
+    template_string = "{{favorites}} {{limit}}"
+
+    assert service.get_prompt(limit=1, template_string=template_string) == "Fav 1"
+    assert service.get_prompt(limit=2, template_string=template_string) == "Fav 2"
+    assert len(llm_module._TEMPLATE_CACHE) == 1
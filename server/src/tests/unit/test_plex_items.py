@@ -0,0 +1,66 @@
+from unittest.mock import MagicMock, patch
+from xml.etree import ElementTree
+from plexapi.video import Movie, Episode
+from providers.plex import PlexProvider
+
+
+def _plex_provider():
+    with patch("providers.plex.PlexServer") as mock_server_cls:
+        mock_server_cls.return_value.url.side_effect = lambda path, includeToken=False: f"http://plex:32400{path}"
+        return PlexProvider(plex_url="http://plex:32400", plex_api_key="token")
+
+
+def test_items_filtered_from_plex_objects_without_reloading():
+    provider = _plex_provider()
+    server = MagicMock()
+    movie = Movie(server, ElementTree.fromstring(
+        '<Video type="movie" title="Heat" key="/library/metadata/10" ratingKey="10" lastViewedAt="1700000000" viewCount="2" thumb="/library/metadata/10/thumb/1"/>'
+    ))
+    episodes = [
+        Episode(server, ElementTree.fromstring(
+            f'<Video type="episode" title="Episode {i}" grandparentTitle="The Wire" grandparentKey="/library/metadata/20" ratingKey="2{i}" lastViewedAt="{1700000000 + i}" userRating="10"/>'
+        ))
+        for i in range(1, 3)
+    ]
+
+    items = provider.get_items_filtered(items=[movie] + episodes)
+
+    server.query.assert_not_called() # Attributes that are None (e.g. the movie's userRating) do not trigger a reload
+    assert [(item.name, item.id, item.type) for item in items] == [("Heat", "10", "movie"), ("The Wire", "20", "tv")]
+    assert items[0].last_played_date == "2023-11-14T22:13:20Z" and items[0].play_count == 2 and items[0].is_favorite is False
+    assert items[0].poster_url == "http://plex:32400/library/metadata/10/thumb/1"
+    assert items[1].last_played_date == "2023-11-14T22:13:22Z" and items[1].is_favorite is True
+    assert provider.get_items_filtered(items=[movie] + episodes, attribute_filter="Name") == ["Heat", "The Wire"]
+
+
+def _section(section_type, items):
+    section = MagicMock()
+    section.type = section.TYPE = section_type
+    section.title = section_type.title()
+
+    def search(libtype, filters, container_start, container_size, maxresults):
+        return items[container_start:container_start + container_size]
+
+    section.search.side_effect = search
+    return section
+
+
+def test_favorites_are_filtered_by_the_server_and_paged():
+    provider = _plex_provider()
+    provider.LIBRARY_PAGE_SIZE = 2
+    server = MagicMock()
+    rated = [
+        Movie(server, ElementTree.fromstring(f'<Video type="movie" title="Movie {i}" key="/library/metadata/{i}" ratingKey="{i}" userRating="10"/>'))
+        for i in range(5)
+    ]
+    movies = _section("movie", rated)
+    shows = _section("show", [])
+    provider.server.library.sections.return_value = [movies, shows]
+
+    favorites = provider.get_favorites(user_id="1", limit=3)
+
+    assert [item.name for item in favorites] == ["Movie 0", "Movie 1", "Movie 2"]
+    calls = movies.search.call_args_list
+    assert [(c.kwargs["container_start"], c.kwargs["container_size"]) for c in calls] == [(0, 2), (2, 1)]
+    assert calls[0].kwargs["filters"] == {"userRating>>": PlexProvider.FAVORITE_MIN_RATING - 1}
+    shows.search.assert_not_called() # Limit reached in the first section
@@ -0,0 +1,72 @@
+import threading
+import pytest
+from unittest.mock import AsyncMock, patch
+from services.database import Database
+from services import tmdb as tmdb_module
+from services.tmdb import TMDB
+
+
+@pytest.fixture
+def cache_db(tmp_path):
+    db = Database(str(tmp_path / "test_tmdb_cache.db"))
+    tmdb_module._MEMORY_CACHE.clear()
+    yield db
+    tmdb_module._MEMORY_CACHE.clear()
+    db.cleanup()
+
+
+def test_lookup_media_served_from_cache(cache_db: Database):
+    tmdb = TMDB(tmdb_api_key="key", db=cache_db)
+    search_payload = {"results": [{"id": 603, "title": "The Matrix"}]}
+
+    with patch.object(tmdb_module.transport, "get_json", new_callable=AsyncMock, return_value=search_payload) as mock_get:
+        first = tmdb.lookup_media("The Matrix", "movie")
+        second = tmdb.lookup_media("  the matrix ", "movie")
+
+    assert first == second == {"id": 603, "title": "The Matrix"}
+    mock_get.assert_called_once()
+
+    # A new process (empty memory cache) is served from the database
+    tmdb_module._MEMORY_CACHE.clear()
+    with patch.object(tmdb_module.transport, "get_json", new_callable=AsyncMock) as mock_get:
+        assert TMDB(tmdb_api_key="key", db=cache_db).lookup_media("The Matrix", "movie") == first
+    mock_get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_media_detail_caches_misses_and_respects_disabled_ttl(cache_db: Database):
+    tmdb = TMDB(tmdb_api_key="key", db=cache_db, search_cache_ttl=0)
+
+    with patch.object(tmdb_module.transport, "get_json", new_callable=AsyncMock, return_value={"results": []}) as mock_get:
+        assert await tmdb.lookup_media_async("Nothing", "tv") is None
+        assert await tmdb.lookup_media_async("Nothing", "tv") is None
+    assert mock_get.call_count == 2 # search caching disabled
+
+    detail_tmdb = TMDB(tmdb_api_key="key", db=cache_db)
+    with patch.object(tmdb_module.transport, "get_json", new_callable=AsyncMock, return_value={"id": 1399, "name": "Show"}) as mock_get:
+        detail_tmdb.get_media_detail(tmdb_id=1399, media_type="tv") # Sync wrapper
+        assert await detail_tmdb.get_media_detail_async(tmdb_id="1399", media_type="tv") == {"id": 1399, "name": "Show"}
+    mock_get.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_cache_database_access_runs_off_the_event_loop(cache_db: Database):
+    loop_thread = threading.get_ident()
+    db_threads = []
+    original_get, original_set = cache_db.get_tmdb_cache, cache_db.set_tmdb_cache
+
+    def record(func):
+        def wrapper(*args, **kwargs):
+            db_threads.append(threading.get_ident())
+            return func(*args, **kwargs)
+        return wrapper
+
+    tmdb = TMDB(tmdb_api_key="key", db=cache_db)
+    with patch.object(cache_db, "get_tmdb_cache", side_effect=record(original_get)), \
+         patch.object(cache_db, "set_tmdb_cache", side_effect=record(original_set)), \
+         patch.object(tmdb_module.transport, "get_json", new_callable=AsyncMock, return_value={"id": 603}):
+        assert await tmdb.get_media_detail_async(tmdb_id=603, media_type="movie") == {"id": 603}
+        assert await tmdb.get_media_detail_async(tmdb_id=603, media_type="movie") == {"id": 603} # Memory hit, no database read
+
+    assert len(db_threads) == 2 # One read on the miss, one write
+    assert loop_thread not in db_threads
@@ -0,0 +1,54 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+from providers import trakt as trakt_module
+from providers.trakt import TraktProvider
+
+
+class FakePaginator:
+    def __init__(self, total_pages, failing_page=None):
+        self.total_pages = total_pages
+        self.total_items = total_pages * 2
+        self.failing_page = failing_page
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get(self, page):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.05)
+        with self._lock:
+            self.in_flight -= 1
+        if page == self.failing_page:
+            return None
+        return iter([f"play {page}a", f"play {page}b"]) # trakt.py maps pages lazily
+
+
+def _provider(paginator):
+    mock_trakt = MagicMock()
+    mock_trakt.__getitem__.return_value.get.return_value = paginator
+    with patch.object(trakt_module, "Trakt", mock_trakt):
+        provider = TraktProvider(client_id="id", client_secret="secret", initial_authorization={"access_token": "token"})
+    return provider, mock_trakt
+
+
+def test_all_history_pages_fetched_concurrently_in_order():
+    paginator = FakePaginator(total_pages=6)
+    provider, mock_trakt = _provider(paginator)
+
+    with patch.object(trakt_module, "Trakt", mock_trakt):
+        items = provider._get_all_history_pages("users/me/history", {"media": None, "extended": "full"})
+
+    assert items == [f"play {page}{half}" for page in range(1, 7) for half in "ab"]
+    assert paginator.max_in_flight == TraktProvider.HISTORY_PAGE_CONCURRENCY
+    get_kwargs = mock_trakt.__getitem__.return_value.get.call_args.kwargs
+    assert get_kwargs["pagination"] is True and get_kwargs["per_page"] == TraktProvider.HISTORY_PAGE_SIZE
+
+
+def test_all_history_pages_fails_on_missing_page():
+    provider, mock_trakt = _provider(FakePaginator(total_pages=3, failing_page=2))
+
+    with patch.object(trakt_module, "Trakt", mock_trakt):
+        assert provider._get_all_history_pages("users/me/history", {"media": None}) is None